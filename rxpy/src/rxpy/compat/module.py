@@ -77,10 +77,11 @@ class Re(object):
     def MatchIterator(self):
         class MatchIterator(MatchIterator_):
             def __init__(inner, re, parsed, text, pos=0, endpos=None, 
-                         engine=None):
+                         engine=None, budget=None):
                 super(MatchIterator_, inner).__init__(
                                     re, parsed, text, pos=pos, endpos=endpos,
-                                    engine=self._engine(engine))
+                                    engine=self._engine(engine), 
+                                    budget=budget)
         return MatchIterator
     
     def match(self, pattern, text, flags=0, alphabet=None, engine=None):
@@ -27,13 +27,25 @@
 # above, a recipient may use your version of this file under either the 
 # MPL or the LGPL License.                                              
 
+from mmap import mmap, ACCESS_READ
+from multiprocessing import Pool, cpu_count
+from os import fstat
 from string import ascii_letters, digits
 
 from rxpy.alphabet.ascii import Ascii
 from rxpy.alphabet.unicode import Unicode
 from rxpy.parser.pattern import parse_pattern, parse_groups
 from rxpy.compat.replace import compile_repl
-from rxpy.lib import RxpyException
+from rxpy.engine.parallel.base import ParallelEngine
+from rxpy.engine.parallel.multi.engine import SetEngine
+from rxpy.engine.parallel.stream import Stream
+from rxpy.engine.parallel.wide.engine import WideEngine
+from rxpy.engine.selector import Selector
+from rxpy.engine.support import Buffer, BUFFERS, Groups
+from rxpy.graph.opcode import Lookahead
+from rxpy.graph.support import contains_instance, ReadsGroup, \
+    matches_newline, required_strings
+from rxpy.lib import RxpyException, BudgetException
 
 
 _ALPHANUMERICS = ascii_letters + digits
@@ -55,20 +67,38 @@ def compile(pattern, flags=None, alphabet=None, engine=None):
             hint_alphabet = Unicode()
         else:
             hint_alphabet = None
-        pattern = RegexObject(parse_pattern(pattern, engine, flags=flags, 
-                                            alphabet=alphabet, 
-                                            hint_alphabet=hint_alphabet),
-                              pattern, engine=engine)
+        parsed = parse_pattern(pattern, engine, flags=flags, 
+                               alphabet=alphabet, hint_alphabet=hint_alphabet)
+        selection = None
+        if isinstance(engine, Selector):
+            selector = engine
+            (engine, selection) = selector.select(parsed)
+            if (engine.REQUIRE, engine.REFUSE) != \
+                    (selector.REQUIRE, selector.REFUSE):
+                parsed = parse_pattern(pattern, engine, flags=flags, 
+                                       alphabet=alphabet, 
+                                       hint_alphabet=hint_alphabet)
+        pattern = RegexObject(parsed, pattern, engine=engine, 
+                              selection=selection)
     return pattern
 
 
 class RegexObject(object):
     
-    def __init__(self, parsed, pattern=None, engine=None):
+    def __init__(self, parsed, pattern=None, engine=None, selection=None):
+        '''
+        `engine` may be a `Selector`, in which case the choice is made here;
+        `selection` describes why the engine was chosen (if it was).
+        '''
         require_engine(engine)
+        if isinstance(engine, Selector):
+            (engine, selection) = engine.select_parsed(parsed)
         self.__parsed = parsed
         self.__pattern = pattern
         self.__engine = engine
+        self.__selection = selection
+        # map from text type to required strings (see `__rejects()`)
+        self.__required = None
         
     def deep_eq(self, other):
         '''
@@ -99,35 +129,181 @@ class RegexObject(object):
     def groupindex(self):
         return dict(self.__parser_state.groups.names)
     
-    def scanner(self, text, pos=0, endpos=None):
+    @property
+    def engine(self):
+        return self.__engine
+    
+    @property
+    def selection(self):
+        '''
+        Why the engine was chosen (`None` unless a `Selector` was used).
+        '''
+        return self.__selection
+    
+    def scanner(self, text, pos=0, endpos=None, budget=None):
+        '''
+        `budget` (here and in the methods below) is an optional `Budget`
+        that limits the work done by the engine for each match.
+        '''
         return MatchIterator(self, self.__parsed, text, pos=pos, endpos=endpos,
-                             engine=self.__engine)
+                             engine=self.__engine, budget=budget)
         
-    def match(self, text, pos=0, endpos=None):
-        return self.scanner(text, pos=pos, endpos=endpos).match()
+    def match(self, text, pos=0, endpos=None, budget=None):
+        return self.scanner(text, pos=pos, endpos=endpos, 
+                            budget=budget).match()
     
-    def search(self, text, pos=0, endpos=None):
-        return self.scanner(text, pos=pos, endpos=endpos).search()
+    def search(self, text, pos=0, endpos=None, budget=None):
+        if self.__rejects(text, pos, endpos):
+            return None
+        return self.scanner(text, pos=pos, endpos=endpos, 
+                            budget=budget).search()
         
-    def finditer(self, text, pos=0, endpos=None):
-        pending_empty = None
-        for found in self.scanner(text, pos=pos, endpos=endpos).searchiter():
-            # this is the "not touching" condition
-            if pending_empty:
-                if pending_empty.end() < found.start():
-                    yield pending_empty
-                pending_empty = None
-            if found.group():
-                yield found
+    def finditer(self, text, pos=0, endpos=None, budget=None):
+        if self.__rejects(text, pos, endpos):
+            return
+        for found in not_touching(self.scanner(text, pos=pos, endpos=endpos, 
+                                               budget=budget).searchiter()):
+            yield found
+            
+    def __rejects(self, text, pos, endpos):
+        '''
+        Is some text that every match must contain (see `required_strings()`)
+        missing?  Then there is no need to run the engine.  Only text with
+        a `find()` method is checked.
+        '''
+        if self.__required is None:
+            strings = required_strings(self.__parsed[1])
+            self.__required = {}
+            for type_ in (str, unicode):
+                self.__required[type_] = []
+                for string in strings:
+                    try:
+                        self.__required[type_].append(type_(string))
+                    except UnicodeError:
+                        pass
+        type_ = str if isinstance(text, (mmap, bytearray)) else type(text)
+        end = endpos if endpos else len(text)
+        for string in self.__required.get(type_, ()):
+            if text.find(string, max(pos, 0), end) < 0:
+                return True
+        return False
+            
+    def finditer_parallel(self, text, workers=None, pos=0, endpos=None, 
+                          budget=None, chunk_size=None):
+        '''
+        As `finditer()`, but the text is split into chunks (of about 
+        `chunk_size` characters) that are searched by a pool of `workers`
+        processes (by default, one per CPU).  `text` may also be an open 
+        file, which is memory-mapped (the mapping is shared with the workers
+        when they are forked, so the text is not copied).
+        
+        This is only possible when matches have a known (fixed) length, or
+        cannot contain a newline (chunks then end at newlines).  Otherwise,
+        and for lookarounds, the text is searched serially.
+        '''
+        if hasattr(text, 'fileno'):
+            if fstat(text.fileno()).st_size:
+                text = mmap(text.fileno(), 0, access=ACCESS_READ)
             else:
-                pending_empty = found
-        if pending_empty:
-            yield pending_empty
-
-    def splititer(self, text, maxsplit=0):
+                text = ''
+        endpos = endpos if endpos else len(text)
+        workers = workers if workers else cpu_count()
+        margin = self.__margin()
+        if margin is not None:
+            chunks = self.__chunks(text, pos, endpos, margin, 
+                                   chunk_size if chunk_size else 
+                                   max((endpos - pos) // (4 * workers), 
+                                       CHUNK_SIZE))
+        if margin is None or workers < 2 or len(chunks) < 2:
+            for found in self.finditer(text, pos=pos, endpos=endpos, 
+                                       budget=budget):
+                yield found
+        else:
+            pool = Pool(workers, init_chunks, 
+                        (self, text, endpos, margin[0], budget))
+            try:
+                raw = self.__merge(text, endpos, margin[0], budget, chunks,
+                                   pool.imap(search_chunk, chunks))
+                for found in not_touching(raw):
+                    yield found
+            finally:
+                pool.terminate()
+                
+    def __margin(self):
+        '''
+        A pair (margin, lines) if the text can be split, where `margin` is
+        the number of characters beyond a chunk that a match starting in
+        the chunk can read, and `lines` is true if chunks must end at a 
+        newline.  None if the text cannot be split.
+        '''
+        graph = self.__parsed[1]
+        if contains_instance(graph, Lookahead):
+            return None
+        length = graph.length(None)
+        if length is not None:
+            return (length, False)
+        elif not matches_newline(graph):
+            return (0, True)
+        else:
+            return None
+        
+    def __chunks(self, text, pos, endpos, margin, size):
+        '''
+        Split the text into (start, stop) pairs.
+        '''
+        chunks = []
+        while pos < endpos:
+            stop = min(pos + size, endpos)
+            if margin[1] and stop < endpos:
+                stop = text.find('\n', stop - 1, endpos) + 1
+                if not stop:
+                    stop = endpos
+            chunks.append((pos, stop))
+            pos = stop
+        if chunks:
+            # the last chunk includes an empty match at the end
+            chunks[-1] = (chunks[-1][0], endpos + 1)
+        return chunks
+    
+    def __merge(self, text, endpos, margin, budget, chunks, results):
+        '''
+        Combine the matches from each chunk, in order, to give the same 
+        results as `scanner().searchiter()`.  
+        
+        A chunk is searched from its start, but a previous match may end
+        inside the chunk.  In that case the chunk is searched again (here),
+        from the end of that match, until the search "joins" the (cached)
+        sequence of matches from the worker.
+        '''
+        state = self.__parser_state
+        def match(data):
+            (groups, lastindex) = data
+            return MatchObject(Groups(group_state=state.groups, 
+                                      groups=groups, lastindex=lastindex),
+                               self, text, chunks[0][0], endpos, state)
+        pos = chunks[0][0]
+        for ((start, stop), (found, offsets)) in zip(chunks, results):
+            if pos > start:
+                index = dict((offset, i) for (i, offset) in enumerate(offsets))
+                if pos not in index:
+                    for (data, pos) in scan_chunk(self, text, pos, stop, 
+                                                  min(stop + margin + 1, 
+                                                      endpos), 
+                                                  budget):
+                        yield match(data)
+                        if pos in index:
+                            break
+                if pos not in index:
+                    continue
+                found = found[index[pos]:]
+            for data in found:
+                yield match(data)
+            pos = offsets[-1]
+
+    def splititer(self, text, maxsplit=0, budget=None):
         pos = 0
         maxsplit = maxsplit if maxsplit else -1
-        for found in self.finditer(text):
+        for found in self.finditer(text, budget=budget):
             if found.group():
                 yield text[pos:found.start()]
                 for group in found.groups():
@@ -138,12 +314,12 @@ class RegexObject(object):
                     break
         yield text[pos:]
         
-    def subiter(self, text, count=0):
+    def subiter(self, text, count=0, budget=None):
         # this implements the "not adjacent" condition
         count = count if count else -1
         prev = None
         pending_empty = None
-        for found in self.scanner(text).searchiter():
+        for found in self.scanner(text, budget=budget).searchiter():
             if pending_empty:
                 if pending_empty.end() < found.start():
                     yield pending_empty
@@ -163,12 +339,12 @@ class RegexObject(object):
         if pending_empty and count:
             yield pending_empty
             
-    def subn(self, repl, text, count=0):
+    def subn(self, repl, text, count=0, budget=None):
         replacement = compile_repl(repl, self.__parser_state)
         n = 0
         pos = 0
         results = []
-        for found in self.subiter(text, count):
+        for found in self.subiter(text, count, budget=budget):
             results.append(text[pos:found.start()])
             results.append(replacement(found))
             n += 1
@@ -176,7 +352,7 @@ class RegexObject(object):
         results += text[pos:]
         return (self.__parser_state.alphabet.join(*results), n)
     
-    def findall(self, text, pos=0, endpos=None):
+    def findall(self, text, pos=0, endpos=None, budget=None):
         def expand(match):
             if match.lastindex:
                 groups = match.groups(default='')
@@ -186,13 +362,28 @@ class RegexObject(object):
                     return groups
             else:
                 return match.group()
-        return list(map(expand, self.finditer(text, pos=pos, endpos=endpos)))
+        return list(map(expand, self.finditer(text, pos=pos, endpos=endpos,
+                                              budget=budget)))
     
-    def split(self, text, maxsplit=0):
-        return list(self.splititer(text, maxsplit=maxsplit))
+    def split(self, text, maxsplit=0, budget=None):
+        return list(self.splititer(text, maxsplit=maxsplit, budget=budget))
     
-    def sub(self, repl, text, count=0):
-        return self.subn(repl, text, count=count)[0]
+    def sub(self, repl, text, count=0, budget=None):
+        return self.subn(repl, text, count=count, budget=budget)[0]
+    
+    def stream(self, budget=None):
+        '''
+        A `MatchStream` to search text that arrives in chunks.  This uses a
+        parallel engine (re-parsing the pattern if necessary).
+        '''
+        parsed = self.__parsed
+        if not issubclass(self.__engine, ParallelEngine):
+            if self.__pattern is None:
+                raise RxpyException('No pattern to parse for stream')
+            parsed = parse_pattern(self.__pattern, WideEngine, 
+                                   flags=self.flags, 
+                                   alphabet=self.__parser_state.alphabet)
+        return MatchStream(self, parsed, budget=budget)
     
     
 class MatchIterator(object):
@@ -207,14 +398,17 @@ class MatchIterator(object):
     None when no more calls will work.
     '''
     
-    def __init__(self, re, parsed, text, pos=0, endpos=None, engine=None):
+    def __init__(self, re, parsed, text, pos=0, endpos=None, engine=None,
+                 budget=None):
         require_engine(engine)
         self.__re = re
         self.__parsed = parsed
         self.__text = text
         self.__pos = pos
         self.__endpos = endpos if endpos else len(text)
+        self.__source = bounded(text, self.__endpos)
         self.__engine = engine(*parsed)
+        self.__budget = budget
     
     @property
     def __parser_state(self):
@@ -222,8 +416,9 @@ class MatchIterator(object):
 
     def next(self, search):
         if self.__pos <= self.__endpos:
-            groups = self.__engine.run(self.__text[:self.__endpos], 
-                                       pos=self.__pos, search=search)
+            groups = self.__engine.run(self.__source, 
+                                       pos=self.__pos, search=search,
+                                       budget=self.__budget)
             if groups:
                 found = MatchObject(groups, self.__re, self.__text, 
                                     self.__pos, self.__endpos, 
@@ -256,6 +451,37 @@ class MatchIterator(object):
     def remaining(self):
         return self.__text[self.__pos:]
     
+    @property
+    def pos(self):
+        '''
+        The offset at which the next match or search will start.
+        '''
+        return self.__pos
+    
+
+class MatchStream(object):
+    '''
+    Search text that arrives in chunks (see `rxpy.engine.parallel.stream`).
+    `feed()` and `finish()` return lists of matches, whose offsets are 
+    relative to the start of the stream (`string` is `None`).
+    '''
+    
+    def __init__(self, re, parsed, budget=None):
+        self.__re = re
+        self.__parser_state = parsed[0]
+        self.__stream = Stream(*parsed, budget=budget)
+        
+    def feed(self, chunk):
+        return self.__wrap(self.__stream.feed(chunk))
+    
+    def finish(self):
+        return self.__wrap(self.__stream.finish())
+    
+    def __wrap(self, matches):
+        return [MatchObject(groups, self.__re, None, 0, None, 
+                            self.__parser_state)
+                for groups in matches]
+    
 
 class MatchObject(object):
     
@@ -394,6 +620,145 @@ class Scanner(object):
                 yield self.__actions[found.lastindex-1](self, found.group())
         
 
+class RegexSet(object):
+    '''
+    A set of patterns matched together, in a single pass over the text, to
+    find which of them match (and, optionally, where).
+    
+    The patterns are combined with `parse_groups()` (as for `Scanner`) and
+    matched by `SetEngine`.  Since groups are numbered across all patterns,
+    group references are not supported.
+    '''
+    
+    def __init__(self, patterns, flags=0, alphabet=None):
+        self.__patterns = list(patterns)
+        self.__parsed = parse_groups(self.__patterns, SetEngine, 
+                                     flags=flags, alphabet=alphabet)
+        if contains_instance(self.__parsed[1], ReadsGroup):
+            raise RxpyException('Group references in RegexSet')
+        # engines (with and without spans) are created when needed
+        self.__engines = {}
+        
+    @property
+    def patterns(self):
+        return list(self.__patterns)
+    
+    def __len__(self):
+        return len(self.__patterns)
+    
+    def __run(self, text, pos, endpos, budget, spans):
+        if not self.__patterns:
+            return {}
+        if spans not in self.__engines:
+            self.__engines[spans] = SetEngine(*self.__parsed, spans=spans)
+        endpos = endpos if endpos else len(text)
+        return self.__engines[spans].matches(bounded(text, endpos), pos=pos, 
+                                             budget=budget)
+        
+    def matches(self, text, pos=0, endpos=None, budget=None):
+        '''
+        The (ordered) indices of the patterns that match the text.
+        '''
+        return sorted(self.__run(text, pos, endpos, budget, False))
+    
+    def spans(self, text, pos=0, endpos=None, budget=None):
+        '''
+        A map from index to span for the patterns that match the text.  The
+        span is the one `search()` would give for the pattern alone.
+        '''
+        return dict(self.__run(text, pos, endpos, budget, True))
+        
+
+def not_touching(matches):
+    '''
+    Filter the matches from `MatchIterator.searchiter()`, discarding empty
+    matches that touch the previous match.
+    '''
+    pending_empty = None
+    for found in matches:
+        if pending_empty:
+            if pending_empty.end() < found.start():
+                yield pending_empty
+            pending_empty = None
+        if found.group():
+            yield found
+        else:
+            pending_empty = found
+    if pending_empty:
+        yield pending_empty
+
+
+# the smallest default chunk used by finditer_parallel
+CHUNK_SIZE = 1 << 16
+
+# the regexp, text, end, margin and budget in a finditer_parallel worker
+_CHUNKS = None
+
+
+def init_chunks(regexp, text, endpos, margin, budget):
+    '''
+    Initialise a `finditer_parallel()` worker.
+    '''
+    global _CHUNKS
+    _CHUNKS = (regexp, text, endpos, margin, budget)
+
+
+def search_chunk(chunk):
+    '''
+    Search a chunk of text in a `finditer_parallel()` worker.  The result
+    is a pair: a list of (groups, lastindex) for matches that start in the
+    chunk and the offset from which each search started (plus a final
+    offset, for the search that would follow).
+    '''
+    (regexp, text, endpos, margin, budget) = _CHUNKS
+    (start, stop) = chunk
+    found = []
+    offsets = [start]
+    for (data, offset) in scan_chunk(regexp, text, start, stop, 
+                                     min(stop + margin + 1, endpos), budget):
+        found.append(data)
+        offsets.append(offset)
+    return (found, offsets)
+
+
+def scan_chunk(regexp, text, pos, stop, end, budget):
+    '''
+    Generate ((groups, lastindex), offset) for each match in `text[:end]`,
+    from `pos`, that starts before `stop`.  `offset` is where the following
+    search starts.
+    
+    Only the text from one character before `pos` is given to the engine
+    (so that `^`, `\\b`, etc work).
+    '''
+    base = max(0, pos - 1)
+    scanner = regexp.scanner(text[base:end], pos=pos - base, budget=budget)
+    while True:
+        try:
+            found = scanner.search()
+        except BudgetException, e:
+            raise BudgetException(e.ticks, e.offset + base)
+        if found is None or found.start() + base >= stop:
+            break
+        groups = {}
+        for index in range(regexp.groups + 1):
+            (start, end) = found.span(index)
+            if start > -1:
+                groups[index] = (found.group(index), start + base, end + base)
+        yield ((groups, found.lastindex), scanner.pos + base)
+    
+
+def bounded(text, endpos):
+    '''
+    The text before `endpos`, as seen by the engines.  Buffers (`mmap`,
+    `memoryview`, `bytearray`) are wrapped so that they are not copied;
+    anything else is sliced.
+    '''
+    if isinstance(text, BUFFERS):
+        return Buffer(text, endpos)
+    else:
+        return text[:endpos]
+    
+
 def require_engine(engine):
     if not engine:
         raise RxpyException('Engine must be given for RXPY '
@@ -33,16 +33,21 @@ from os.path import join
 from time import time
 
 from rxpy.engine._bench.re_python import _re as R_PYTHON
+from rxpy.engine.support import Groups, Loops
 from rxpy.engine.backtrack.re_b import _re as R_B
+from rxpy.engine.backtrack.re_bb import _re as R_BB
+from rxpy.engine.generated.re_g import _re as R_G
 from rxpy.engine.parallel.serial.re_ps import _re as R_PS
 from rxpy.engine.parallel.serial.re_psh import _re as R_PSH
 from rxpy.engine.parallel.beam.re_pb import _re as R_PB
 from rxpy.engine.parallel.beam.re_pbh import _re as R_PBH
+from rxpy.engine.parallel.beam.engine import BeamEngine
 from rxpy.engine.parallel.wide.re_pw import _re as R_PW
 from rxpy.engine.parallel.wide.re_pwh import _re as R_PWH
 from rxpy.engine.quick.simple.re_s import _re as R_S
 from rxpy.engine.quick.complex.re_c import _re as R_C
 from rxpy.engine.quick.re_q import _re as R_Q
+from rxpy.parser.pattern import parse_pattern
 
 
 def execute(engines, benchmarks, trace=False, repeat=3):
@@ -112,6 +117,59 @@ def text_histogram(engines, benchmarks):
                 sec/secs[0], log10(sec/secs[0]))
             
 
+def text_scaling(engine, benchmark, sizes):
+    '''
+    Show how the time taken by a single engine changes with the size of the
+    input (`benchmark` is a function that takes the size and returns a
+    benchmark).  For linear scaling the final column should be roughly
+    constant.
+    '''
+    print
+    print engine
+    for size in sizes:
+        secs = benchmark(size)(engine)
+        print '{0:>10d} {1:9.3f}s {2:9.3f}us/char'.format(
+            size, secs, 1e6 * secs / size)
+            
+
+def copy_count(engines, benchmarks):
+    '''
+    Show the number of copies (allocations of new maps and lists) made by 
+    `Groups` and `Loops` when each benchmark is run once.  Since these are
+    copy on write this is the number of clones that were later modified.
+    '''
+    for benchmark in benchmarks:
+        print
+        print benchmark
+        for engine in engines:
+            (groups, loops) = (Groups.copies, Loops.copies)
+            secs = benchmark(engine)
+            print '{0:>25s} {1:9d} groups {2:9d} loops {3:9.3f}s'.format(
+                str(engine), Groups.copies - groups, Loops.copies - loops, 
+                secs)
+            
+
+def beam_resume(benchmarks):
+    '''
+    Compare the ticks and time taken by `BeamEngine` when the beam grows by
+    restarting from the initial offset and by resuming from the first 
+    overflow.
+    '''
+    print
+    print '{0:>60s} {1:>20s} {2:>20s}'.format('', 'restart', 'resume')
+    for benchmark in benchmarks:
+        results = []
+        for resume in (False, True):
+            engine = BeamEngine(*parse_pattern(benchmark._pattern, BeamEngine),
+                                resume=resume)
+            start = time()
+            result = engine.run(benchmark._text)
+            results.extend([engine.ticks, time() - start])
+            assert bool(result) == benchmark._match
+        print '{0:>60s} {1:9d} {2:9.3f}s {3:9d} {4:9.3f}s'.format(
+            str(benchmark), *results)
+            
+
 class BaseBenchmark(object):
     
     def __init__(self, name, count):
@@ -189,6 +247,20 @@ def explore_python():
         regexp.match(n * 'ab')
         print n, time() - start
         
+def dot_star(n, search=False):
+    return MatchBenchmark(('Search' if search else 'Match') + 
+                          ' .*b against a^nb for n=' + str(n),
+                          '.*b', 1, n*'a' + 'b', search=search)
+        
+def alternation(n):
+    return MatchBenchmark('Match (?:(a)|(b)|(c))*d against (abc)^nd for n=' + 
+                          str(n), '(?:(a)|(b)|(c))*d', 1, n*'abc' + 'd')
+
+def counted_alternation(n):
+    return MatchBenchmark('Match (?:(a)|b|(c)){n}d against (abc)^(n/3)d for n=' 
+                          + str(n), '(?:(a)|b|(c)){' + str(n) + '}d', 1, 
+                          (n/3)*'abc' + 'd')
+
 def prime(n, match=True):
     return MatchBenchmark('Primality ' + str(n), 
                           r'^1?$|^(11+?)\1+$', 1, n * '1', match=match)
@@ -249,10 +321,12 @@ if __name__ == '__main__':
     text_histogram([R_PYTHON, R_B, R_PW, R_PWH, R_PS, R_PSH, R_PBH, R_S, R_C, R_Q], [
         exponential4(6),
         ])
-    text_histogram([R_PYTHON, R_PWH, R_PSH, R_PBH, R_S, R_C, R_Q], [
+    text_histogram([R_PYTHON, R_BB, R_PWH, R_PSH, R_PBH, R_S, R_C, R_Q], [
         exponential4(8),
         exponential(8),
         ])
+    beam_resume([exponential4(4), exponential4(6), exponential4(8),
+                 exponential4(10)])
     print
     text_histogram([R_PYTHON, R_B, R_PW, R_PWH, R_PS, R_PSH, R_PB, R_PBH, R_C, R_Q], [
         prime(32),
@@ -270,4 +344,31 @@ if __name__ == '__main__':
         prime2(128),
         prime2(131, False),
         ])
+    text_histogram([R_PYTHON, R_B, R_BB], [
+        exponential(16),
+        exponential3(10),
+        exponential4(8),
+        exponential5(8),
+        ])
+    print
+    text_scaling(R_B, dot_star, [1000, 10000, 100000, 1000000])
+    text_scaling(R_B, lambda n: dot_star(n, search=True), 
+                 [1000, 10000, 100000, 1000000])
+    text_histogram([R_PYTHON, R_B, R_G], [
+        MatchBenchmark('Match a(.)c against abc', 
+                       'a(.)c', 100, 'abc'),
+        MatchBenchmark('Match (.*) (.*) (.*)  against abc abc abc', 
+                       '(.*) (.*) (.*)', 10, 'abc abc abc'),
+        MatchBenchmark('Search .*?a*b against a^100b', 
+                       '.*?a*b', 1, 100*'a' + 'b', search=True),
+        alternation(100),
+        exponential5(6),
+        prime2(131, False),
+        ])
+    text_scaling(R_G, dot_star, [1000, 10000, 100000, 1000000])
+    copy_count([R_B, R_BB, R_PW, R_PS, R_PB], [
+        alternation(100),
+        counted_alternation(99),
+        exponential5(6),
+        ])
     
@@ -28,6 +28,10 @@
 # MPL or the LGPL License.                                              
 
 
+from mmap import mmap, ACCESS_READ
+from tempfile import TemporaryFile
+
+from rxpy.lib import Budget, BudgetException
 from rxpy.parser.support import ParserState
 from rxpy.engine._test.base import BaseTest
 
@@ -177,3 +181,69 @@ class ReTest(BaseTest):
                             else:   
                                 assert type(s) == unicode, type(s)
 
+    def test_budget(self):
+        pattern = self._re.compile('(?:a|b)*c')
+        # the final 'c' avoids rejection before searching
+        text = 1000 * 'ab' + 'xc'
+        assert not pattern.match(text, budget=Budget(ticks=100000))
+        for call in (lambda: pattern.match(text, budget=Budget(ticks=100)),
+                     lambda: pattern.search(text, budget=Budget(ticks=100)),
+                     lambda: list(pattern.finditer(text, 
+                                                   budget=Budget(ticks=100))),
+                     lambda: pattern.sub('x', text, budget=Budget(ticks=100))):
+            try:
+                call()
+                assert False, 'expected error'
+            except BudgetException, e:
+                assert e.ticks == 101, e.ticks
+        # the budget applies to each match separately
+        assert pattern.sub('x', 100 * 'abc', budget=Budget(ticks=100)) == \
+            100 * 'x'
+            
+    def test_buffers(self):
+        text = 'ab 12 abbc\n' * 20 + 'x\xffabc'
+        file_ = TemporaryFile()
+        file_.write(text)
+        file_.flush()
+        mapped = mmap(file_.fileno(), 0, access=ACCESS_READ)
+        for pattern in ('ab+c', '[0-9]+', 'c$', '[^a-z ]'):
+            regexp = self._re.compile(pattern)
+            target = [found.span() for found in regexp.finditer(text, 1, 200)]
+            for source in (mapped, memoryview(text), bytearray(text)):
+                result = [found.span() 
+                          for found in regexp.finditer(source, 1, 200)]
+                assert result == target, (pattern, source, result)
+                found = regexp.search(source)
+                assert found.group() == regexp.search(text).group()
+                assert type(found.group()) == str
+                assert found.string is source
+        mapped.close()
+        
+    def test_required_strings(self):
+        regexp = self._re.compile('(?<=x)a+bc')
+        assert regexp.search('xaabc').span() == (1, 5)
+        assert not regexp.search('xaab')
+        assert regexp.search('xaabc', 1).span() == (1, 5)
+        assert not regexp.search('xaabc', 0, 4)
+        assert [found.span() for found in regexp.finditer('xabc abc xabc')] \
+            == [(1, 4), (10, 13)]
+        assert not list(regexp.finditer('xabc', 2))
+        assert regexp.findall(u'xaabc') == [u'aabc']
+        assert regexp.search(bytearray('xabc')).span() == (1, 4)
+        
+    def test_finditer_parallel(self):
+        text = 'ab 12 abbc\nabc\n\n3' * 20
+        file_ = TemporaryFile()
+        file_.write(text)
+        file_.flush()
+        # fixed length, single line, and unsplittable (serial)
+        for pattern in ('bc', '\\d\\d$', '(?m)^ab+', 'b*', 'c\\s', 
+                        '\\s+'):
+            regexp = self._re.compile(pattern)
+            target = [(found.span(), found.groups()) 
+                      for found in regexp.finditer(text, 1)]
+            for source in (text, file_):
+                result = [(found.span(), found.groups()) 
+                          for found in regexp.finditer_parallel(
+                              source, workers=2, pos=1, chunk_size=7)]
+                assert result == target, (pattern, result)
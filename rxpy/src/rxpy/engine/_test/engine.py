@@ -30,7 +30,9 @@
 
 from rxpy.parser.pattern import EmptyException
 from rxpy.parser.support import ParserState
-from rxpy.lib import RxpyException
+from time import time
+
+from rxpy.lib import RxpyException, Budget, BudgetException
 from rxpy.engine._test.base import BaseTest
 
 
@@ -95,6 +97,31 @@ class EngineTest(BaseTest):
         assert not self.engine(self.parse('a(?!b)'), 'ab')
         assert self.engine(self.parse('a(?!b)'), 'ac')
     
+    def test_atomic(self):
+        assert self.engine(self.parse('a(?>b+)c'), 'abbc')
+        assert not self.engine(self.parse('(?>a*)a'), 'aaa')
+        assert not self.engine(self.parse('(?>a|ab)c'), 'abc')
+        assert self.engine(self.parse('(?>ab|a)c'), 'abc')
+        assert not self.engine(self.parse('(?>a+?)b'), 'aab')
+        assert self.engine(self.parse('(?>a+)b'), 'xaab', search=True)
+        assert self.engine(self.parse('(?:(?>ab|a)c)+d'), 'acabcd')
+        
+    def test_possessive(self):
+        assert not self.engine(self.parse('a*+a'), 'aaa')
+        assert self.engine(self.parse('a*+b'), 'aaab')
+        assert not self.engine(self.parse('a++a'), 'aaa')
+        assert not self.engine(self.parse('a?+a'), 'a')
+        assert self.engine(self.parse('a?+a'), 'aa')
+        assert not self.engine(self.parse('a{2,3}+a'), 'aaa')
+        assert self.engine(self.parse('a{2,3}+a'), 'aaaa')
+        
+    def test_atomic_groups(self):
+        self.assert_groups('(?>(a+))b', 'aab', {0: ('aab', 0, 3), 1: ('aa', 0, 2)})
+        self.assert_groups('(?>(ab)|a)c', 'abc', {0: ('abc', 0, 3), 1: ('ab', 0, 2)})
+        self.assert_groups('(?>x(y)?)+z', 'xyxz', {0: ('xyxz', 0, 4), 1: ('y', 1, 2)})
+        result = self.engine(self.parse('(?:(?>(a)|b)c)+'), 'acbc')
+        assert result.lastindex == 1, result.lastindex
+    
     def test_lookback(self):
         assert self.engine(self.parse('.(?<=a)'), 'a')
         assert not self.engine(self.parse('.(?<=a)'), 'b')
@@ -112,6 +139,25 @@ class EngineTest(BaseTest):
         assert self.engine(self.parse(r'.*(?<!\bx)a'), 'xxa')
         assert not self.engine(self.parse(r'.*(?<!\Bx)a'), 'xxa')
         assert self.engine(self.parse(r'.*(?<=\Bx)a'), 'xxa')
+
+    def test_lookback_bug_3(self):
+        # lookbacks tried before the start of the text
+        assert not self.engine(self.parse('(a)c|(?<!b)d'), 'ab', search=True)
+        pattern = r'(?!b|(?:\A(x)*)\s(?<![ab]))' \
+                  r'((?<!a.)A(?<=[ab])|\s{1,2}?)(a{2,}?){2,}'
+        flags = ParserState.IGNORECASE | ParserState.DOTALL
+        assert not self.engine(self.parse(pattern, flags=flags), u'aa c', 
+                               search=True)
+
+    def test_lookback_variable(self):
+        assert self.engine(self.parse(r'.*(?<=foo\d+)bar'), 'xfoo123bar')
+        assert not self.engine(self.parse(r'.*(?<=foo\d+)bar'), 'xfoobar')
+        assert self.engine(self.parse('.*(?<=a|bc)x'), 'zbcx')
+        assert not self.engine(self.parse('.*(?<=a|bc)x'), 'zcx')
+        assert not self.engine(self.parse('.*(?<!a|bc)x'), 'zbcx')
+        assert self.engine(self.parse('.*(?<=(?:ab)*)c'), 'ababc')
+        assert self.engine(self.parse('.*(?<=[ab]{2,3}c?)d'), 'xabcd')
+        assert not self.engine(self.parse('.*(?<=[ab]{2,3}c?)d'), 'xacd')
     
     def test_conditional(self):
         assert self.engine(self.parse('(.)?b(?(1)\\1)'), 'aba')
@@ -250,6 +296,24 @@ class EngineTest(BaseTest):
         assert self.engine(self.parse('$'), '', search=True)
         assert self.engine(self.parse('$'), 'a', search=True)
         
+    def test_search_first_characters(self):
+        # searches skip to possible start positions
+        assert_span = lambda p, t, span: \
+            self.assertEqual((lambda r: (r.start(0), r.end(0)))(
+                                self.engine(self.parse(p), t, search=True)), 
+                             span)
+        assert_span('xyz+y', 'abcxyzyxyzzy', (3, 7))
+        assert_span('[xq]u?y', 'abqcxuy', (4, 7))
+        assert_span('(?:zz|yy)1', 'zzyyzz1', (4, 7))
+        assert_span('a*b', 'xxaab', (2, 5))
+        assert_span('a*', 'xxaab', (0, 0))
+        assert_span('(?<=x)y', 'yxy', (2, 3))
+        assert_span('(?=ab)a', 'aab', (1, 2))
+        assert_span('(?>a?)b', 'xxb', (2, 3))
+        assert_span('(?i)b', 'aaB', (2, 3))
+        assert not self.engine(self.parse('xa|ya'), 'xbyb', search=True)
+        assert not self.engine(self.parse('b'), 'aaa', search=True)
+        
     def test_end_of_line(self):
         assert self.engine(self.parse('ab$'), 'ab')
         assert self.engine(self.parse('ab$'), 'ab\n')
@@ -367,3 +431,21 @@ class EngineTest(BaseTest):
         assert self.engine(self.parse(r'^1?$|^(11+?)\1+$'), 4*'1')
         assert self.engine(self.parse(r'^1?$|^(11+?)\1+$'), 100*'1')
         assert not self.engine(self.parse(r'^1?$|^(11+?)\1+$'), 101*'1')
+
+    def test_budget(self):
+        parse = self.parse('(?:a|b)*c')
+        text = 1000 * 'ab'
+        engine = self.default_engine()(*parse)
+        assert not engine.run(text, budget=Budget(ticks=100000))
+        assert self.engine(parse, text + 'c')
+        try:
+            engine.run(text, budget=Budget(ticks=100))
+            assert False, 'expected error'
+        except BudgetException, e:
+            assert e.ticks == 101, e.ticks
+            assert 0 < e.offset < len(text), e.offset
+        try:
+            engine.run(text, budget=Budget(deadline=time() - 1))
+            assert False, 'expected error'
+        except BudgetException, e:
+            assert e.ticks == 0, e.ticks
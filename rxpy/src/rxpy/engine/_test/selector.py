@@ -0,0 +1,120 @@
+
+# The contents of this file are subject to the Mozilla Public License
+# (MPL) Version 1.1 (the "License"); you may not use this file except
+# in compliance with the License. You may obtain a copy of the License
+# at http://www.mozilla.org/MPL/                                      
+#                                                                     
+# Software distributed under the License is distributed on an "AS IS" 
+# basis, WITHOUT WARRANTY OF ANY KIND, either express or implied. See 
+# the License for the specific language governing rights and          
+# limitations under the License.                                      
+#                                                                     
+# The Original Code is RXPY (http://www.acooke.org/rxpy)              
+# The Initial Developer of the Original Code is Andrew Cooke.         
+# Portions created by the Initial Developer are Copyright (C) 2010
+# Andrew Cooke (andrew@acooke.org). All Rights Reserved.               
+#                                                                      
+# Alternatively, the contents of this file may be used under the terms 
+# of the LGPL license (the GNU Lesser General Public License,          
+# http://www.gnu.org/licenses/lgpl.html), in which case the provisions 
+# of the LGPL License are applicable instead of those above.           
+#                                                                      
+# If you wish to allow use of your version of this file only under the 
+# terms of the LGPL License and not to allow others to use your version
+# of this file under the MPL, indicate your decision by deleting the   
+# provisions above and replace them with the notice and other provisions
+# required by the LGPL License.  If you do not delete the provisions    
+# above, a recipient may use your version of this file under either the 
+# MPL or the LGPL License.          
+
+
+from unittest import TestCase
+
+from rxpy.engine._test.api import ReTest
+from rxpy.engine._test.test_re import ReTests
+from rxpy.engine.backtrack.engine import BitStateBacktrackingEngine
+from rxpy.engine.base import BaseEngine
+from rxpy.engine.parallel.wide.engine import WideEngine
+from rxpy.engine.quick.complex.engine import ComplexEngine
+from rxpy.engine.quick.dfa.engine import DfaEngine
+from rxpy.engine.quick.hybrid.engine import HybridEngine
+from rxpy.engine.selector import Selector
+from rxpy.graph.support import nested_loops, required_strings
+from rxpy.parser.pattern import parse_pattern, parse_groups
+from rxpy import re
+
+
+class SelectorTest(TestCase):
+    
+    def select(self, pattern):
+        return Selector().select(parse_pattern(pattern, Selector))
+    
+    def test_select(self):
+        assert self.select('a+b') == (DfaEngine, 'no groups')
+        assert self.select('a{2,3}') == (DfaEngine, 'no groups')
+        assert self.select('(a)(b)') == (HybridEngine, 'groups')
+        assert self.select('(a)\\1') == \
+            (BitStateBacktrackingEngine, 'group references')
+        assert self.select('(a)?(?(1)b|c)') == \
+            (BitStateBacktrackingEngine, 'group references')
+        assert self.select('(?=a)a') == \
+            (BitStateBacktrackingEngine, 'lookarounds')
+        assert self.select('(a+)*b') == (WideEngine, 'nested loops')
+        assert self.select('(a{1,3})+b') == (WideEngine, 'nested loops')
+        assert self.select('(?:a{1,3})+b') == (DfaEngine, 'no groups')
+        assert self.select('(a){2,3}') == (ComplexEngine, 'counted repeats')
+        assert self.select('a{2,40}') == (ComplexEngine, 'counted repeats')
+        
+    def test_nested_loops(self):
+        nested = lambda pattern: \
+            nested_loops(parse_pattern(pattern, BaseEngine)[1])
+        assert not nested('a*')
+        assert not nested('a*b*')
+        assert not nested('(a|b)*')
+        assert not nested('(?:ab|cd)*')
+        assert not nested('(?=a+)b*')
+        assert nested('(a+)*b')
+        assert nested('(?:a+)+')
+        assert nested('(?:x|y+)*')
+        assert nested('(a{1,3})+')
+        
+    def test_required_strings(self):
+        required = lambda pattern: \
+            required_strings(parse_pattern(pattern, BaseEngine)[1])
+        assert required('\\d+ms timeout') == ['ms timeout']
+        assert required('(?:ab)+c') == ['ab', 'c']
+        assert required('a|b') == []
+        assert required('(?:ab)*c') == ['c']
+        assert required('(?>ab|cd)e') == ['e']
+        # lookarounds are not part of the match
+        assert required('(?<=zz)q(?=y)') == ['q']
+        
+    def test_re(self):
+        pattern = re.compile('(a)(b)')
+        assert pattern.engine == HybridEngine
+        assert pattern.selection == 'groups'
+        assert pattern.match('ab').group(2) == 'b'
+        pattern = re.compile('a+b')
+        assert pattern.engine == DfaEngine
+        assert pattern.search('xaab').group(0) == 'aab'
+        
+    def test_parsed(self):
+        # the hybrid engine needs unrolled loops, so is not used for an 
+        # existing parse
+        parsed = parse_groups(['a', 'b'], Selector)
+        assert Selector().select_parsed(parsed) == \
+            (BitStateBacktrackingEngine, 'groups (fallback)')
+        scanner = re.Scanner([('a+', lambda s, t: t), ('b', lambda s, t: t)])
+        assert scanner.scan('aab') == (['aa', 'b'], '')
+        
+
+class SelectorReTest(ReTest, TestCase):
+    
+    def default_engine(self):
+        return Selector()
+
+
+class SelectorReTests(ReTests, TestCase):
+    
+    def default_engine(self):
+        return Selector()
@@ -0,0 +1,225 @@
+
+# The contents of this file are subject to the Mozilla Public License
+# (MPL) Version 1.1 (the "License"); you may not use this file except
+# in compliance with the License. You may obtain a copy of the License
+# at http://www.mozilla.org/MPL/                                      
+#                                                                     
+# Software distributed under the License is distributed on an "AS IS" 
+# basis, WITHOUT WARRANTY OF ANY KIND, either express or implied. See 
+# the License for the specific language governing rights and          
+# limitations under the License.                                      
+#                                                                     
+# The Original Code is RXPY (http://www.acooke.org/rxpy)              
+# The Initial Developer of the Original Code is Andrew Cooke.         
+# Portions created by the Initial Developer are Copyright (C) 2010
+# Andrew Cooke (andrew@acooke.org). All Rights Reserved.               
+#                                                                      
+# Alternatively, the contents of this file may be used under the terms 
+# of the LGPL license (the GNU Lesser General Public License,          
+# http://www.gnu.org/licenses/lgpl.html), in which case the provisions 
+# of the LGPL License are applicable instead of those above.           
+#                                                                      
+# If you wish to allow use of your version of this file only under the 
+# terms of the LGPL License and not to allow others to use your version
+# of this file under the MPL, indicate your decision by deleting the   
+# provisions above and replace them with the notice and other provisions
+# required by the LGPL License.  If you do not delete the provisions    
+# above, a recipient may use your version of this file under either the 
+# MPL or the LGPL License.          
+
+
+from gc import collect
+from unittest import TestCase
+from weakref import ref
+
+from rxpy.alphabet.unicode import Unicode
+from rxpy.engine.base import BaseEngine
+from rxpy.engine.support import FirstCharacters, LiteralPrefix, Buffer, \
+    CharacterClasses, Reversed, lookahead_logic
+from rxpy.graph.opcode import Lookahead
+from rxpy.parser.pattern import parse_pattern
+
+
+class FirstCharactersTest(TestCase):
+    
+    def first(self, pattern):
+        first = FirstCharacters.for_graph(parse_pattern(pattern, BaseEngine)[1])
+        return None if first is None else ''.join(sorted(first.characters))
+    
+    def test_characters(self):
+        assert self.first('abc') == 'a'
+        assert self.first('a|b') == 'ab'
+        assert self.first('[a-c]d|e') == 'abce'
+        assert self.first('(?i)x') == 'Xx'
+        assert self.first('a*b') == 'ab'
+        assert self.first('(?:x|y|)z') == 'xyz'
+        assert self.first('a{0,3}b') == 'ab'
+        
+    def test_non_consuming(self):
+        assert self.first('^a') == 'a'
+        assert self.first('(?=x)y') == 'y'
+        assert self.first('(?<=x)y') == 'y'
+        assert self.first('(a)b') == 'a'
+        assert self.first('(?>a?)b') == 'ab'
+        
+    def test_unknown(self):
+        # empty matches
+        assert self.first('a*') is None
+        assert self.first('(?>a?)') is None
+        # classes etc
+        assert self.first('.') is None
+        assert self.first('\\w') is None
+        assert self.first('[^a]') is None
+        assert self.first('[\\x00-\\uffff]') is None
+        assert self.first('(a)\\1') == 'a'
+        assert self.first('(a)?\\1b') is None
+        
+    def test_find(self):
+        first = FirstCharacters(['b'])
+        assert first.find('aab', 0) == 2
+        assert first.find('aab', 0, 2) == -1
+        first = FirstCharacters(['b', 'c'])
+        assert first.find('aacb', 0) == 2
+        assert first.find('aacb', 3) == 3
+        assert first.find('aaa', 0) == -1
+        assert first.find([1, 2, 3], 0) == -1
+        assert 'c' in first
+        
+
+class LiteralPrefixTest(TestCase):
+    
+    def prefix(self, pattern):
+        first = LiteralPrefix.for_graph(parse_pattern(pattern, BaseEngine)[1])
+        return first.prefix if isinstance(first, LiteralPrefix) else None
+    
+    def test_prefix(self):
+        assert self.prefix('abc') == 'abc'
+        assert self.prefix('(ab)c') == 'ab'
+        assert self.prefix('ERROR \\d+') == 'ERROR '
+        assert self.prefix('a|b') is None
+        assert self.prefix('a*b') is None
+        assert self.prefix('(?i)x') is None
+        # falls back to first characters
+        assert 'b' in LiteralPrefix.for_graph(parse_pattern('a|b', BaseEngine)[1])
+        
+    def test_find(self):
+        prefix = LiteralPrefix(u'ab')
+        assert prefix.find('aaab', 0) == 2
+        assert prefix.find(u'aaab', 0) == 2
+        assert prefix.find('aaab', 0, 2) == -1
+        assert prefix.find('aaab', 0, 3) == 2
+        assert prefix.find('aaaa', 0) == -1
+        # other sequences fall back to the first character
+        assert prefix.find(['x', 'a'], 0) == 1
+        assert 'a' in prefix
+        
+        
+class CharacterClassesTest(TestCase):
+    
+    def classes(self, pattern):
+        return CharacterClasses.for_graph(
+                    *parse_pattern(pattern, BaseEngine, alphabet=Unicode()))
+    
+    def test_table(self):
+        classes = self.classes(u'[a-c]x|\\d')
+        assert len(classes.table) == 256
+        classify = classes.classify
+        assert classify(u'a') == classify(u'c') != classify(u'd')
+        assert classify(u'x') not in (classify(u'a'), classify(u'y'))
+        assert classify(u'1') == classify(u'9') != classify(u'y')
+        # others, plus the newline (used by assertions)
+        assert classify(u'y') == classify(u'\x00') != classify(u'\n')
+        assert classes.count == 5, classes.count
+        # not in the alphabet
+        assert classify('a') is None
+        
+    def test_ranges(self):
+        classes = self.classes(u'[\u0400-\u04ff]|\u0500')
+        assert classes.starts == [256, 0x400, 0x500, 0x501], classes.starts
+        classify = classes.classify
+        assert classify(u'\u0400') == classify(u'\u04ff')
+        assert classify(u'\u0400') != classify(u'\u0500')
+        assert classify(u'\u0501') == classify(u'\u03ff') == classify(u'a')
+        assert classes.count == 4, classes.count
+        
+    def test_split_ranges(self):
+        classes = self.classes(u'\\w')
+        assert classes.ranges == [None]
+        classify = classes.classify
+        assert classify(u'\u0430') == classify(u'a') != classify(u'\u3000')
+        assert classes.count == 3, classes.count
+        
+    def test_cache_freed(self):
+        # the cached instance does not keep the graph alive
+        (parser_state, graph) = parse_pattern(u'[a-c]x', BaseEngine, 
+                                              alphabet=Unicode())
+        CharacterClasses.for_graph(parser_state, graph)
+        graph = ref(graph)
+        collect()
+        assert graph() is None
+        
+        
+class LookaheadLogicTest(TestCase):
+    
+    def logic(self, pattern, forwards=False, groups=None):
+        (state, graph) = parse_pattern(pattern, BaseEngine)
+        while not isinstance(graph, Lookahead):
+            graph = graph.next[0]
+        # repeat to use the cached values
+        for _ in range(2):
+            result = lookahead_logic(graph.next[1], forwards, groups)
+        return result
+        
+    def test_logic(self):
+        assert self.logic('a(?<=ab)') == (False, False, 2)
+        assert self.logic('a(?<=a+)') == (False, False, None)
+        assert self.logic('a(?=ab)', forwards=True) == (False, False, None)
+        assert self.logic('a(?<=(a))') == (False, True, 1)
+        assert self.logic('(a)(?<=(\\1))') == (True, True, None)
+        
+        
+class ReversedTest(TestCase):
+    
+    def test_access(self):
+        reversed_ = Reversed('abcdef', 4)
+        assert len(reversed_) == 4
+        assert reversed_[0] == 'd'
+        assert reversed_[-1] == 'a'
+        assert reversed_[1:3] == 'cb'
+        assert reversed_[3:1] == ''
+        assert len(Reversed('abcdef', 0)) == 0
+        try:
+            Reversed('abcdef', -1)
+            assert False, 'expected error'
+        except ValueError:
+            pass
+        
+        
+class BufferTest(TestCase):
+    
+    def test_access(self):
+        buffer_ = Buffer(bytearray('abcdef'), 4)
+        assert len(buffer_) == 4
+        assert buffer_[0] == 'a'
+        assert buffer_[-1] == 'd'
+        assert buffer_[1:3] == 'bc'
+        assert buffer_[2:] == 'cd'
+        assert buffer_[3:1] == ''
+        try:
+            buffer_[4]
+            assert False, 'expected error'
+        except IndexError:
+            pass
+        
+    def test_find(self):
+        buffer_ = Buffer(memoryview('aaaaaaaabaa'), 10)
+        # search in small chunks
+        buffer_.CHUNK = 3
+        assert FirstCharacters(['b']).find(buffer_, 0) == 8
+        assert FirstCharacters(['b', 'c']).find(buffer_, 2) == 8
+        assert FirstCharacters(['b']).find(buffer_, 0, 8) == -1
+        assert FirstCharacters(['c']).find(buffer_, 0) == -1
+        # a prefix split across chunks
+        assert LiteralPrefix('aab').find(buffer_, 0) == 6
+        assert LiteralPrefix('aab').find(buffer_, 0, 6) == -1
+        assert LiteralPrefix('baa').find(buffer_, 0) == -1
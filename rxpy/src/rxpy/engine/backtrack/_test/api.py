@@ -30,7 +30,8 @@
 
 from unittest import TestCase
 
-from rxpy.engine.backtrack.engine import BacktrackingEngine
+from rxpy.engine.backtrack.engine import BacktrackingEngine, \
+    BitStateBacktrackingEngine
 from rxpy.engine._test.api import ReTest
 
 
@@ -39,3 +40,8 @@ class BacktrackingReTest(ReTest, TestCase):
     def default_engine(self):
         return BacktrackingEngine
 
+
+class BitStateReTest(ReTest, TestCase):
+    
+    def default_engine(self):
+        return BitStateBacktrackingEngine
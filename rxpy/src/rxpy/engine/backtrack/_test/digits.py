@@ -30,7 +30,8 @@
 
 from unittest import TestCase
 
-from rxpy.engine.backtrack.engine import BacktrackingEngine
+from rxpy.engine.backtrack.engine import BacktrackingEngine, \
+    BitStateBacktrackingEngine
 from rxpy.engine._test.digits import DigitsTest
 
 
@@ -38,3 +39,9 @@ class BacktrackDigitsTest(DigitsTest, TestCase):
     
     def default_engine(self):
         return BacktrackingEngine
+
+
+class BitStateDigitsTest(DigitsTest, TestCase):
+    
+    def default_engine(self):
+        return BitStateBacktrackingEngine
@@ -30,7 +30,8 @@
 
 from unittest import TestCase
 
-from rxpy.engine.backtrack.engine import BacktrackingEngine
+from rxpy.engine.backtrack.engine import BacktrackingEngine, \
+    BitStateBacktrackingEngine
 from rxpy.engine._test.engine import EngineTest
 
 
@@ -48,14 +49,14 @@ class BacktrackingEngineTest(EngineTest, TestCase):
         assert self.engine(self.parse('(abc)*?x'), ('abc' * 5) + 'x',  maxdepth=1)
         
     def test_lookback_with_offset(self):
-        assert self.engine(self.parse('..(?<=a)'), 'xa', ticks=7)
+        assert self.engine(self.parse('..(?<=a)'), 'xa', ticks=6)
         assert not self.engine(self.parse('..(?<=a)'), 'ax')
         
     def test_lookback_optimisations(self):
-        assert self.engine(self.parse('(.).(?<=a)'), 'xa', ticks=9)
+        assert self.engine(self.parse('(.).(?<=a)'), 'xa', ticks=8)
         # only one more tick with an extra character because we avoid starting
         # from the start in this case
-        assert self.engine(self.parse('.(.).(?<=a)'), 'xxa', ticks=10)
+        assert self.engine(self.parse('.(.).(?<=a)'), 'xxa', ticks=9)
         
         assert self.engine(self.parse('(.).(?<=\\1)'), 'aa', ticks=9)
         # again, just one tick more
@@ -68,12 +69,49 @@ class BacktrackingEngineTest(EngineTest, TestCase):
         assert self.engine(self.parse('.(.).(?<=(\\1))'), 'xaa', ticks=18)
         assert not self.engine(self.parse('.(.).(?<=(\\1))'), 'xxa')
         
-        assert self.engine(self.parse('(.).(?<=a)'), 'xa', ticks=9)
+        assert self.engine(self.parse('(.).(?<=a)'), 'xa', ticks=8)
 
-        assert self.engine(self.parse('(.).(?<=(?:a|z))'), 'xa', ticks=10)
+        assert self.engine(self.parse('(.).(?<=(?:a|z))'), 'xa', ticks=11)
         assert self.engine(self.parse('(.).(?<=(a|z))'), 'xa', ticks=12)
         # only one more tick with an extra character because we avoid starting
         # from the start in this case
-        assert self.engine(self.parse('.(.).(?<=(?:a|z))'), 'xxa', ticks=11)
+        assert self.engine(self.parse('.(.).(?<=(?:a|z))'), 'xxa', ticks=12)
         assert self.engine(self.parse('.(.).(?<=(a|z))'), 'xxa', ticks=13)
         
+    def test_shared_text(self):
+        # groups inside lookarounds use offsets in the full text
+        result = self.engine(self.parse('x(?=(a))'), 'xa')
+        assert result.group(1) == 'a', result.group(1)
+        result = self.engine(self.parse('xy(.).(?<=a(.))'), 'xyab')
+        assert result.group(1) == 'a', result.group(1)
+        assert result.group(2) == 'b', result.group(2)
+        # and the start of the text is not moved by a lookback
+        assert not self.engine(self.parse('.(?<=^a)b'), 'xab', search=True)
+        assert self.engine(self.parse('.(?<=^a)b'), 'ab', search=True)
+        # long input is not copied as it is consumed
+        result = self.engine(self.parse('.*b'), 100000 * 'a' + 'b')
+        assert result.end(0) == 100001, result.end(0)
+
+    def test_atomic_pruning(self):
+        # alternatives inside the group are not retried
+        n = 12
+        assert not self.engine(self.parse('(?:a+)+b'), n * 'a', ticks=20476)
+        assert not self.engine(self.parse('(?:a++)+b'), n * 'a', ticks=31)
+
+
+class BitStateEngineTest(EngineTest, TestCase):
+    
+    def default_engine(self):
+        return BitStateBacktrackingEngine
+    
+    def test_exponential(self):
+        # without the bit state these take ~2^n ticks
+        n = 20
+        assert self.engine(self.parse(n * 'a?' + n * 'a'), n * 'a', ticks=442)
+        assert self.engine(self.parse(2 * n * '(a|b)?' + n * 'ab'), n * 'ab',
+                           ticks=4962)
+        
+    def test_disabled(self):
+        # group references and counted loops depend on state
+        assert self.engine(self.parse('(a|b)?(a|b)?\\1'), 'aa', ticks=14)
+        assert self.engine(self.parse('(?:a|b){0,2}(?:a|b){2}'), 'ab')
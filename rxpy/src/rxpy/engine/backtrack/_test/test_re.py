@@ -30,7 +30,8 @@
 
 from unittest import TestCase
 
-from rxpy.engine.backtrack.engine import BacktrackingEngine
+from rxpy.engine.backtrack.engine import BacktrackingEngine, \
+    BitStateBacktrackingEngine
 from rxpy.engine._test.test_re import ReTests
 
 
@@ -39,3 +40,8 @@ class BacktrackingTest(ReTests, TestCase):
     def default_engine(self):
         return BacktrackingEngine
 
+
+class BitStateTest(ReTests, TestCase):
+    
+    def default_engine(self):
+        return BitStateBacktrackingEngine
@@ -31,59 +31,93 @@
 '''
 A matcher implementation using a simple interpreter-based approach with the
 `Visitor` interface.  State is encapsulated in `State` while program flow 
-uses trampolining to avoid exhausting the Python stack.  In addition, to
+uses trampolining to avoid exhausting the Python stack.  Visitor methods
+return the next node, or one of the sentinels `FAIL` and `MATCH` (rather
+than raising exceptions, which are expensive).  In addition, to
 further reduce the use of the (non-Python) stack, simple repetition is
 "run length" compressed (this addresses ".*" matching against long strings, 
 for example). 
+
+Optionally (`bit_state=True`), the (node, offset) pairs that have been
+explored are recorded (as in RE2's BitState) so that no pair is explored 
+twice.  This bounds the time taken to O(nodes x text), but is only possible
+when the result of matching from a node does not depend on the groups or
+loop counts (so it is silently disabled if the pattern contains group
+references, conditionals, or counted repeats).
 '''                                    
 
 from rxpy.engine.base import BaseEngine
-from rxpy.engine.support import Groups, lookahead_logic, Loops, Fail, Match
+from rxpy.engine.support import Groups, lookahead_logic, Loops, \
+    FirstCharacters, Reversed, reversed_lookback
+from rxpy.graph.opcode import Repeat, Lookahead
+from rxpy.graph.support import contains_instance, node_iterator, ReadsGroup
 from rxpy.graph.visitor import BaseVisitor
+from rxpy.lib import Budget
+
+
+class Sentinel(object):
+    '''
+    A pseudo-node, returned by the visitor to terminate the trampoline.
+    '''
+    
+    def __init__(self, name):
+        self.__name = name
+        
+    def __str__(self):
+        return self.__name
+    
+    def __repr__(self):
+        return self.__name
+    
+    
+FAIL = Sentinel('FAIL')
+MATCH = Sentinel('MATCH')
 
 
 class State(object):
     '''
     State for a particular position moment / graph position / text offset.
+    
+    The text is shared (never copied) between states; each state holds only
+    an offset into the text and an end point (which is usually the end of
+    the text, but is the current position when matching lookbacks).
     '''
     
-    def __init__(self, text, groups, previous=None, offset=0, loops=None,
+    def __init__(self, text, groups, offset=0, end=None, loops=None,
                  checkpoints=None):
         self.__text = text
         self.__groups = groups
-        self.__previous = previous
         self.__offset = offset
+        self.__end = len(text) if end is None else end
         self.__loops = loops if loops else Loops()
         self.__checkpoints = checkpoints
     
     def clone(self, offset=None, groups=None):
         '''
         Duplicate this state.  If offset is specified, it must be greater than
-        or equal the existing offset; then the text and offset of the clone
-        will be consistent with the new value.  If groups is given it replaces
-        the previous groups.
+        or equal the existing offset.  If groups is given it replaces the 
+        previous groups.
+        
+        This is O(1) - groups and loops are copied on write, and checkpoints
+        are immutable (so shared).
         '''
         if groups is None:
             groups = self.__groups.clone()
-        previous = self.__previous
         if offset is None:
             offset = self.__offset
-            text = self.__text
-        else:
-            delta = offset - self.__offset
-            if delta:
-                previous = self.__text[delta-1]
-            text = self.__text[delta:]
-        checkpoints = set(self.__checkpoints) if self.__checkpoints else None
-        return State(text, groups, previous=previous, offset=offset, 
-                     loops=self.__loops.clone(), checkpoints=checkpoints)
+        return State(self.__text, groups, offset=offset, end=self.__end,
+                     loops=self.__loops.clone(), 
+                     checkpoints=self.__checkpoints)
         
-    def advance(self):
+    def advance(self, offset=None):
         '''
-        Used in search to increment start point.
+        Used in search to increment start point (by one, or to the given
+        offset).
         '''
-        if self.__text:
-            self.__increment()
+        if offset is None:
+            offset = self.__offset + 1
+        if offset <= self.__end:
+            self.__increment(offset - self.__offset)
             self.__groups.start_group(0, self.__offset)
             return True
         else:
@@ -95,31 +129,27 @@ class State(object):
         '''
         if length:
             self.__checkpoints = None
-            self.__previous = self.__text[length-1]
-            self.__text = self.__text[length:]
             self.__offset += length
     
     # below are methods that correspond roughly to opcodes in the graph.
-    # these are called from the visitor.
+    # these are called from the visitor.  those that can fail return a 
+    # boolean success flag; the rest return self.
         
     def string(self, text):
-        try:
-            l = len(text)
-            if self.__text[0:l] == text:
-                self.__increment(l)
-                return self
-        except IndexError:
-            pass
-        raise Fail
+        offset = self.__offset
+        l = len(text)
+        if offset + l <= self.__end and \
+                self.__text[offset:offset+l] == text:
+            self.__increment(l)
+            return True
+        return False
     
     def character(self, charset):
-        try:
-            if self.__text[0] in charset:
-                self.__increment()
-                return self
-        except IndexError:
-            pass
-        raise Fail
+        if self.__offset < self.__end and \
+                self.__text[self.__offset] in charset:
+            self.__increment()
+            return True
+        return False
     
     def start_group(self, number):
         self.__groups.start_group(number, self.__offset)
@@ -137,28 +167,23 @@ class State(object):
         return self
     
     def dot(self, multiline=True):
-        try:
-            if self.__text[0] and (multiline or self.__text[0] != '\n'):
+        if self.__offset < self.__end:
+            current = self.__text[self.__offset]
+            if current and (multiline or current != '\n'):
                 self.__increment()
-                return self
-        except IndexError:
-            pass
-        raise Fail
+                return True
+        return False
         
     def start_of_line(self, multiline):
-        if self.__offset == 0 or (multiline and self.__previous == '\n'):
-            return self
-        else:
-            raise Fail
+        return self.__offset == 0 or (multiline and self.previous == '\n')
             
     def end_of_line(self, multiline):
-        if ((not self.__text or (multiline and self.__text[0] == '\n'))
+        offset = self.__offset
+        end = self.__end
+        return offset == end or (
+                self.__text[offset] == '\n' and
                 # also before \n at end of text
-                or (self.__text and self.__text[0] == '\n' and
-                    not self.__text[1:])):
-            return self
-        else:
-            raise Fail
+                (multiline or offset + 1 == end))
         
     def similar(self, other):
         '''
@@ -169,11 +194,11 @@ class State(object):
     
     def checkpoint(self, token):
         if self.__checkpoints is None:
-            self.__checkpoints = set([token])
+            self.__checkpoints = frozenset([token])
         else:
             if token in self.__checkpoints:
-                raise Fail
-        return self
+                return False
+        return True
 
     @property
     def groups(self):
@@ -182,14 +207,31 @@ class State(object):
     @property
     def offset(self):
         return self.__offset
+    
+    @property
+    def end(self):
+        return self.__end
 
     @property
     def text(self):
         return self.__text
 
+    @property
+    def current(self):
+        '''
+        The character at the current offset, or None at the end of the text.
+        '''
+        if self.__offset < self.__end:
+            return self.__text[self.__offset]
+        else:
+            return None
+
     @property
     def previous(self):
-        return self.__previous
+        if self.__offset:
+            return self.__text[self.__offset-1]
+        else:
+            return None
     
     
 class Stack(object):
@@ -206,11 +248,7 @@ class Stack(object):
     further pushes that have the same increment.
     
     On popping we create a new state, and adjust the offset as necessary.
-    
-    For this to work correctly we must also be careful to preserve the
-    original state, since that is the one that contains the most text.
-    Later states have less text and so cannot be cloned "back" to having
-    an earlier offset.
+    Since states share the text, this is cheap (no text is copied).
     '''
     
     def __init__(self):
@@ -260,83 +298,161 @@ class Stack(object):
         return self.__bool__()
     
 
+class BitState(object):
+    '''
+    A bitmap of the (node, offset) pairs visited during a single run.
+    
+    Because the search is depth first, by the time a pair is visited a 
+    second time, all alternatives from the first visit have failed (or we 
+    are in a loop that has consumed no input), so the second visit can be 
+    discarded.
+    '''
+    
+    def __init__(self, node_index, start, end):
+        '''
+        `node_index` - map from node to integer index.
+        
+        `start`, `end` - the range of offsets that may be visited.
+        '''
+        self.__node_index = node_index
+        self.__width = len(node_index)
+        self.__start = start
+        self.__bits = bytearray(((end - start + 1) * self.__width + 7) // 8)
+        
+    def visit(self, node, offset):
+        '''
+        Record the visit, returning True if the pair was already visited.
+        '''
+        index = (offset - self.__start) * self.__width + self.__node_index[node]
+        byte = index >> 3
+        mask = 1 << (index & 7)
+        if self.__bits[byte] & mask:
+            return True
+        else:
+            self.__bits[byte] |= mask
+            return False
+    
+
 class BacktrackingEngine(BaseEngine, BaseVisitor):
     '''
     The interpreter.
     '''
     
-    def __init__(self, parser_state, graph):
+    def __init__(self, parser_state, graph, bit_state=False):
+        '''
+        If `bit_state` is True then visited (node, offset) pairs are 
+        recorded and not explored again (when the pattern allows).
+        '''
         super(BacktrackingEngine, self).__init__(parser_state, graph)
+        if bit_state and not (contains_instance(graph, ReadsGroup) or
+                              contains_instance(graph, Repeat)):
+            self.__node_index = {}
+            for node in node_iterator(graph):
+                if node not in self.__node_index:
+                    self.__node_index[node] = len(self.__node_index)
+            # reversed lookbacks are also run by this engine
+            for node in list(self.__node_index):
+                if isinstance(node, Lookahead) and not node.forwards:
+                    reverse = reversed_lookback(node.next[1])
+                    if reverse is not None:
+                        for node in node_iterator(reverse):
+                            if node not in self.__node_index:
+                                self.__node_index[node] = \
+                                    len(self.__node_index)
+        else:
+            self.__node_index = None
     
-    def run(self, text, pos=0, search=False):
+    def run(self, text, pos=0, search=False, budget=None):
         '''
         Execute a search.
         '''
-        self.__text = text
-        self.__pos = pos
-        
-        state = State(text[pos:],
+        state = State(text,
                       Groups(group_state=self._parser_state.groups, text=text),
-                      offset=pos, previous=text[pos-1] if pos else None)
+                      offset=pos)
 
         # for testing optimizations
         self.ticks = 0
         self.maxdepth = 0 
         
+        self.__budget = budget
+        self.__limit = Budget.limit(budget, 0, pos)
+        
         self.__stack = None
         self.__stacks = []
         self.__lookaheads = {} # map from node to set of known ok states
         
         state.start_group(0)
-        (match, state) = self.__run(self._graph, state, search=search)
+        first = FirstCharacters.for_graph(self._graph) if search else None
+        (match, state) = self.__run(self._graph, state, search=search, 
+                                    first=first)
         if match:
             state.end_group(0)
             return state.groups
         else:
             return Groups()
             
-    def __run(self, graph, state, search=False):
+    def __run(self, graph, state, search=False, first=None):
         '''
         Run a sub-search.  We support multiple searches (stacks) so that we
         can invoke the same interpreter for lookaheads etc.
         
+        If `first` is given (a `FirstCharacters`) then the search skips 
+        directly to offsets where a match could start.
+        
         This is a simple trampoline - it stores state on a stack and invokes
         the visitor interface on each graph node.  Visitor methods return 
-        either the new node and state, or raise `Fail` on failure, or
-        `Match` on success.
+        the new node and state, where the node may be `FAIL` on failure, or
+        `MATCH` on success.
         '''
         self.__stacks.append(self.__stack)
         self.__stack = Stack()
+        # failures are independent of start point, so this persists over 
+        # the search loop
+        if self.__node_index is None:
+            visited = None
+        else:
+            visited = BitState(self.__node_index, state.offset, state.end)
         try:
-            try:
-                # search loop
+            # search loop
+            while True:
+                # skip to the next possible start
+                if first is not None:
+                    offset = first.find(state.text, state.offset, state.end)
+                    if offset < 0:
+                        break
+                    elif offset > state.offset:
+                        state.advance(offset)
+                # if searching, save state for restart
+                if search:
+                    (save_state, save_graph) = (state.clone(), graph)
+                # trampoline loop
                 while True:
-                    # if searching, save state for restart
-                    if search:
-                        (save_state, save_graph) = (state.clone(), graph)
-                    # trampoline loop
-                    while True:
+                    if visited is None or \
+                            not visited.visit(graph, state.offset):
                         self.ticks += 1
-                        try:
-                            (graph, state) = graph.visit(self, state)
-                        # backtrack if stack exists
-                        except Fail:
-                            if self.__stack:
-                                (graph, state) = self.__stack.pop()
-                            else:
-                                break
-                    # nudge search forwards and try again, or exit
-                    if search:
-                        if save_state.advance():
-                            (state, graph) = (save_state, save_graph)
-                        else:
-                            break
-                    # match (not search), so exit with failure
+                        if self.ticks >= self.__limit:
+                            self.__limit = Budget.limit(
+                                self.__budget, self.ticks, state.offset)
+                        (graph, state) = graph.visit(self, state)
+                        if graph is MATCH:
+                            return (True, state)
+                        elif graph is not FAIL:
+                            continue
+                    # backtrack if stack exists
+                    if self.__stack:
+                        (graph, state) = self.__stack.pop()
+                    else:
+                        break
+                # nudge search forwards and try again, or exit
+                if search:
+                    if save_state.advance():
+                        (state, graph) = (save_state, save_graph)
                     else:
                         break
-                return (False, state)
-            except Match:
-                return (True, state)
+                # match (not search), so exit with failure
+                else:
+                    break
+            return (False, state)
         finally:
             # restore state so that another run can resume
             self.maxdepth = max(self.maxdepth, self.__stack.maxdepth)
@@ -347,10 +463,14 @@ class BacktrackingEngine(BaseEngine, BaseVisitor):
     # (typically by modifying state and returning the next node) 
         
     def string(self, next, text, state):
-        return (next[0], state.string(text))
+        if state.string(text):
+            return (next[0], state)
+        return (FAIL, state)
     
     def character(self, next, charset, state):
-        return (next[0], state.character(charset))
+        if state.character(charset):
+            return (next[0], state)
+        return (FAIL, state)
         
     def start_group(self, next, number, state):
         return (next[0], state.start_group(number))
@@ -361,14 +481,12 @@ class BacktrackingEngine(BaseEngine, BaseVisitor):
     def group_reference(self, next, number, state):
         try:
             text = state.groups.group(number)
-            if text is None:
-                raise Fail
-            elif text:
-                return (next[0], state.string(text))
+            if text is None or (text and not state.string(text)):
+                return (FAIL, state)
             else:
                 return (next[0], state)
         except KeyError:
-            raise Fail
+            return (FAIL, state)
 
     def group_conditional(self, next, number, state):
         if state.groups.group(number):
@@ -383,57 +501,80 @@ class BacktrackingEngine(BaseEngine, BaseVisitor):
         return (next[0], state)
     
     def match(self, state):
-        raise Match
+        return (MATCH, state)
 
     def no_match(self, state):
-        raise Fail
+        return (FAIL, state)
 
     def dot(self, next, multiline, state):
-        return (next[0], state.dot(multiline))
+        if state.dot(multiline):
+            return (next[0], state)
+        return (FAIL, state)
     
     def start_of_line(self, next, multiline, state):
-        return (next[0], state.start_of_line(multiline))
+        if state.start_of_line(multiline):
+            return (next[0], state)
+        return (FAIL, state)
         
     def end_of_line(self, next, multiline, state):
-        return (next[0], state.end_of_line(multiline))
+        if state.end_of_line(multiline):
+            return (next[0], state)
+        return (FAIL, state)
     
     def lookahead(self, next, node, equal, forwards, state):
         if node not in self.__lookaheads:
             self.__lookaheads[node] = {}
-        if state.offset in self.__lookaheads[node]:
+        # the end differs for lookaheads nested inside lookbacks
+        key = (state.offset, state.end)
+        if key in self.__lookaheads[node]:
             reads, mutates = False, False
-            success = self.__lookaheads[node][state.offset]
+            success = self.__lookaheads[node][key]
         else:
             (reads, mutates, size) = lookahead_logic(next[1], forwards, state.groups)
             search = False
+            graph = next[1]
+            reverse = None if forwards else reversed_lookback(graph)
             if forwards:
-                clone = State(state.text, state.groups.clone())
+                clone = State(state.text, state.groups.clone(), 
+                              offset=state.offset, end=state.end)
+            elif reverse is not None:
+                # the reversed contents are matched "forwards" from the 
+                # current offset over the reversed text
+                graph = reverse
+                clone = State(Reversed(state.text, state.offset), 
+                              state.groups.clone())
             else:
                 if size is not None and size > state.offset and equal:
-                    raise Fail
+                    return (FAIL, state)
                 elif size is None or size > state.offset:
-                    subtext = self.__text[0:state.offset]
-                    previous = None
+                    offset = 0
                     search = True
                 else:
                     offset = state.offset - size
-                    subtext = self.__text[offset:state.offset]
-                    if offset:
-                        previous = self.__text[offset-1]
-                    else:
-                        previous = None
-                clone = State(subtext, state.groups.clone(), previous=previous)
-            (match, clone) = self.__run(next[1], clone, search=search)
+                # the lookback is matched against the same text, but must
+                # finish at the current offset
+                clone = State(state.text, state.groups.clone(), 
+                              offset=offset, end=state.offset)
+            (match, clone) = self.__run(graph, clone, search=search)
             success = match == equal
             if not (reads or mutates):
-                self.__lookaheads[node][state.offset] = success
+                self.__lookaheads[node][key] = success
         # if lookahead succeeded, continue
         if success:
             if mutates:
                 state = state.clone(groups=clone.groups)
             return (next[0], state)
         else:
-            raise Fail
+            return (FAIL, state)
+
+    def atomic(self, next, node, state):
+        # the contents are matched as a sub-search, with a separate stack,
+        # so any choices made inside the group are discarded on success
+        (match, state) = self.__run(next[1], state)
+        if match:
+            return (next[0], state)
+        else:
+            return (FAIL, state)
 
     def repeat(self, next, node, begin, end, lazy, state):
         count = state.increment(node)
@@ -446,13 +587,13 @@ class BacktrackingEngine(BaseEngine, BaseVisitor):
             # with another loop, unless we've exceeded the count or there's
             # no text left
             # this is well-behaved with stack space
-            if (end is None and state.text) \
+            if (end is None and state.offset < state.end) \
                     or (end is not None and count < end):
                 self.__stack.push(next[1], state.clone())
             if end is None or count <= end:
                 return (next[0], state.drop(node))
             else:
-                raise Fail
+                return (FAIL, state)
         else:
             if end is None or count < end:
                 # add a fallback so that if a higher loop fails, we can continue
@@ -465,41 +606,42 @@ class BacktrackingEngine(BaseEngine, BaseVisitor):
                 return (next[1], state)
     
     def word_boundary(self, next, inverted, state):
-        previous = state.previous
-        try:
-            current = state.text[0]
-        except IndexError:
-            current = None
         word = self._parser_state.alphabet.word
-        boundary = word(current) != word(previous)
+        boundary = word(state.current) != word(state.previous)
         if boundary != inverted:
             return (next[0], state)
         else:
-            raise Fail
+            return (FAIL, state)
 
     def digit(self, next, inverted, state):
-        try:
-            if self._parser_state.alphabet.digit(state.text[0]) != inverted:
-                return (next[0], state.dot())
-        except IndexError:
-            pass
-        raise Fail
+        if state.offset < state.end and \
+                self._parser_state.alphabet.digit(state.current) != inverted \
+                and state.dot():
+            return (next[0], state)
+        return (FAIL, state)
     
     def space(self, next, inverted, state):
-        try:
-            if self._parser_state.alphabet.space(state.text[0]) != inverted:
-                return (next[0], state.dot())
-        except IndexError:
-            pass
-        raise Fail
+        if state.offset < state.end and \
+                self._parser_state.alphabet.space(state.current) != inverted \
+                and state.dot():
+            return (next[0], state)
+        return (FAIL, state)
     
     def word(self, next, inverted, state):
-        try:
-            if self._parser_state.alphabet.word(state.text[0]) != inverted:
-                return (next[0], state.dot())
-        except IndexError:
-            pass
-        raise Fail
+        if state.offset < state.end and \
+                self._parser_state.alphabet.word(state.current) != inverted \
+                and state.dot():
+            return (next[0], state)
+        return (FAIL, state)
 
     def checkpoint(self, next, token, state):
-        return (next[0], state.checkpoint(token))
+        if state.checkpoint(token):
+            return (next[0], state)
+        return (FAIL, state)
+
+
+class BitStateBacktrackingEngine(BacktrackingEngine):
+    
+    def __init__(self, parser_state, graph, bit_state=True):
+        super(BitStateBacktrackingEngine, self).__init__(parser_state, graph, 
+                                                         bit_state=bit_state)
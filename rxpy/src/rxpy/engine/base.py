@@ -51,7 +51,7 @@ class BaseEngine(object):
         self._parser_state = parser_state
         self._graph = graph
         
-    def run(self, text, pos=0, search=False):
+    def run(self, text, pos=0, search=False, budget=None):
         '''
         Search or match the given text.
         
@@ -62,6 +62,11 @@ class BaseEngine(object):
         - `search` is `True` if characters (from `pos` on) can be discarded
           while searching for a match; if `False` the match must start at
           `text[pos]`.
+          
+        - `budget` is an optional `Budget`.  Engines should count work in
+          `ticks` and call `Budget.limit()` whenever it reaches the value
+          previously returned (so that `BudgetException` is raised when
+          the budget is exhausted).
         
         A `Groups` instance should be returned.
         '''
@@ -0,0 +1,78 @@
+
+# The contents of this file are subject to the Mozilla Public License
+# (MPL) Version 1.1 (the "License"); you may not use this file except
+# in compliance with the License. You may obtain a copy of the License
+# at http://www.mozilla.org/MPL/                                      
+#                                                                     
+# Software distributed under the License is distributed on an "AS IS" 
+# basis, WITHOUT WARRANTY OF ANY KIND, either express or implied. See 
+# the License for the specific language governing rights and          
+# limitations under the License.                                      
+#                                                                     
+# The Original Code is RXPY (http://www.acooke.org/rxpy)              
+# The Initial Developer of the Original Code is Andrew Cooke.         
+# Portions created by the Initial Developer are Copyright (C) 2010
+# Andrew Cooke (andrew@acooke.org). All Rights Reserved.               
+#                                                                      
+# Alternatively, the contents of this file may be used under the terms 
+# of the LGPL license (the GNU Lesser General Public License,          
+# http://www.gnu.org/licenses/lgpl.html), in which case the provisions 
+# of the LGPL License are applicable instead of those above.           
+#                                                                      
+# If you wish to allow use of your version of this file only under the 
+# terms of the LGPL License and not to allow others to use your version
+# of this file under the MPL, indicate your decision by deleting the   
+# provisions above and replace them with the notice and other provisions
+# required by the LGPL License.  If you do not delete the provisions    
+# above, a recipient may use your version of this file under either the 
+# MPL or the LGPL License.          
+
+
+from unittest import TestCase
+
+from rxpy.engine.generated.engine import GeneratedEngine
+from rxpy.engine._test.engine import EngineTest
+
+
+class GeneratedEngineTest(EngineTest, TestCase):
+    
+    def default_engine(self):
+        return GeneratedEngine
+    
+    def test_source(self):
+        engine = GeneratedEngine(*self.parse('a(?=b)c'))
+        assert 'def match(' in engine.source, engine.source
+        assert 'def lookahead_1(' in engine.source, engine.source
+        
+    def test_long_text(self):
+        # greedy repetition of a single character is a loop, with a single 
+        # stack entry for backtracking
+        groups = self.engine(self.parse('.*b'), 100000 * 'a' + 'b')
+        assert groups.end(0) == 100001, groups.end(0)
+        groups = self.engine(self.parse('(a*)a'), 100000 * 'a')
+        assert groups.end(1) == 99999, groups.end(1)
+        groups = self.engine(self.parse('x[^y]*y'), 'x' + 100000 * 'a' + 'y', 
+                             search=True)
+        assert groups.end(0) == 100002, groups.end(0)
+    
+    def test_undo(self):
+        # groups are restored on backtracking
+        assert_groups = lambda p, t, g: \
+            self.assertEqual(self.engine(self.parse(p), t).groups, g)
+        assert_groups('(a)?(?:(b)c|bd)', 'abd', 
+                      {0: ('abd', 0, 3), 1: ('a', 0, 1)})
+        assert_groups('(?:(a)|b)*', 'ab', 
+                      {0: ('ab', 0, 2), 1: ('a', 0, 1)})
+        assert_groups('(?:(a)|(b)){1,2}c', 'abc', 
+                      {0: ('abc', 0, 3), 1: ('a', 0, 1), 2: ('b', 1, 2)})
+        
+    def test_cache(self):
+        from gc import collect
+        from weakref import ref
+        parsed = self.parse('(a)[bc]*(?=d)')
+        engine = GeneratedEngine(*parsed)
+        assert GeneratedEngine(*parsed).source is engine.source
+        graph = ref(parsed[1])
+        del parsed, engine
+        collect()
+        assert graph() is None
@@ -0,0 +1,667 @@
+
+# The contents of this file are subject to the Mozilla Public License
+# (MPL) Version 1.1 (the "License"); you may not use this file except
+# in compliance with the License. You may obtain a copy of the License
+# at http://www.mozilla.org/MPL/                                      
+#                                                                     
+# Software distributed under the License is distributed on an "AS IS" 
+# basis, WITHOUT WARRANTY OF ANY KIND, either express or implied. See 
+# the License for the specific language governing rights and          
+# limitations under the License.                                      
+#                                                                     
+# The Original Code is RXPY (http://www.acooke.org/rxpy)              
+# The Initial Developer of the Original Code is Andrew Cooke.         
+# Portions created by the Initial Developer are Copyright (C) 2010
+# Andrew Cooke (andrew@acooke.org). All Rights Reserved.               
+#                                                                      
+# Alternatively, the contents of this file may be used under the terms 
+# of the LGPL license (the GNU Lesser General Public License,          
+# http://www.gnu.org/licenses/lgpl.html), in which case the provisions 
+# of the LGPL License are applicable instead of those above.           
+#                                                                      
+# If you wish to allow use of your version of this file only under the 
+# terms of the LGPL License and not to allow others to use your version
+# of this file under the MPL, indicate your decision by deleting the   
+# provisions above and replace them with the notice and other provisions
+# required by the LGPL License.  If you do not delete the provisions    
+# above, a recipient may use your version of this file under either the 
+# MPL or the LGPL License.          
+
+'''
+An engine that generates Python source for a function that matches the
+pattern, then loads it with `compile()` and `exec`.
+
+The generated function is a backtracking matcher with the same semantics
+as `BacktrackingEngine`.  However, there is no dispatch through the 
+`Visitor` interface and no state object: the graph is walked once (when the
+engine is created) and straight-line sections are inlined as simple tests
+on the text.  The offset is a local variable and groups, checkpoints and 
+loop counts are stored in a flat list of "slots".  Choice points are pushed
+to a stack, along with the old value of any slot that is modified while they
+are pending (an undo log), so nothing is copied on branching.
+
+Sections of the graph that start at a choice point (or are reached from 
+more than one place) become "blocks" in a single loop.  Greedy repetition
+of a single character is compiled to an inner loop, with a single stack 
+entry for the positions that backtracking may return to.
+
+Work is counted (as `ticks`) once per block, so that a `Budget` can be
+enforced.  The count is a local variable; the engine is passed to the
+generated code to read and update the budget.
+
+Lookaheads and atomic groups are compiled to separate functions in the 
+same source (so the stack for an atomic group is discarded when it 
+matches).  The source is available as `GeneratedEngine.source` (which is 
+useful when debugging).
+
+Since the compat layer creates a new engine for each match, the compiled
+code is cached against the graph.  The generated code holds no references 
+to the graph, so the cache does not keep patterns alive.
+'''
+
+from weakref import WeakKeyDictionary
+
+from rxpy.alphabet.ascii import Ascii
+from rxpy.alphabet.unicode import Unicode
+from rxpy.engine.base import BaseEngine
+from rxpy.engine.support import Groups, lookahead_logic, FirstCharacters, \
+    Reversed, reversed_lookback
+from rxpy.graph.opcode import String, Character, Dot, Digit, Space, Word, \
+    Split, Lookahead, Repeat, Conditional, Atomic
+from rxpy.graph.visitor import BaseVisitor
+from rxpy.lib import Budget
+
+
+# types that can be written directly in the source (repr() is exact)
+_LITERALS = (str, unicode, int, long)
+
+
+def max_group(group_state):
+    '''
+    The largest group index (indices need not be contiguous).
+    '''
+    return max([0] + list(group_state.indices))
+
+
+class Source(object):
+    '''
+    Accumulate lines of indented source.
+    '''
+    
+    def __init__(self):
+        self.__lines = []
+        self.__indent = 0
+        
+    def __call__(self, line):
+        self.__lines.append('    ' * self.__indent + line)
+        
+    def indent(self):
+        self.__indent += 1
+        
+    def dedent(self):
+        self.__indent -= 1
+        
+    def extend(self, source):
+        '''
+        Add the lines from another source at the current indentation.
+        '''
+        for line in source.__lines:
+            self(line)
+        
+    def __str__(self):
+        return '\n'.join(self.__lines) + '\n'
+
+
+class Generator(BaseVisitor):
+    '''
+    Generate the source for a pattern.  The visitor methods take a `Source`
+    as state, write the code for the node, and return the node that follows
+    (or `None` if control has been transferred elsewhere).
+    '''
+    
+    def __init__(self, parser_state, graph):
+        self.__alphabet = parser_state.alphabet
+        self.__strings = isinstance(self.__alphabet, (Ascii, Unicode))
+        self.__count = max_group(parser_state.groups)
+        # slots are (open, start, end) for each group, then lastindex, 
+        # followed by checkpoints and loop counts
+        self.__lastindex = 3 * (self.__count + 1)
+        self.__slots = {}
+        self.__constants = {}
+        self.__namespace = {'word': self.__alphabet.word,
+                            'digit': self.__alphabet.digit,
+                            'space': self.__alphabet.space,
+                            'merge': self.__merge(self.__lastindex)}
+        self.__functions = {}
+        self.__pending = []
+        # the function, blocks and node currently being generated
+        self.__name = None
+        self.__blocks = None
+        self.__node = None
+        # is the stack known to be non-empty (so no test needed)?
+        self.__pushed = False
+        self.__function(graph, 'match')
+        sources = []
+        while self.__pending:
+            sources.append(self.__generate(*self.__pending.pop(0)))
+        self.source = '\n'.join(sources)
+    
+    def load(self):
+        '''
+        Compile the source, returning the matcher and the initial slots.
+        '''
+        code = compile(self.source, '<rxpy.engine.generated>', 'exec')
+        exec code in self.__namespace
+        return (self.__namespace['match'], 
+                [None] * (self.__lastindex + 1 + len(self.__slots)))
+    
+    @staticmethod
+    def __merge(lastindex):
+        '''
+        A function to copy groups from a lookahead into the current slots.
+        '''
+        def merge(slots, lookahead, stack):
+            for slot in range(3, lastindex + 1):
+                if slots[slot] != lookahead[slot]:
+                    if stack:
+                        stack.append(slots[slot])
+                        stack.append(~slot)
+                    slots[slot] = lookahead[slot]
+        return merge
+    
+    def __function(self, graph, name='lookahead_'):
+        '''
+        The name of the function for the given graph (generating it later
+        if necessary).  Names ending in "_" are numbered.
+        '''
+        if graph not in self.__functions:
+            if name.endswith('_'):
+                name += str(len(self.__functions))
+            self.__functions[graph] = name
+            self.__pending.append((graph, name))
+        return self.__functions[graph]
+    
+    def __slot(self, node):
+        '''
+        The slot for a checkpoint or loop count.
+        '''
+        if node not in self.__slots:
+            self.__slots[node] = self.__lastindex + 1 + len(self.__slots)
+        return self.__slots[node]
+    
+    def __constant(self, value):
+        '''
+        A literal, or the name of a constant in the namespace.
+        '''
+        if isinstance(value, _LITERALS):
+            return repr(value)
+        if id(value) not in self.__constants:
+            name = 'k' + str(len(self.__constants))
+            self.__constants[id(value)] = name
+            self.__namespace[name] = value
+        return self.__constants[id(value)]
+    
+    def __find_blocks(self, graph):
+        '''
+        Identify the nodes that start blocks.  These are the entry point,
+        nodes that are resumed from the stack, the targets of branches,
+        and nodes reached from more than one place.  Repeats also have 
+        an exit block (keyed by the tuple `(node,)`).
+        '''
+        starts = [graph]
+        counts = {}
+        stack = [graph]
+        while stack:
+            node = stack.pop()
+            counts[node] = counts.get(node, 0) + 1
+            if counts[node] > 1:
+                continue
+            next = node.next
+            if isinstance(node, (Lookahead, Atomic)):
+                next = next[0:1]
+            elif isinstance(node, (Split, Conditional)):
+                starts.extend(next[1:])
+                if isinstance(node, Conditional):
+                    starts.append(next[0])
+            elif isinstance(node, Repeat):
+                starts.extend([(node,)] + next)
+            stack.extend(reversed(next))
+        starts.extend(node for node in counts if counts[node] > 1)
+        blocks = {}
+        for node in starts:
+            if node not in blocks:
+                blocks[node] = len(blocks)
+        return blocks
+    
+    def __generate(self, graph, name):
+        self.__name = name
+        self.__blocks = self.__find_blocks(graph)
+        self.__ranges = False
+        body = Source()
+        for node in sorted(self.__blocks, key=self.__blocks.get):
+            index = self.__blocks[node]
+            body(('elif' if index else 'if') + ' block == %d:' % index)
+            body.indent()
+            if isinstance(node, tuple):
+                # repeat exit: drop count and continue after loop
+                self.__write(body, (self.__slot(node[0]), 'None'))
+                self.__jump(body, node[0].next[0])
+            else:
+                self.__chain(node, body)
+            body.dedent()
+        # skip to possible starts when searching (lookbacks also search, 
+        # but are anchored at the end, so this is only for the main match)
+        first = FirstCharacters.for_graph(graph) if name == 'match' else None
+        src = Source()
+        src('def %s(text, pos, end, search, initial, engine):' % name)
+        src.indent()
+        src('ticks = engine.ticks')
+        src('limit = engine.limit')
+        src('start = pos')
+        if first is not None:
+            src('if search:')
+            src('    start = %s.find(text, start, end)' % 
+                self.__constant(first))
+            src('    if start < 0:')
+            src('        return None')
+        src('while True:')
+        src.indent()
+        src('s = list(initial)')
+        if name == 'match':
+            src('s[0] = start')
+        src('offset = start')
+        src('stack = []')
+        src('block = 0')
+        src('while True:')
+        src.indent()
+        src('while True:')
+        src.indent()
+        src('ticks += 1')
+        src('if ticks >= limit:')
+        src('    limit = engine.check(ticks, offset)')
+        src.extend(body)
+        src.dedent()
+        src('while stack:')
+        src.indent()
+        src('code = stack.pop()')
+        src('if code < 0:')
+        src('    s[~code] = stack.pop()')
+        src('elif code < %d:' % len(self.__blocks))
+        src('    offset = stack.pop()')
+        src('    block = code')
+        src('    break')
+        if self.__ranges:
+            # greedy repeat: retry one step back until lower limit
+            src('else:')
+            src('    offset = stack.pop() - 1')
+            src('    if offset > stack[-1]:')
+            src('        stack.append(offset)')
+            src('        stack.append(code)')
+            src('    else:')
+            src('        stack.pop()')
+            src('    block = code - %d' % len(self.__blocks))
+            src('    break')
+        src.dedent()
+        src('else:')
+        src('    break')
+        src.dedent()
+        src('if not search or start >= end:')
+        src('    engine.ticks = ticks')
+        src('    return None')
+        if first is None:
+            src('start += 1')
+        else:
+            src('start = %s.find(text, start + 1, end)' % 
+                self.__constant(first))
+            src('if start < 0:')
+            src('    engine.ticks = ticks')
+            src('    return None')
+        return str(src)
+    
+    def __chain(self, node, src):
+        '''
+        Inline nodes until control passes to another block.
+        '''
+        first = True
+        self.__pushed = False
+        while node is not None:
+            if not first and node in self.__blocks:
+                self.__jump(src, node)
+                return
+            first = False
+            self.__node = node
+            node = node.visit(self, src)
+            
+    def __jump(self, src, node):
+        src('block = %d' % self.__blocks[node])
+        src('continue')
+        
+    def __push(self, src, node):
+        src('stack.append(offset)')
+        src('stack.append(%d)' % self.__blocks[node])
+        self.__pushed = True
+        
+    def __write(self, src, *assignments):
+        '''
+        Assign values to slots, recording the old values if they may be 
+        needed on backtracking.
+        '''
+        if not self.__pushed:
+            src('if stack:')
+            src.indent()
+        src('stack.extend((' + 
+            ', '.join('s[%d], %d' % (slot, ~slot) 
+                      for (slot, _value) in assignments) + '))')
+        if not self.__pushed:
+            src.dedent()
+        for (slot, value) in assignments:
+            src('s[%d] = %s' % (slot, value))
+            
+    def __accept(self, node, c):
+        '''
+        An expression that is true if `node` matches the character `c` 
+        (for nodes that match a single character).
+        '''
+        if isinstance(node, String):
+            return '%s == %s' % (c, self.__constant(node.text[0]))
+        elif isinstance(node, Dot):
+            # see BacktrackingEngine.State.dot - characters must be "true"
+            test = [] if self.__strings else [c]
+            if not node.multiline:
+                test.append("%s != '\\n'" % c)
+            return ' and '.join(test) if test else 'True'
+        elif isinstance(node, Character):
+            return self.__character(node, c)
+        else:
+            method = {Digit: 'digit', Space: 'space', Word: 'word'}[type(node)]
+            return '%s and %s(%s) != %s' % (c, method, c, node.inverted)
+        
+    def __character(self, node, c):
+        if node.complete:
+            return str(not node.inverted)
+        intervals = node.intervals
+        if node.classes or len(intervals) > 4 or \
+                not all(isinstance(value, _LITERALS) 
+                        for interval in intervals for value in interval):
+            # Character.__contains__ includes the inversion (the clone 
+            # avoids a reference to the graph)
+            return '%s in %s' % (c, self.__constant(node.clone()))
+        tests = []
+        for (a, b) in intervals:
+            if a == b:
+                tests.append('%s == %r' % (c, a))
+            else:
+                tests.append('%r <= %s <= %r' % (a, c, b))
+        test = ' or '.join(tests) if tests else 'False'
+        if node.inverted:
+            test = 'not (%s)' % test
+        return test
+            
+    def __single(self, src):
+        '''
+        Match a single character.
+        '''
+        node = self.__node
+        src('if offset >= end:')
+        src('    break')
+        src('c = text[offset]')
+        src('if not (%s):' % self.__accept(node, 'c'))
+        src('    break')
+        src('offset += 1')
+        return node.next[0]
+    
+    def __greedy(self, node):
+        '''
+        If this split is a greedy loop over a single character then return 
+        the character node.
+        '''
+        if len(node.next) == 2:
+            body = node.next[0]
+            if isinstance(body, (Character, Dot, Digit, Space, Word)) or \
+                    (isinstance(body, String) and len(body.text) == 1):
+                if body.next[0] is node and body not in self.__blocks:
+                    return body
+        return None
+    
+    # below are the visitor methods
+    
+    def string(self, next, text, src):
+        if len(text) == 1:
+            src('if offset >= end or text[offset] != %s:' % 
+                self.__constant(text[0]))
+            src('    break')
+            src('offset += 1')
+        else:
+            length = len(text)
+            src('if offset + %d > end or text[offset:offset+%d] != %s:' % 
+                (length, length, self.__constant(text)))
+            src('    break')
+            src('offset += %d' % length)
+        return next[0]
+    
+    def character(self, next, charset, src):
+        return self.__single(src)
+    
+    def dot(self, next, multiline, src):
+        return self.__single(src)
+    
+    def digit(self, next, inverted, src):
+        return self.__single(src)
+    
+    def space(self, next, inverted, src):
+        return self.__single(src)
+    
+    def word(self, next, inverted, src):
+        return self.__single(src)
+    
+    def start_group(self, next, number, src):
+        self.__write(src, (3 * number, 'offset'))
+        return next[0]
+    
+    def end_group(self, next, number, src):
+        slot = 3 * number
+        assignments = [(slot + 1, 's[%d]' % slot), (slot + 2, 'offset')]
+        if number:
+            assignments.append((self.__lastindex, number))
+        self.__write(src, *assignments)
+        return next[0]
+    
+    def group_reference(self, next, number, src):
+        slot = 3 * number
+        src('if s[%d] is None:' % (slot + 1))
+        src('    break')
+        src('length = s[%d] - s[%d]' % (slot + 2, slot + 1))
+        src('if length:')
+        src('    if offset + length > end or text[offset:offset+length] != '
+            'text[s[%d]:s[%d]]:' % (slot + 1, slot + 2))
+        src('        break')
+        src('    offset += length')
+        return next[0]
+    
+    def group_conditional(self, next, number, src):
+        src('if s[%d] is not None:' % (3 * number + 1))
+        src.indent()
+        self.__jump(src, next[1])
+        src.dedent()
+        self.__jump(src, next[0])
+        
+    def split(self, next, src):
+        loop = self.__greedy(self.__node)
+        if loop:
+            # consume as much as possible, then push a single entry that
+            # covers all the positions we may backtrack to
+            self.__ranges = True
+            src('lo = offset')
+            src('while offset < end:')
+            src('    c = text[offset]')
+            src('    if not (%s):' % self.__accept(loop, 'c'))
+            src('        break')
+            src('    offset += 1')
+            src('if offset > lo:')
+            src('    stack.extend((lo, offset, %d))' % 
+                (len(self.__blocks) + self.__blocks[next[1]]))
+            self.__jump(src, next[1])
+        else:
+            for node in reversed(next[1:]):
+                self.__push(src, node)
+            return next[0]
+    
+    def match(self, src):
+        # the end offset is also used by atomic groups
+        if self.__name == 'match':
+            src('s[1] = s[0]')
+        src('s[2] = offset')
+        src('engine.ticks = ticks')
+        src('return s')
+        
+    def no_match(self, src):
+        src('break')
+        
+    def start_of_line(self, next, multiline, src):
+        if multiline:
+            src("if offset and text[offset-1] != '\\n':")
+        else:
+            src('if offset:')
+        src('    break')
+        return next[0]
+        
+    def end_of_line(self, next, multiline, src):
+        src("if offset != end and not (text[offset] == '\\n' and %s):" %
+            ('True' if multiline else 'offset + 1 == end'))
+        src('    break')
+        return next[0]
+    
+    def word_boundary(self, next, inverted, src):
+        src('if (word(text[offset] if offset < end else None) != '
+            'word(text[offset-1] if offset else None)) == %s:' % inverted)
+        src('    break')
+        return next[0]
+    
+    def checkpoint(self, next, node, src):
+        slot = self.__slot(node)
+        src('if s[%d] == offset:' % slot)
+        src('    break')
+        self.__write(src, (slot, 'offset'))
+        return next[0]
+    
+    def lookahead(self, next, node, equal, forwards, src):
+        reverse = None if forwards else reversed_lookback(next[1])
+        name = self.__function(next[1] if reverse is None else reverse)
+        (_reads, mutates, size) = lookahead_logic(next[1], forwards, None)
+        # the lookahead continues the count
+        src('engine.ticks = ticks')
+        if forwards:
+            src('r = %s(text, offset, end, False, s, engine)' % name)
+        elif reverse is not None:
+            # match the reversed contents over the reversed text
+            src('r = %s(%s(text, offset), 0, offset, False, s, engine)' % 
+                (name, self.__constant(Reversed)))
+        elif size is None:
+            src('r = %s(text, 0, offset, True, s, engine)' % name)
+        else:
+            src('r = %s(text, offset - %d, offset, False, s, engine) '
+                'if offset >= %d else None' % (name, size, size))
+        src('ticks = engine.ticks')
+        src('limit = engine.limit')
+        if equal:
+            src('if r is None:')
+            src('    break')
+            if mutates:
+                src('merge(s, r, stack)')
+        else:
+            src('if r is not None:')
+            src('    break')
+        return next[0]
+    
+    def atomic(self, next, node, src):
+        name = self.__function(next[1], 'atomic_')
+        (_reads, mutates, _size) = lookahead_logic(next[1], True, None)
+        src('engine.ticks = ticks')
+        src('r = %s(text, offset, end, False, s, engine)' % name)
+        src('ticks = engine.ticks')
+        src('limit = engine.limit')
+        src('if r is None:')
+        src('    break')
+        if mutates:
+            src('merge(s, r, stack)')
+        src('offset = r[2]')
+        return next[0]
+    
+    def repeat(self, next, node, begin, end, lazy, src):
+        slot = self.__slot(node)
+        src('count = 0 if s[%d] is None else s[%d] + 1' % (slot, slot))
+        self.__write(src, (slot, 'count'))
+        if begin:
+            src('if count < %d:' % begin)
+            src.indent()
+            self.__jump(src, next[1])
+            src.dedent()
+        if lazy:
+            # continue, but allow another loop on failure
+            src('if %s:' % ('offset < end' if end is None 
+                            else 'count < %d' % end))
+            src.indent()
+            self.__push(src, next[1])
+            src.dedent()
+            if end is not None:
+                src('if count > %d:' % end)
+                src('    break')
+            self.__write(src, (slot, 'None'))
+            self.__jump(src, next[0])
+        else:
+            # loop again, but allow exit on failure
+            if end is None:
+                self.__push(src, (node,))
+            else:
+                src('if count < %d:' % end)
+                src.indent()
+                self.__push(src, (node,))
+                src.dedent()
+                src('if count == %d:' % end)
+                src.indent()
+                self.__write(src, (slot, 'None'))
+                self.__jump(src, next[0])
+                src.dedent()
+            self.__jump(src, next[1])
+
+
+class GeneratedEngine(BaseEngine):
+    '''
+    Generate, compile and run a matcher for the pattern.
+    '''
+    
+    # map from graph to (source, matcher, initial slots)
+    __cache = WeakKeyDictionary()
+    
+    def __init__(self, parser_state, graph):
+        super(GeneratedEngine, self).__init__(parser_state, graph)
+        if graph not in self.__cache:
+            generator = Generator(parser_state, graph)
+            self.__cache[graph] = (generator.source,) + generator.load()
+        (self.source, self.__match, self.__initial) = self.__cache[graph]
+        self.__count = max_group(parser_state.groups)
+        
+    def run(self, text, pos=0, search=False, budget=None):
+        self.ticks = 0
+        self.__budget = budget
+        self.limit = Budget.limit(budget, 0, pos)
+        slots = self.__match(text, pos, len(text), search, self.__initial, 
+                             self)
+        if slots is None:
+            return Groups()
+        count = self.__count
+        groups = {}
+        for number in range(count + 1):
+            (start, end) = slots[3*number+1:3*number+3]
+            if start is not None:
+                groups[number] = (text[start:end], start, end)
+        return Groups(self._parser_state.groups, text, groups, None, 
+                      slots[3 * (count + 1)])
+    
+    def check(self, ticks, offset):
+        '''
+        Called from the generated code when `ticks` reaches `limit`.
+        '''
+        self.ticks = ticks
+        self.limit = Budget.limit(self.__budget, ticks, offset)
+        return self.limit
@@ -0,0 +1,80 @@
+
+# The contents of this file are subject to the Mozilla Public License
+# (MPL) Version 1.1 (the "License"); you may not use this file except
+# in compliance with the License. You may obtain a copy of the License
+# at http://www.mozilla.org/MPL/                                      
+#                                                                     
+# Software distributed under the License is distributed on an "AS IS" 
+# basis, WITHOUT WARRANTY OF ANY KIND, either express or implied. See 
+# the License for the specific language governing rights and          
+# limitations under the License.                                      
+#                                                                     
+# The Original Code is RXPY (http://www.acooke.org/rxpy)              
+# The Initial Developer of the Original Code is Andrew Cooke.         
+# Portions created by the Initial Developer are Copyright (C) 2010
+# Andrew Cooke (andrew@acooke.org). All Rights Reserved.               
+#                                                                      
+# Alternatively, the contents of this file may be used under the terms 
+# of the LGPL license (the GNU Lesser General Public License,          
+# http://www.gnu.org/licenses/lgpl.html), in which case the provisions 
+# of the LGPL License are applicable instead of those above.           
+#                                                                      
+# If you wish to allow use of your version of this file only under the 
+# terms of the LGPL License and not to allow others to use your version
+# of this file under the MPL, indicate your decision by deleting the   
+# provisions above and replace them with the notice and other provisions
+# required by the LGPL License.  If you do not delete the provisions    
+# above, a recipient may use your version of this file under either the 
+# MPL or the LGPL License.          
+
+
+from unittest import TestCase
+
+from rxpy.compat.support import compile
+from rxpy.engine.parallel.stream import Stream
+from rxpy.engine.parallel.wide.engine import WideEngine
+from rxpy.engine.quick.dfa.engine import DfaEngine
+from rxpy.lib import UnsupportedOperation
+from rxpy.parser.pattern import parse_pattern
+
+
+class StreamTest(TestCase):
+    
+    def assert_stream(self, pattern, text, size, engine=WideEngine):
+        regexp = compile(pattern, engine=engine)
+        expected = [(found.span(), found.groups()) 
+                    for found in regexp.finditer(text)]
+        stream = regexp.stream()
+        matches = []
+        for offset in range(0, len(text), size):
+            matches += stream.feed(text[offset:offset+size])
+        matches += stream.finish()
+        result = [(found.span(), found.groups()) for found in matches]
+        assert result == expected, (pattern, size, result, expected)
+        
+    def test_chunks(self):
+        text = 'ab abbc\nxa bab\nc ab'
+        for pattern in ['a+', 'ab|b', '(a)(b*)', 'x*', '^a', 'b$', '(?m)^a',
+                        '\\bab\\b', 'a.c', '(a|b)*?c', '[ab]{2,3}', '(a)b\\1',
+                        '']:
+            for size in (1, 2, 3, 7, 100):
+                self.assert_stream(pattern, text, size)
+                
+    def test_reparse(self):
+        self.assert_stream('a{2}b', 'aab xaabaab', 2, engine=DfaEngine)
+        
+    def test_retained(self):
+        # only text from the start of the current threads is kept
+        stream = Stream(*parse_pattern('ab+c', WideEngine))
+        found = []
+        for i in range(100):
+            found += stream.feed('xxx abbc xab')
+            # the previous character and the pending 'ab'
+            assert stream.retained == 3, stream.retained
+        assert len(found) == 100
+        assert found[-1].start(0) == 1192
+        assert stream.finish() == []
+        
+    def test_lookahead(self):
+        self.assertRaises(UnsupportedOperation, Stream,
+                          *parse_pattern('a(?=b)', WideEngine))
@@ -0,0 +1,72 @@
+
+# The contents of this file are subject to the Mozilla Public License
+# (MPL) Version 1.1 (the "License"); you may not use this file except
+# in compliance with the License. You may obtain a copy of the License
+# at http://www.mozilla.org/MPL/                                      
+#                                                                     
+# Software distributed under the License is distributed on an "AS IS" 
+# basis, WITHOUT WARRANTY OF ANY KIND, either express or implied. See 
+# the License for the specific language governing rights and          
+# limitations under the License.                                      
+#                                                                     
+# The Original Code is RXPY (http://www.acooke.org/rxpy)              
+# The Initial Developer of the Original Code is Andrew Cooke.         
+# Portions created by the Initial Developer are Copyright (C) 2010
+# Andrew Cooke (andrew@acooke.org). All Rights Reserved.               
+#                                                                      
+# Alternatively, the contents of this file may be used under the terms 
+# of the LGPL license (the GNU Lesser General Public License,          
+# http://www.gnu.org/licenses/lgpl.html), in which case the provisions 
+# of the LGPL License are applicable instead of those above.           
+#                                                                      
+# If you wish to allow use of your version of this file only under the 
+# terms of the LGPL License and not to allow others to use your version
+# of this file under the MPL, indicate your decision by deleting the   
+# provisions above and replace them with the notice and other provisions
+# required by the LGPL License.  If you do not delete the provisions    
+# above, a recipient may use your version of this file under either the 
+# MPL or the LGPL License.          
+
+
+from unittest import TestCase
+
+from rxpy.engine.base import BaseEngine
+from rxpy.engine.parallel.support import SparseSet, node_indices
+from rxpy.parser.pattern import parse_pattern
+
+
+class SparseSetTest(TestCase):
+    
+    def test_add(self):
+        s = SparseSet(10)
+        assert 3 not in s
+        s.add(3)
+        s.add(7)
+        s.add(3)
+        assert 3 in s
+        assert 7 in s
+        assert 0 not in s
+        assert len(s) == 2
+        assert list(s) == [3, 7]
+        
+    def test_clear(self):
+        s = SparseSet(10)
+        s.add(0)
+        s.add(9)
+        s.clear()
+        assert 0 not in s
+        assert 9 not in s
+        assert len(s) == 0
+        s.add(9)
+        assert 9 in s
+        assert 0 not in s
+        
+        
+class NodeIndicesTest(TestCase):
+    
+    def test_indices(self):
+        graph = parse_pattern('a(?:b|c)*d', BaseEngine)[1]
+        indices = node_indices(graph)
+        assert indices is node_indices(graph)
+        assert sorted(indices.values()) == list(range(len(indices)))
+        assert indices[id(graph)] == 0
@@ -29,10 +29,12 @@
 
 from rxpy.engine.base import BaseEngine
 from rxpy.graph.visitor import BaseVisitor
-from rxpy.lib import _CHARS, SafeCache
-from rxpy.engine.parallel.support import State, States
-from rxpy.engine.support import Groups, lookahead_logic
-from rxpy.graph.opcode import String
+from rxpy.lib import _CHARS, SafeCache, Budget
+from rxpy.engine.parallel.support import State, States, node_indices
+from rxpy.engine.support import Groups, lookahead_logic, FirstCharacters, \
+    Reversed, reversed_lookback
+from rxpy.graph.opcode import String, Repeat
+from rxpy.graph.support import contains_instance, ReadsGroup
 from rxpy.graph.container import Sequence
 
 
@@ -47,31 +49,45 @@ class ParallelEngine(BaseEngine, BaseVisitor):
     REQUIRE = _CHARS
     
     def __init__(self, parser_state, graph, hash_state=False):
+        '''
+        Duplicate threads are always discarded; `hash_state` is retained for
+        compatibility only.
+        '''
         super(ParallelEngine, self).__init__(parser_state, graph)
         self._hash_state = hash_state
-        
-    def _new_state(self, groups=None, loops=None, text=None):
-        if groups:
-            return State(self._graph, loops=loops, groups=groups, checks=None)
+        self.__reads = contains_instance(graph, ReadsGroup)
+        self.__width = max([0] + list(parser_state.groups.indices)) + 1
+        # threads are identified by node unless they carry other state
+        if self.__reads or contains_instance(graph, Repeat):
+            self._indices = None
         else:
-            return State(self._graph, loops=loops, checks=None, 
-                         text=text, group_state=self._parser_state.groups)
+            self._indices = node_indices(graph)
+        # map from reversed lookback graph to engine
+        self.__lookbacks = {}
+        
+    def _new_state(self, slots=None, loops=None, text=None):
+        return State(self._graph, 
+                     (text, self._parser_state.groups, self.__reads, 
+                      self.__width),
+                     slots=slots, loops=loops, checks=None)
         
     def _new_states(self, initial):
-        return States(initial, self._hash_state)
+        return States(initial, self._indices)
     
     def _new_engine(self, graph):
         return type(self)(self._parser_state, graph, 
                           hash_state=self._hash_state)
         
-    def run(self, text, pos=0, search=False):
+    def run(self, text, pos=0, search=False, budget=None):
         '''
         Execute a search.
         '''
         new_state = lambda offset: self._new_state(text=text).start_group(0, offset)
         state = new_state(pos)
         
-        state = self.run_state(state, text, pos, search, new_state)
+        first = FirstCharacters.for_graph(self._graph) if search else None
+        state = self.run_state(state, text, pos, search, new_state, 
+                               budget=budget, first=first)
         
         if state:
             state.end_group(0, state.match_offset)
@@ -90,26 +106,64 @@ class ParallelEngine(BaseEngine, BaseVisitor):
         else:
             self._previous = None
         
-    def run_state(self, state, text, pos, search, new_state):
+    def run_state(self, state, text, pos, search, new_state, 
+                  budget=None, ticks=0, first=None):
+        '''
+        `ticks` is the initial count (non-zero for lookaheads, so that the
+        budget is shared).
         
+        `first` is an optional `FirstCharacters`; when searching, new 
+        threads are only started where a match could begin.
+        '''
+        self._start(text, pos, budget=budget, ticks=ticks, first=first)
+        states = self._new_states([] if search else [state])
+        self._outer_loop(states, search, new_state)
+        return states.final_state
+    
+    def _start(self, text, pos, budget=None, ticks=0, first=None):
+        '''
+        Initialise the state used while matching.
+        '''
         self._text = text
         self._offset = pos
         self.__lookaheads = {} # can we delete some of this as we progress?
+        self.__atomics = {} # map from node to map from offset to end
         self.__groups = SafeCache()
         self._set_offset(pos)
-        self.ticks = 0
+        self.ticks = ticks
         self.maxwidth = 0
+        self.__budget = budget
+        self.__limit = Budget.limit(budget, ticks, pos)
+        self._first = first
+        # when streaming, the offset at which to pause (the text beyond is
+        # only known after more is read)
+        self._horizon = None
         
-        states = self._new_states([] if search else [state])
-        self._outer_loop(states, search, new_state)
-        return states.final_state
-    
     def _outer_loop(self, states, search, new_state):
+        first = self._first
+        horizon = self._horizon
         while not states.final_state and \
                 (states.more or 
                     (search and self._offset <= len(self._text))):
+            if horizon is not None and self._offset >= horizon:
+                break
             if search:
-                states.add_next(new_state(self._offset))
+                if first is None:
+                    states.add_next(new_state(self._offset))
+                else:
+                    # with no threads, jump to the next possible start
+                    if not states.more:
+                        offset = first.find(self._text, self._offset)
+                        if offset < 0:
+                            if horizon is not None:
+                                # no match can start in the text so far
+                                self._set_offset(len(self._text))
+                            break
+                        self._set_offset(offset)
+                        if horizon is not None and offset >= horizon:
+                            break
+                    if self._current in first:
+                        states.add_next(new_state(self._offset))
             self._inner_loop(states)    
         
     def _inner_loop(self, states):
@@ -121,6 +175,9 @@ class ParallelEngine(BaseEngine, BaseVisitor):
                 # extra nodes are in reverse priority - most important at end
                 (state, extra) = state.graph.visit(self, state)
                 self.ticks += 1
+                if self.ticks >= self.__limit:
+                    self.__limit = Budget.limit(self.__budget, self.ticks, 
+                                                self._offset)
             states.add_next(state)
             states.add_extra(extra)
         self._offset += 1
@@ -149,22 +206,26 @@ class ParallelEngine(BaseEngine, BaseVisitor):
         return (None, [state.end_group(number, self._offset).advance()])
 
     def group_reference(self, next, number, state):
-        try:
-            text = state.groups.group(number)
-            if text is None:
-                return (None, [])
-            elif text:
-                alphabet = self._parser_state.alphabet
-                graph = Sequence([String(alphabet.join(c)) for c in text])
-                graph = graph.join(next[0], self._parser_state)
-                return (None, [state.clone(graph=graph)])
-            else:
-                return (None, [state.advance()])
-        except KeyError:
+        text = state.group(number)
+        if text is None:
             return (None, [])
+        elif text:
+            return (None, [self.__consume(text, next[0], state)])
+        else:
+            return (None, [state.advance()])
+        
+    def __consume(self, text, next, state):
+        '''
+        A clone of the state that matches the given text (one character per
+        step) before continuing with `next`.
+        '''
+        alphabet = self._parser_state.alphabet
+        graph = Sequence([String(alphabet.join(c)) for c in text])
+        graph = graph.join(next, self._parser_state)
+        return state.clone(graph=graph)
 
     def group_conditional(self, next, number, state):
-        index = 1 if state.groups.group(number) else 0
+        index = 1 if state.group(number) else 0
         return (None, [state.advance(index)])
 
     def split(self, next, state):
@@ -210,27 +271,33 @@ class ParallelEngine(BaseEngine, BaseVisitor):
             # we need to match the lookahead
             search = False
             (reads, mutates, size) = lookahead_logic(next[1], forwards, state.groups)
-            if forwards:
-                subtext = self._text
-                offset = self._offset
+            reverse = None if forwards else reversed_lookback(next[1])
+            if reverse is not None:
+                # the reversed graph neither reads nor mutates groups
+                match = self.__lookback(reverse)
             else:
-                subtext = self._text[0:self._offset]
-                if size is None:
-                    offset = 0
-                    search = True
+                if forwards:
+                    subtext = self._text
+                    offset = self._offset
                 else:
-                    offset = self._offset - size
-            if reads or mutates:
-                groups = state.groups
-                new_state = lambda _offset: engine._new_state(groups=groups)
-            else:
-                groups = None
-                new_state = lambda _offset: engine._new_state(text=subtext)
-            engine = self._new_engine(next[1])
-            match = engine.run_state(state.clone(graph=next[1], groups=groups), 
-                                     subtext, pos=offset, search=search,
-                                     new_state=new_state)
-            self.ticks += engine.ticks
+                    subtext = self._text[0:self._offset]
+                    if size is None:
+                        offset = 0
+                        search = True
+                    else:
+                        offset = self._offset - size
+                if reads or mutates:
+                    slots = state.slots
+                    new_state = lambda _offset: \
+                        state.clone(graph=engine._graph, slots=slots)
+                else:
+                    new_state = lambda _offset: engine._new_state(text=subtext)
+                engine = self._new_engine(next[1])
+                match = engine.run_state(state.clone(graph=next[1]), 
+                                         subtext, pos=offset, search=search,
+                                         new_state=new_state, 
+                                         budget=self.__budget, ticks=self.ticks)
+                self.ticks = engine.ticks
             success = bool(match) == equal
             if not (mutates or reads):
                 self.__lookaheads[node][self._offset] = success
@@ -240,13 +307,59 @@ class ParallelEngine(BaseEngine, BaseVisitor):
         # if lookahead succeeded, continue
         if success:
             if mutates:
-                groups = None if match is None else match.groups
-                return (None, [state.clone(groups=groups).advance()])
+                slots = None if match is None else match.slots
+                return (None, [state.clone(slots=slots).advance()])
             else:
                 return (None, [state.advance()])
         else:
             return (None, [])
 
+    def __lookback(self, graph):
+        '''
+        Match the reversed contents of a lookback (see `reversed_lookback()`)
+        from the current offset, over the preceding text, with a separate 
+        engine.
+        '''
+        if graph not in self.__lookbacks:
+            self.__lookbacks[graph] = self._new_engine(graph)
+        engine = self.__lookbacks[graph]
+        text = Reversed(self._text, self._offset)
+        new_state = lambda _offset: engine._new_state(text=text)
+        match = engine.run_state(new_state(0), text, 0, False, new_state,
+                                 budget=self.__budget, ticks=self.ticks)
+        self.ticks = engine.ticks
+        return match
+
+    def atomic(self, next, node, state):
+        # the contents are matched by a separate engine, which returns the
+        # first (highest priority) match only, so other threads are cut.
+        # this thread then consumes the matched text and continues.
+        if node not in self.__atomics:
+            self.__atomics[node] = {}
+        if self._offset in self.__atomics[node]:
+            end = self.__atomics[node][self._offset]
+            match = None
+        else:
+            (reads, mutates, _size) = lookahead_logic(next[1], True, None)
+            engine = self._new_engine(next[1])
+            match = engine.run_state(state.clone(graph=next[1]), self._text,
+                                     pos=self._offset, search=False, 
+                                     new_state=None, 
+                                     budget=self.__budget, ticks=self.ticks)
+            self.ticks = engine.ticks
+            end = None if match is None else match.match_offset
+            if not (mutates or reads):
+                self.__atomics[node][self._offset] = end
+        if end is None:
+            return (None, [])
+        if match is not None:
+            state = match.clone(graph=node)
+        if end == self._offset:
+            return (None, [state.advance()])
+        else:
+            return (None, [self.__consume(self._text[self._offset:end], 
+                                          next[0], state)])
+
     def repeat(self, next, node, begin, end, lazy, state):
         count = state.increment(node)
         # if we haven't yet reached the point where we can continue, loop
@@ -42,8 +42,9 @@ class BeamReTest(ReTest, TestCase):
     
 class BeamHashEngine(BeamEngine):
     
-    def __init__(self, parser_state, graph):
-        super(BeamHashEngine, self).__init__(parser_state, graph, hash_state=True)
+    def __init__(self, parser_state, graph, hash_state=True):
+        super(BeamHashEngine, self).__init__(parser_state, graph, 
+                                             hash_state=hash_state)
 
 
 class BeamHashReTest(ReTest, TestCase):
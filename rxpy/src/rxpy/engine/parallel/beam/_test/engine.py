@@ -40,14 +40,14 @@ class BeamEngineTest(EngineTest, TestCase):
         return BeamEngine
 
     def test_lookback_with_offset(self):
-        assert self.engine(self.parse('..(?<=a)'), 'xa', ticks=7)
+        assert self.engine(self.parse('..(?<=a)'), 'xa', ticks=6)
         assert not self.engine(self.parse('..(?<=a)'), 'ax')
         
     def test_lookback_optimisations(self):
-        assert self.engine(self.parse('(.).(?<=a)'), 'xa', ticks=9)
+        assert self.engine(self.parse('(.).(?<=a)'), 'xa', ticks=8)
         # only one more tick with an extra character because we avoid starting
         # from the start in this case
-        assert self.engine(self.parse('.(.).(?<=a)'), 'xxa', ticks=10)
+        assert self.engine(self.parse('.(.).(?<=a)'), 'xxa', ticks=9)
         
         assert self.engine(self.parse('(.).(?<=\\1)'), 'aa', ticks=10)
         # again, just one tick more
@@ -55,13 +55,13 @@ class BeamEngineTest(EngineTest, TestCase):
         assert not self.engine(self.parse('.(.).(?<=\\1)'), 'xxa')
         
         assert self.engine(self.parse('(.).(?<=(\\1))'), 'aa')
-        assert self.engine(self.parse('(.).(?<=(\\1))'), 'aa', ticks=26)
+        assert self.engine(self.parse('(.).(?<=(\\1))'), 'aa', ticks=19)
         # but here, three ticks more because we have a group reference with
         # changing groups, so can't reliably calculate lookback distance
-        assert self.engine(self.parse('.(.).(?<=(\\1))'), 'xaa', ticks=33)
+        assert self.engine(self.parse('.(.).(?<=(\\1))'), 'xaa', ticks=23)
         assert not self.engine(self.parse('.(.).(?<=(\\1))'), 'xxa')
         
-        assert self.engine(self.parse('(.).(?<=a)'), 'xa', ticks=9)
+        assert self.engine(self.parse('(.).(?<=a)'), 'xa', ticks=8)
 
         assert self.engine(self.parse('(.).(?<=(?:a|z))'), 'xa', ticks=11)
         assert self.engine(self.parse('(.).(?<=(a|z))'), 'xa', ticks=13)
@@ -95,9 +95,9 @@ class BeamEngineTest(EngineTest, TestCase):
         assert self.engine(self.parse('(b)*'), 1000 * 'b', ticks=5004, maxwidth=1, hash_state=True)
 
     def test_width_re_test(self):
-        assert self.engine(self.parse('.*?cd'), 1000*'abc'+'de', ticks=10015, maxwidth=2)
+        assert self.engine(self.parse('.*?cd'), 1000*'abc'+'de', ticks=10006, maxwidth=2)
         # this could be optimised as a character
-        assert self.engine(self.parse('(a|b)*?c'), 1000*'ab'+'cd', ticks=14006, maxwidth=1)
+        assert self.engine(self.parse('(a|b)*?c'), 1000*'ab'+'cd', ticks=14007, maxwidth=1)
 
     def test_width_search(self):
         bk = 1000 * 'b'
@@ -107,8 +107,8 @@ class BeamEngineTest(EngineTest, TestCase):
         
         assert self.engine(self.parse('b*'), bk, ticks=3003, maxwidth=1, search=True)
         assert self.engine(self.parse('b*'), bk, ticks=3003, maxwidth=1, hash_state=True, search=True)
-        assert self.engine(self.parse('.*?b*'), bk, ticks=3004, maxwidth=1)
-        assert self.engine(self.parse('.*?b*'), bk, ticks=3004, maxwidth=1, hash_state=True)
+        assert self.engine(self.parse('.*?b*'), bk, ticks=3005, maxwidth=1)
+        assert self.engine(self.parse('.*?b*'), bk, ticks=3005, maxwidth=1, hash_state=True)
 
         assert self.engine(self.parse('b*'), bk + 'c', ticks=3003, maxwidth=1, search=True)
         assert self.engine(self.parse('b*'), bk + 'c', ticks=3003, maxwidth=1, hash_state=True, search=True)
@@ -124,8 +124,8 @@ class BeamEngineTest(EngineTest, TestCase):
         assert self.engine(self.parse('b*c'), bk + 'c', ticks=3004, maxwidth=1, search=True)
         assert self.engine(self.parse('b*c'), bk + 'c', ticks=3004, maxwidth=1, hash_state=True, search=True)
 
-        assert self.engine(self.parse('.*?b*c'), bk + 'c', ticks=3005, maxwidth=1)
-        assert self.engine(self.parse('.*?b*c'), bk + 'c', ticks=3005, maxwidth=1, hash_state=True)
+        assert self.engine(self.parse('.*?b*c'), bk + 'c', ticks=3006, maxwidth=1)
+        assert self.engine(self.parse('.*?b*c'), bk + 'c', ticks=3006, maxwidth=1, hash_state=True)
         
     def test_width_search_compared_with_wide(self):
 #        bk = 1000 * 'b'
@@ -136,7 +136,7 @@ class BeamEngineTest(EngineTest, TestCase):
         
         assert self.engine(self.parse('b*'), bk, ticks=303, maxwidth=1, search=True)
         assert self.engine(self.parse('b*'), bk, ticks=303, maxwidth=1, hash_state=True, search=True)
-        assert self.engine(self.parse('.*?b*'), bk, ticks=304, maxwidth=1)
+        assert self.engine(self.parse('.*?b*'), bk, ticks=305, maxwidth=1)
 
         assert self.engine(self.parse('b*'), bk + 'c', ticks=303, maxwidth=1, search=True)
         assert self.engine(self.parse('b*c'), bk + 'c', ticks=304, maxwidth=1, search=True)
@@ -145,10 +145,32 @@ class BeamEngineTest(EngineTest, TestCase):
         assert self.engine(self.parse('ab*?c'), 'a' + bk + 'c', ticks=305, maxwidth=1, search=True)
 
         assert self.engine(self.parse('b*c'), bk + 'c', ticks=304, maxwidth=1, search=True)
-        assert self.engine(self.parse('.*?b*c'), bk + 'c', ticks=305, maxwidth=1)
+        assert self.engine(self.parse('.*?b*c'), bk + 'c', ticks=306, maxwidth=1)
+        
+    def test_resume(self):
+        # growing the beam resumes from the first overflow, not the start
+        pattern = self.parse(8 * '(?:a|b)?' + 4 * 'ab')
+        restart = self.engine(pattern, 4 * 'ab', ticks=1132, resume=False)
+        resume = self.engine(pattern, 4 * 'ab', ticks=627)
+        assert restart.group(0) == resume.group(0) == 4 * 'ab'
+        
+    def test_resume_priority(self):
+        # matches from later starts must not replace discarded threads
+        assert self.engine(self.parse(':+'), 'c:::d', 
+                           search=True).group(0) == ':::'
+        assert self.engine(self.parse('a|ab|b'), 'xab', 
+                           search=True).group(0) == 'a'
+        
+    def test_resume_loops(self):
+        # resumed threads with and without (empty) loops are the same state
+        pattern = self.parse('(b|bc)*$||x{0}')
+        result = self.engine(pattern, 'bbx', search=True)
+        assert (result.start(0), result.end(0)) == (0, 0)
+        result = self.engine(pattern, 'bbx', search=True, hash_state=True)
+        assert (result.start(0), result.end(0)) == (0, 0)
         
     def test_b_dot_bug(self):
         target = 'a' + 100 * 'b' + 'c'
-        assert self.engine(self.parse('a.*c'), target, ticks=615, maxwidth=2)
+        assert self.engine(self.parse('a.*c'), target, ticks=311, maxwidth=2)
         assert self.engine(self.parse('ab*c'), target, ticks=305, maxwidth=1)
         
\ No newline at end of file
@@ -36,36 +36,53 @@ class BeamEngine(ParallelEngine):
     '''
     Restrict the total number of states under consideration, doubling on
     failure until we either match, or fail with no discards.
+    
+    If `resume` is true then, after growing, the search continues from the
+    first point at which threads were discarded (otherwise it restarts).
     '''
     
     def __init__(self, parser_state, graph, hash_state=False,
-                 beam_start=1, beam_scale=2):
+                 beam_start=1, beam_scale=2, resume=True):
         super(BeamEngine, self).__init__(parser_state, graph, 
                                          hash_state=hash_state)
         self.__beam_start = beam_start
         self.__beam_scale = beam_scale
+        self.__resume = resume
 
     def _new_states(self, initial):
-        return States(initial, self._hash_state, 
-                      beam_start=self.__beam_start, beam_scale=self.__beam_scale)
+        return States(initial, self._indices, 
+                      beam_start=self.__beam_start, beam_scale=self.__beam_scale,
+                      resume=self.__resume)
     
     def _outer_loop(self, states, search, new_state):
         initial_offset = self._offset
+        # after an overflow, new matches would have lower priority than the
+        # discarded threads, so are not started
+        limited = lambda offset: \
+            None if states.overflowed else new_state(offset)
+        states.save(initial_offset)
         growing = True
         while not states.final_state and growing:
-            super(BeamEngine, self)._outer_loop(states, search, new_state)
+            super(BeamEngine, self)._outer_loop(states, search, limited)
             if not states.final_state and states.overflowed:
                 growing = True
-                states.grow()
-                self._set_offset(initial_offset)
+                self._set_offset(states.grow(initial_offset))
             else:
                 growing = False
+    
+    def _inner_loop(self, states):
+        super(BeamEngine, self)._inner_loop(states)
+        states.save(self._offset)
 
 
 class HashingBeamEngine(BeamEngine):
+    '''
+    Redundant (retained for compatibility): duplicate threads are now always
+    discarded, so this is identical to `BeamEngine`.
+    '''
     
     def __init__(self, parser_state, graph, hash_state=True,
-                 beam_start=1, beam_scale=2):
+                 beam_start=1, beam_scale=2, resume=True):
         super(HashingBeamEngine, self).__init__(parser_state, graph, 
                 hash_state=hash_state, 
-                beam_start=beam_start, beam_scale=beam_scale)
+                beam_start=beam_start, beam_scale=beam_scale, resume=resume)
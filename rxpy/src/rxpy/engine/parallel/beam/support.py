@@ -32,29 +32,89 @@ from rxpy.engine.parallel.support import States as BaseStates
 
 
 class States(BaseStates):
+    '''
+    Limit the number of threads to the beam width.  Threads that do not fit
+    are discarded (with all lower priority threads for that step), but at 
+    the first overflow the complete set of threads for the next step is 
+    saved, so that after growing the beam the engine can resume from there
+    instead of restarting.
+    '''
     
-    def __init__(self, initial, hash_state, beam_start=1, beam_scale=2):
-        super(States, self).__init__(initial, hash_state)
+    def __init__(self, initial, indices=None, beam_start=1, beam_scale=2,
+                 resume=True):
+        super(States, self).__init__(initial, indices)
         self.__initial = list(map(lambda x: x.clone(), initial))
         self.__beam_width = beam_start
         self.__beam_scale = beam_scale
+        self.__resume = resume
         self.__overflowed = False
+        # threads discarded during the first overflow, while capturing
+        self.__discarded = None
+        self.__discarded_matched = False
+        # (offset, threads) to resume from after growing
+        self.__saved = None
+        # the offset of the next step
+        self.__offset = None
         
-    def grow(self):
+    def grow(self, offset):
+        '''
+        Increase the beam width and return the offset to continue from (the 
+        given offset if nothing was saved).
+        '''
         self.__overflowed = False
         self.__beam_width *= self.__beam_scale
-        self._next_nodes = list(map(lambda x: x.clone(), self.__initial))
+        if self.__saved is None:
+            threads = self.__initial
+        else:
+            (offset, threads) = self.__saved
+            self.__saved = None
+        self._next_nodes = list(map(self.__clone, threads))
+        self.__offset = offset
+        return offset
+    
+    def save(self, offset):
+        '''
+        Called after each step; if this was the first overflow, save the 
+        threads for the next step (both kept and discarded).
+        '''
+        self.__offset = offset
+        if self.__discarded is not None:
+            threads = self._next_nodes + self.__discarded
+            self.__saved = (offset, list(map(self.__clone, threads)))
+            self.__discarded = None
+            self.__discarded_matched = False
+
+    def flip(self):
+        # a new search thread (added before the step) may have overflowed
+        if self.__discarded is not None:
+            self.save(self.__offset)
+        super(States, self).flip()
         
+    @staticmethod
+    def __clone(state):
+        clone = state.clone()
+        clone.match_offset = state.match_offset
+        return clone
+
     @property
     def overflowed(self):
         return self.__overflowed
 
-    def add_next(self, next):
-        if len(self._next_nodes) == self.__beam_width:
+    def _append(self, next):
+        if self.__discarded is not None:
+            # capturing the remainder of the first overflow
+            if not self.__discarded_matched:
+                self.__discarded.append(next.uncheck())
+                self.__discarded_matched = next.match_offset is not None
+        elif len(self._next_nodes) == self.__beam_width:
+            if self.__resume and not self.__overflowed:
+                self.__discarded = [next.uncheck()]
+                self.__discarded_matched = next.match_offset is not None
+            else:
+                # since we are rejecting a success, we must discard all 
+                # alternatives "below" that.  we can then continue to accept
+                # future alternatives next iteration.
+                self._current_nodes = []
             self.__overflowed = True
-            # since we are rejecting a success, we must discard all 
-            # alternatives "below" that.  we can then continue to accept
-            # future alternatives next iteration.
-            self._current_nodes = []
         else:
-            super(States, self).add_next(next)
+            super(States, self)._append(next)
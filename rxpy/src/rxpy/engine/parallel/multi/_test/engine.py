@@ -0,0 +1,97 @@
+
+# The contents of this file are subject to the Mozilla Public License
+# (MPL) Version 1.1 (the "License"); you may not use this file except
+# in compliance with the License. You may obtain a copy of the License
+# at http://www.mozilla.org/MPL/                                      
+#                                                                     
+# Software distributed under the License is distributed on an "AS IS" 
+# basis, WITHOUT WARRANTY OF ANY KIND, either express or implied. See 
+# the License for the specific language governing rights and          
+# limitations under the License.                                      
+#                                                                     
+# The Original Code is RXPY (http://www.acooke.org/rxpy)              
+# The Initial Developer of the Original Code is Andrew Cooke.         
+# Portions created by the Initial Developer are Copyright (C) 2010
+# Andrew Cooke (andrew@acooke.org). All Rights Reserved.               
+#                                                                      
+# Alternatively, the contents of this file may be used under the terms 
+# of the LGPL license (the GNU Lesser General Public License,          
+# http://www.gnu.org/licenses/lgpl.html), in which case the provisions 
+# of the LGPL License are applicable instead of those above.           
+#                                                                      
+# If you wish to allow use of your version of this file only under the 
+# terms of the LGPL License and not to allow others to use your version
+# of this file under the MPL, indicate your decision by deleting the   
+# provisions above and replace them with the notice and other provisions
+# required by the LGPL License.  If you do not delete the provisions    
+# above, a recipient may use your version of this file under either the 
+# MPL or the LGPL License.          
+
+
+from unittest import TestCase
+
+from rxpy.compat.support import RegexSet, search
+from rxpy.engine.parallel.multi.engine import SetEngine
+from rxpy.engine.parallel.wide.engine import WideEngine
+from rxpy.lib import RxpyException, Budget, BudgetException
+from rxpy.parser.pattern import parse_groups
+
+
+class SetEngineTest(TestCase):
+    
+    PATTERNS = ['ab', 'a(c)', 'x', 'b+', '(a|b)*c', '\\d+', 'z', '^a', 
+                'c$', '', 'a*?b', '(?:ab)+', 'a{2,3}', '\\bb']
+    
+    TEXTS = ['', 'a', 'ab', 'abc', 'xaab', 'b1c', 'aaab bc', 'c\n', 'zab']
+    
+    def assert_spans(self, patterns):
+        regex_set = RegexSet(patterns)
+        for text in self.TEXTS:
+            expected = {}
+            for (index, pattern) in enumerate(patterns):
+                found = search(pattern, text, engine=WideEngine)
+                if found:
+                    expected[index] = found.span()
+            assert regex_set.spans(text) == expected, (text, expected)
+            assert regex_set.matches(text) == sorted(expected), text
+    
+    def test_spans(self):
+        self.assert_spans(self.PATTERNS)
+        
+    def test_lookahead(self):
+        # not supported by the dfa
+        self.assert_spans(self.PATTERNS + ['(?=b)b.', 'a(?!b)'])
+        
+    def test_empty(self):
+        assert RegexSet([]).matches('abc') == []
+        assert RegexSet(['']).spans('abc') == {0: (0, 0)}
+        
+    def test_pos(self):
+        regex_set = RegexSet(['a', 'b', 'c'])
+        assert regex_set.matches('abc', pos=1) == [1, 2]
+        assert regex_set.spans('abc', endpos=2) == {0: (0, 1), 1: (1, 2)}
+        
+    def test_dfa(self):
+        # one tick per character, stopping when all patterns are found
+        engine = SetEngine(*parse_groups(['a', 'c'], SetEngine))
+        assert engine.matches('xaxcxxxx') == {0: None, 1: None}
+        assert engine.ticks == 4, engine.ticks
+        # the lookahead is matched by threads
+        engine = SetEngine(*parse_groups(['a', '(?=c)'], SetEngine))
+        assert engine.matches('xaxcxxxx') == {0: (1, 2), 1: (3, 3)}
+        
+    def test_group_reference(self):
+        self.assertRaises(RxpyException, RegexSet, ['(a)\\1'])
+        
+    def test_budget(self):
+        regex_set = RegexSet(['a', 'b+c'])
+        try:
+            regex_set.matches(1000 * 'b', budget=Budget(ticks=100))
+            assert False, 'expected exception'
+        except BudgetException:
+            pass
+        try:
+            regex_set.spans(1000 * 'b', budget=Budget(ticks=100))
+            assert False, 'expected exception'
+        except BudgetException:
+            pass
@@ -0,0 +1,200 @@
+
+# The contents of this file are subject to the Mozilla Public License
+# (MPL) Version 1.1 (the "License"); you may not use this file except
+# in compliance with the License. You may obtain a copy of the License
+# at http://www.mozilla.org/MPL/                                      
+#                                                                     
+# Software distributed under the License is distributed on an "AS IS" 
+# basis, WITHOUT WARRANTY OF ANY KIND, either express or implied. See 
+# the License for the specific language governing rights and          
+# limitations under the License.                                      
+#                                                                     
+# The Original Code is RXPY (http://www.acooke.org/rxpy)              
+# The Initial Developer of the Original Code is Andrew Cooke.         
+# Portions created by the Initial Developer are Copyright (C) 2010
+# Andrew Cooke (andrew@acooke.org). All Rights Reserved.               
+#                                                                      
+# Alternatively, the contents of this file may be used under the terms 
+# of the LGPL license (the GNU Lesser General Public License,          
+# http://www.gnu.org/licenses/lgpl.html), in which case the provisions 
+# of the LGPL License are applicable instead of those above.           
+#                                                                      
+# If you wish to allow use of your version of this file only under the 
+# terms of the LGPL License and not to allow others to use your version
+# of this file under the MPL, indicate your decision by deleting the   
+# provisions above and replace them with the notice and other provisions
+# required by the LGPL License.  If you do not delete the provisions    
+# above, a recipient may use your version of this file under either the 
+# MPL or the LGPL License.          
+
+
+from rxpy.engine.parallel.base import ParallelEngine
+from rxpy.engine.parallel.multi.support import States
+from rxpy.engine.quick.dfa.engine import Dfa, FINAL_NEWLINE, END
+from rxpy.engine.support import FirstCharacters
+from rxpy.graph.opcode import StartGroup, EndGroup
+from rxpy.lib import _CHARS, _LOOP_UNROLL, Budget
+
+
+class SetEngine(ParallelEngine):
+    '''
+    Match the graph from `parse_groups()` (one group for each pattern),
+    finding every pattern that matches in a single pass over the text.
+    
+    A thread ends when it closes the group for its pattern, recording the
+    match.  Threads for different patterns never share nodes, so are not
+    deduplicated against each other.  If `spans` is true, the span for each
+    pattern is the one `search()` would return for that pattern alone; 
+    otherwise matching stops as soon as every pattern has been found.
+    
+    Without spans, patterns that the lazy DFA supports are matched by the
+    DFA instead (which caches transitions, so is much faster once warm).
+    '''
+    
+    # loops are unrolled so that the DFA can be used
+    REQUIRE = _CHARS | _LOOP_UNROLL
+    
+    def __init__(self, parser_state, graph, hash_state=False, spans=False):
+        super(SetEngine, self).__init__(parser_state, graph, 
+                                        hash_state=hash_state)
+        self.__spans = spans
+        starts = pattern_starts(graph)
+        self.__numbers = [start.number for start in starts]
+        self.__index = dict((number, index) 
+                            for (index, number) in enumerate(self.__numbers))
+        self.__nodes = pattern_nodes(graph, starts)
+        self.__states = None
+        self.__dfa = None if spans else Dfa(parser_state, graph, 
+                                            patterns=self.__index)
+        
+    def matches(self, text, pos=0, budget=None):
+        '''
+        Search the text, returning a map from pattern index to the span
+        of a match (without `spans`, the span may be `None`).
+        '''
+        first = FirstCharacters.for_graph(self._graph)
+        if self.__dfa is not None and self.__dfa.supported:
+            return dict((index, None) 
+                        for index in self.__scan(text, pos, budget, first))
+        new_state = lambda offset: self._new_state(text=text)
+        self.run_state(new_state(pos), text, pos, True, new_state, 
+                       budget=budget, first=first)
+        return self.__states.matches
+    
+    def __scan(self, text, offset, budget, first):
+        '''
+        Run the DFA over the text, returning the set of patterns matched.
+        Ticks are counted once per character.
+        '''
+        dfa = self.__dfa
+        state = dfa.initial(text, offset, True)
+        last = len(text) - 1
+        count = len(self.__numbers)
+        found = set()
+        self.ticks = 0
+        limit = Budget.limit(budget, 0, offset)
+        while True:
+            if first is not None and not state.threads:
+                # no match in progress
+                jump = first.find(text, offset)
+                if jump < 0:
+                    break
+                if jump != offset:
+                    offset = jump
+                    state = dfa.initial(text, offset, True)
+            if offset < last:
+                key = text[offset]
+            elif offset == last:
+                key = FINAL_NEWLINE if text[offset] == '\n' else text[offset]
+            else:
+                key = END
+            try:
+                (state, matched) = state.transitions[key]
+            except KeyError:
+                (state, matched) = dfa.transition(state, key)
+            self.ticks += 1
+            if self.ticks >= limit:
+                limit = Budget.limit(budget, self.ticks, offset)
+            if matched:
+                found.update(matched)
+                if len(found) == count:
+                    break
+            if key is END:
+                break
+            offset += 1
+        return found
+    
+    def _new_states(self, initial):
+        self.__states = States(initial, self._indices, pattern=self.__pattern,
+                               count=len(self.__numbers), spans=self.__spans)
+        return self.__states
+    
+    def _new_engine(self, graph):
+        # lookaheads and atomic groups are matched as usual
+        return ParallelEngine(self._parser_state, graph, 
+                              hash_state=self._hash_state)
+    
+    def __pattern(self, state):
+        try:
+            return self.__nodes[id(state.graph)]
+        except KeyError:
+            # a node created while matching (a group reference)
+            for (index, number) in enumerate(self.__numbers):
+                if state.started(number) is not None:
+                    return index
+            return None
+        
+    def start_group(self, next, number, state):
+        index = self.__index.get(number)
+        if index is not None and index in self.__states.matches:
+            # a new thread has lower priority than the existing match
+            return (None, [])
+        return super(SetEngine, self).start_group(next, number, state)
+    
+    def end_group(self, next, number, state):
+        index = self.__index.get(number)
+        if index is None:
+            return super(SetEngine, self).end_group(next, number, state)
+        state.end_group(number, self._offset)
+        self.__states.record(index, state.span(number))
+        return (None, [])
+    
+    
+def pattern_starts(graph):
+    '''
+    The `StartGroup` nodes that begin each pattern, in order.  These follow 
+    the initial alternatives.
+    '''
+    starts = []
+    stack = [graph]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, StartGroup):
+            starts.append(node)
+        else:
+            stack.extend(node.next)
+    return sorted(starts, key=lambda start: start.number)
+
+
+def pattern_nodes(graph, starts):
+    '''
+    A map from node id to the index of the pattern that contains the node
+    (or `None` for nodes shared by all patterns).
+    '''
+    nodes = {}
+    stack = [graph]
+    while stack:
+        node = stack.pop()
+        if id(node) not in nodes:
+            nodes[id(node)] = None
+            stack.extend(node.next)
+    for (index, start) in enumerate(starts):
+        stack = [start]
+        while stack:
+            node = stack.pop()
+            if nodes[id(node)] is None:
+                nodes[id(node)] = index
+                if not (isinstance(node, EndGroup) and 
+                        node.number == start.number):
+                    stack.extend(node.next)
+    return nodes
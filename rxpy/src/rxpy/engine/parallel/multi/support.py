@@ -0,0 +1,104 @@
+
+# The contents of this file are subject to the Mozilla Public License
+# (MPL) Version 1.1 (the "License"); you may not use this file except
+# in compliance with the License. You may obtain a copy of the License
+# at http://www.mozilla.org/MPL/                                      
+#                                                                     
+# Software distributed under the License is distributed on an "AS IS" 
+# basis, WITHOUT WARRANTY OF ANY KIND, either express or implied. See 
+# the License for the specific language governing rights and          
+# limitations under the License.                                      
+#                                                                     
+# The Original Code is RXPY (http://www.acooke.org/rxpy)              
+# The Initial Developer of the Original Code is Andrew Cooke.         
+# Portions created by the Initial Developer are Copyright (C) 2010
+# Andrew Cooke (andrew@acooke.org). All Rights Reserved.               
+#                                                                      
+# Alternatively, the contents of this file may be used under the terms 
+# of the LGPL license (the GNU Lesser General Public License,          
+# http://www.gnu.org/licenses/lgpl.html), in which case the provisions 
+# of the LGPL License are applicable instead of those above.           
+#                                                                      
+# If you wish to allow use of your version of this file only under the 
+# terms of the LGPL License and not to allow others to use your version
+# of this file under the MPL, indicate your decision by deleting the   
+# provisions above and replace them with the notice and other provisions
+# required by the LGPL License.  If you do not delete the provisions    
+# above, a recipient may use your version of this file under either the 
+# MPL or the LGPL License.          
+
+
+from rxpy.engine.parallel.support import States as BaseStates
+
+
+class States(BaseStates):
+    '''
+    Record the patterns matched so far, discarding threads that can no 
+    longer change the result.
+    
+    If `spans` is false then all threads for a pattern are discarded once it
+    has matched.  Otherwise, as for a single pattern, only lower priority 
+    threads are discarded (those later in the current step, and any new 
+    threads), so that the span is that of the highest priority match.
+    
+    `pattern` is a function that returns the pattern index for a thread (or
+    `None` for threads that are not yet specific to a pattern).
+    '''
+    
+    def __init__(self, initial, indices=None, pattern=None, count=0, 
+                 spans=False):
+        super(States, self).__init__(initial, indices)
+        self.__pattern = pattern
+        self.__count = count
+        self.__spans = spans
+        # map from pattern index to span
+        self.matches = {}
+        # patterns matched during the current step
+        self.__step = set()
+        
+    def flip(self):
+        super(States, self).flip()
+        if self.__step:
+            self.__step = set()
+        
+    def record(self, index, span):
+        '''
+        Record a match (ignored if a higher priority thread for the same
+        pattern has already matched).
+        '''
+        if index not in self.__step and \
+                (self.__spans or index not in self.matches):
+            self.__step.add(index)
+            self.matches[index] = span
+            
+    def live(self, state):
+        '''
+        Can the thread still change the result?
+        '''
+        index = self.__pattern(state)
+        if index is None:
+            return True
+        elif self.__spans:
+            return index not in self.__step
+        else:
+            return index not in self.matches
+        
+    def add_next(self, next):
+        if next and self.live(next):
+            super(States, self).add_next(next)
+            
+    def add_extra(self, extra):
+        super(States, self).add_extra([state for state in extra 
+                                       if self.live(state)])
+        
+    @property
+    def final_state(self):
+        '''
+        `True` (rather than a state) once all patterns have matched (and, 
+        if recording spans, no threads remain).
+        '''
+        if len(self.matches) == self.__count and \
+                not (self.__spans and self.more):
+            return True
+        else:
+            return None
@@ -40,14 +40,14 @@ class SerialEngineTest(EngineTest, TestCase):
         return SerialEngine
 
     def test_lookback_with_offset(self):
-        assert self.engine(self.parse('..(?<=a)'), 'xa', ticks=7)
+        assert self.engine(self.parse('..(?<=a)'), 'xa', ticks=6)
         assert not self.engine(self.parse('..(?<=a)'), 'ax')
         
     def test_lookback_optimisations(self):
-        assert self.engine(self.parse('(.).(?<=a)'), 'xa', ticks=9)
+        assert self.engine(self.parse('(.).(?<=a)'), 'xa', ticks=8)
         # only one more tick with an extra character because we avoid starting
         # from the start in this case
-        assert self.engine(self.parse('.(.).(?<=a)'), 'xxa', ticks=10)
+        assert self.engine(self.parse('.(.).(?<=a)'), 'xxa', ticks=9)
         
         assert self.engine(self.parse('(.).(?<=\\1)'), 'aa', ticks=10)
         # again, just one tick more
@@ -61,7 +61,7 @@ class SerialEngineTest(EngineTest, TestCase):
         assert self.engine(self.parse('.(.).(?<=(\\1))'), 'xaa', ticks=21)
         assert not self.engine(self.parse('.(.).(?<=(\\1))'), 'xxa')
         
-        assert self.engine(self.parse('(.).(?<=a)'), 'xa', ticks=9)
+        assert self.engine(self.parse('(.).(?<=a)'), 'xa', ticks=8)
 
         assert self.engine(self.parse('(.).(?<=(?:a|z))'), 'xa', ticks=11)
         assert self.engine(self.parse('(.).(?<=(a|z))'), 'xa', ticks=13)
@@ -143,4 +143,5 @@ class SerialEngineTest(EngineTest, TestCase):
 
         # reduction from ticks=15555, maxwidth=102
         assert self.engine(self.parse('b*c'), bk + 'c', ticks=304, maxwidth=1, search=True)
-        assert self.engine(self.parse('.*?b*c'), bk + 'c', ticks=15757, maxwidth=102)
+        # reduction from ticks=15757, maxwidth=102
+        assert self.engine(self.parse('.*?b*c'), bk + 'c', ticks=807, maxwidth=2)
@@ -43,6 +43,12 @@ class SerialEngine(ParallelEngine):
         while first or (search and not states.final_state and
                             search_offset <= len(self._text)):
             if search:
+                # skip to the next possible start
+                if self._first is not None:
+                    search_offset = self._first.find(self._text, 
+                                                     search_offset)
+                    if search_offset < 0:
+                        break
                 states.add_next(new_state(search_offset))
                 self._set_offset(search_offset)
                 search_offset += 1
@@ -53,6 +59,10 @@ class SerialEngine(ParallelEngine):
 
 
 class HashingSerialEngine(SerialEngine):
+    '''
+    Redundant (retained for compatibility): duplicate threads are now always
+    discarded, so this is identical to `SerialEngine`.
+    '''
     
     def __init__(self, parser_state, graph, hash_state=True):
         super(HashingSerialEngine, self).__init__(parser_state, graph, 
@@ -0,0 +1,136 @@
+
+# The contents of this file are subject to the Mozilla Public License
+# (MPL) Version 1.1 (the "License"); you may not use this file except
+# in compliance with the License. You may obtain a copy of the License
+# at http://www.mozilla.org/MPL/                                      
+#                                                                     
+# Software distributed under the License is distributed on an "AS IS" 
+# basis, WITHOUT WARRANTY OF ANY KIND, either express or implied. See 
+# the License for the specific language governing rights and          
+# limitations under the License.                                      
+#                                                                     
+# The Original Code is RXPY (http://www.acooke.org/rxpy)              
+# The Initial Developer of the Original Code is Andrew Cooke.         
+# Portions created by the Initial Developer are Copyright (C) 2010
+# Andrew Cooke (andrew@acooke.org). All Rights Reserved.               
+#                                                                      
+# Alternatively, the contents of this file may be used under the terms 
+# of the LGPL license (the GNU Lesser General Public License,          
+# http://www.gnu.org/licenses/lgpl.html), in which case the provisions 
+# of the LGPL License are applicable instead of those above.           
+#                                                                      
+# If you wish to allow use of your version of this file only under the 
+# terms of the LGPL License and not to allow others to use your version
+# of this file under the MPL, indicate your decision by deleting the   
+# provisions above and replace them with the notice and other provisions
+# required by the LGPL License.  If you do not delete the provisions    
+# above, a recipient may use your version of this file under either the 
+# MPL or the LGPL License.          
+
+
+'''
+Search text that arrives in chunks (eg. from a socket or a large file), 
+without holding all the text in memory.
+'''
+
+from rxpy.engine.parallel.wide.engine import WideEngine
+from rxpy.engine.support import Window, FirstCharacters
+from rxpy.graph.opcode import Lookahead, Atomic
+from rxpy.graph.support import contains_instance
+from rxpy.lib import UnsupportedOperation
+
+
+class Stream(object):
+    '''
+    Search successive chunks of text with a `WideEngine`, reporting matches
+    (as `Groups`, with absolute offsets) as soon as they are known.  The 
+    threads, previous character and group offsets are carried from one 
+    chunk to the next; only the text from the start of the earliest thread
+    is retained.
+    
+    Matches are found as `finditer()` would: after a match the search 
+    continues from its end (or one character later, if it was empty).
+    
+    The graph must have been parsed for a parallel engine and cannot 
+    contain lookarounds or atomic groups (which need text outside the 
+    current position).
+    '''
+    
+    def __init__(self, parser_state, graph, budget=None):
+        if contains_instance(graph, (Lookahead, Atomic)):
+            raise UnsupportedOperation('lookahead')
+        self.__engine = WideEngine(parser_state, graph)
+        self.__first = FirstCharacters.for_graph(graph)
+        self.__budget = budget
+        self.__text = Window(parser_state.alphabet.join())
+        # the start of the current search
+        self.__pos = 0
+        self.__states = None
+        self.__finished = False
+        
+    def feed(self, chunk):
+        '''
+        Add more text, returning a list of any new matches.
+        '''
+        assert not self.__finished, 'Stream finished'
+        self.__text.append(chunk)
+        return self.__run(False)
+    
+    def finish(self):
+        '''
+        Mark the end of the text, returning a list of any final matches.
+        '''
+        assert not self.__finished, 'Stream finished'
+        self.__finished = True
+        return self.__run(True)
+    
+    @property
+    def retained(self):
+        '''
+        The amount of text currently held.
+        '''
+        return len(self.__text) - self.__text.start
+    
+    def __run(self, finished):
+        engine, text = self.__engine, self.__text
+        new_state = lambda offset: \
+            engine._new_state(text=text).start_group(0, offset)
+        matches = []
+        while self.__pos <= len(text):
+            if self.__states is None:
+                engine._start(text, self.__pos, budget=self.__budget, 
+                              first=self.__first)
+                self.__states = engine._new_states([])
+            else:
+                # the current character may have arrived since
+                engine._set_offset(engine._offset)
+            # one character is needed after the current offset (for `$`)
+            engine._horizon = None if finished else len(text) - 1
+            engine._outer_loop(self.__states, True, new_state)
+            state = self.__states.final_state
+            if state:
+                state.end_group(0, state.match_offset)
+                groups = state.groups
+                matches.append(groups)
+                (start, end) = (groups.start(0), groups.end(0))
+                self.__pos = end if end > start else end + 1
+                self.__states = None
+            elif finished:
+                self.__pos = len(text) + 1
+            else:
+                break
+        self.__trim()
+        return matches
+    
+    def __trim(self):
+        '''
+        Discard text that is no longer needed: all threads start after the
+        current offset, and the previous character is already known.
+        '''
+        if self.__states is None:
+            offset = self.__pos
+        else:
+            offset = min([self.__engine._offset] + 
+                         [state.started(0) 
+                          for state in self.__states._next_nodes])
+        self.__text.trim(max(0, min(offset, len(self.__text)) - 1))
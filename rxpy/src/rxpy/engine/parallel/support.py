@@ -28,35 +28,55 @@
 # MPL or the LGPL License.                                              
 
 
+from weakref import WeakKeyDictionary
+
 from rxpy.engine.support import Loops, Groups
 
 
 class State(object):
     '''
     State for a particular thread (offset in the text is common to all threads).
+    
+    Groups are stored as a flat list of offsets ("capture slots", as in a
+    Pike VM) which is shared between clones until one of them writes to it
+    (copy on write).  For group `n` the list contains the start and end at 
+    `2n` and `2n+1`, and the start of an open group at `2width+n`.  The
+    final entry is the last index.  A `Groups` instance is only constructed
+    when needed.
+    
+    `context` is `(text, group_state, reads, width)`, shared by all threads,
+    where `reads` is true if the graph contains nodes that read groups (in 
+    which case the groups are part of the state's identity) and `width` is 
+    one more than the largest group index.
     '''
     
-    def __init__(self, graph, groups=None, loops=None, checks=None,
-                 **groups_kargs):
+    # the number of copies made on write (for benchmarks)
+    copies = 0
+    
+    def __init__(self, graph, context, slots=None, loops=None, checks=None):
         self.__graph = graph
-        self.__groups = groups if groups is not None else [None, None, groups_kargs]
+        self.__context = context
+        if slots is None:
+            slots = [None] * (3 * context[3] + 1)
+            self.__shared = False
+        else:
+            self.__shared = True
+        self.__slots = slots
         self.__loops = loops
         self.__checks = checks
         self.match_offset = None
         
-    def clone(self, graph=None, groups=None):
-        if groups is None:
-            try:
-                groups = self.__groups.clone()
-            except AttributeError:
-                groups = list(self.__groups)
+    def clone(self, graph=None, slots=None):
+        if slots is None:
+            self.__shared = True
+            slots = self.__slots
         try:
             loops = self.__loops.clone()
         except AttributeError:
             loops = self.__loops
         checks = set(self.__checks) if self.__checks else None
-        return State(self.__graph if graph is None else graph, 
-                     groups=groups, loops=loops, checks=checks)
+        return State(self.__graph if graph is None else graph, self.__context,
+                     slots=slots, loops=loops, checks=checks)
         
     def __eq__(self, other):
         '''
@@ -64,10 +84,10 @@ class State(object):
         '''
         if self.match_offset is not None and other.match_offset == self.match_offset:
             return True 
+        # loops are None until used, which is the same as empty
         return self.__graph is other.__graph and \
-            (list == type(self.__groups) == type(other.__groups) or \
-                self.__groups == other.__groups) and \
-            self.__loops == other.__loops
+            (self.__loops or Loops()) == (other.__loops or Loops()) and \
+            (not self.__context[2] or self.__slots == other.__slots)
             
     def __hash__(self):
         '''
@@ -75,41 +95,58 @@ class State(object):
         '''
         if self.match_offset is not None:
             return 0
-        h = hash(self.__graph) ^ hash(self.__loops)
-        if list != type(self.__groups):
-            h ^= hash(self.__groups)
+        h = hash(self.__graph) ^ hash(self.__loops or Loops())
+        if self.__context[2]:
+            h ^= hash(tuple(self.__slots))
         return h
     
+    def __copy_on_write(self):
+        if self.__shared:
+            State.copies += 1
+            self.__slots = list(self.__slots)
+            self.__shared = False
+    
     def start_group(self, number, offset):
-        if number == 0:
-            try:
-                self.__groups[0] = offset
-                return self
-            except TypeError:
-                pass
-        self.__expand_groups()
-        self.__groups.start_group(number, offset)
+        self.__copy_on_write()
+        self.__slots[2 * self.__context[3] + number] = offset
         return self
         
     def end_group(self, number, offset):
-        if number == 0:
-            try:
-                self.__groups[1] = offset
-                return self
-            except TypeError:
-                pass
-        self.__expand_groups()
-        self.__groups.end_group(number, offset)
+        self.__copy_on_write()
+        slots = self.__slots
+        open = 2 * self.__context[3] + number
+        assert slots[open] is not None, 'Unopened group: ' + str(number)
+        slots[2 * number] = slots[open]
+        slots[2 * number + 1] = offset
+        slots[open] = None
+        if number: # avoid group 0
+            slots[-1] = number
         return self
     
-    def __expand_groups(self):
-        if not isinstance(self.__groups, Groups):
-            save = self.__groups
-            self.__groups = Groups(**save[2])
-            if save[0] is not None:
-                self.__groups.start_group(0, save[0])
-            if save[1] is not None:
-                self.__groups.end_group(0, save[1])
+    def group(self, number):
+        '''
+        The text matched by the (completed) group, or `None`.
+        '''
+        start = self.__slots[2 * number]
+        if start is None:
+            return None
+        return self.__context[0][start:self.__slots[2 * number + 1]]
+    
+    def span(self, number):
+        '''
+        The `(start, end)` offsets of the (completed) group, or `None`.
+        '''
+        start = self.__slots[2 * number]
+        if start is None:
+            return None
+        return (start, self.__slots[2 * number + 1])
+    
+    def started(self, number):
+        '''
+        The start offset of the group if it is open (started, but not
+        ended), or `None`.
+        '''
+        return self.__slots[2 * self.__context[3] + number]
     
     def increment(self, node):
         self.__expand_loops()
@@ -147,20 +184,101 @@ class State(object):
     def graph(self):
         return self.__graph
     
+    @property
+    def slots(self):
+        '''
+        The capture slots (shared; clone with `clone(slots=...)`).
+        '''
+        self.__shared = True
+        return self.__slots
+    
     @property
     def groups(self):
-        self.__expand_groups()
-        return self.__groups
+        (text, group_state, _reads, width) = self.__context
+        slots = self.__slots
+        groups, offsets = {}, {}
+        for number in range(width):
+            start = slots[2 * number]
+            if start is not None:
+                end = slots[2 * number + 1]
+                groups[number] = (text[start:end], start, end)
+            if slots[2 * width + number] is not None:
+                offsets[number] = slots[2 * width + number]
+        return Groups(group_state, text, groups=groups, offsets=offsets,
+                      lastindex=slots[-1])
+
+
+class SparseSet(object):
+    '''
+    A set of integers less than `size`, with O(1) insertion, membership and
+    clear (Briggs and Torczon, "An Efficient Representation for Sparse 
+    Sets", 1993).  A value is present only if the dense and sparse lists 
+    refer to each other, so clearing does not need to reset the lists.
+    '''
+    
+    def __init__(self, size):
+        self.__dense = [0] * size
+        self.__sparse = [0] * size
+        self.__count = 0
+        
+    def __contains__(self, value):
+        index = self.__sparse[value]
+        return index < self.__count and self.__dense[index] == value
+    
+    def add(self, value):
+        if value not in self:
+            self.__dense[self.__count] = value
+            self.__sparse[value] = self.__count
+            self.__count += 1
+            
+    def clear(self):
+        self.__count = 0
+        
+    def __len__(self):
+        return self.__count
+    
+    def __iter__(self):
+        return iter(self.__dense[:self.__count])
+    
+    
+# map from graph to node indices
+_INDICES = WeakKeyDictionary()
+
+def node_indices(graph):
+    '''
+    A (cached) map from node id to a unique, small integer, for all nodes in
+    the graph.
+    '''
+    if graph not in _INDICES:
+        indices = {}
+        stack = [graph]
+        while stack:
+            node = stack.pop()
+            if id(node) not in indices:
+                indices[id(node)] = len(indices)
+                stack.extend(node.next)
+        _INDICES[graph] = indices
+    return _INDICES[graph]
 
 
 class States(object):
+    '''
+    The current and next threads.
+    
+    Threads added to the next list are deduplicated, in priority order, so
+    that the higher priority thread is kept.  If `indices` (from
+    `node_indices()`) is given then a thread is identified by its node alone
+    and a `SparseSet` of node indices is used; otherwise (or for nodes 
+    created while matching) a hashed set of states is used.
+    '''
     
-    def __init__(self, initial, hash_state):
+    def __init__(self, initial, indices=None):
         self._current_nodes = []
         self._next_nodes = initial
-        self._hash_state = hash_state
         self.__matched = False
-        self.__known = set() if hash_state else None
+        self.__indices = indices
+        self.__sparse = SparseSet(len(indices)) if indices else None
+        self.__known = set()
 
     def flip(self):
         '''
@@ -169,7 +287,10 @@ class States(object):
         self._current_nodes, self._next_nodes = self._next_nodes, []
         self._current_nodes.reverse()
         self.__matched = False
-        self.__known = set()
+        if self.__sparse is not None:
+            self.__sparse.clear()
+        if self.__known:
+            self.__known = set()
         
     def pop(self):
         return self._current_nodes.pop()
@@ -177,14 +298,30 @@ class States(object):
     def add_extra(self, extra):
         if not self.__matched:
             self._current_nodes.extend(extra)
+            
+    def known(self, next):
+        '''
+        Has an equivalent thread already been added?  If not, record it.
+        '''
+        if self.__sparse is not None:
+            index = self.__indices.get(id(next.graph))
+            if index is not None:
+                if index in self.__sparse:
+                    return True
+                self.__sparse.add(index)
+                return False
+        if next in self.__known:
+            return True
+        self.__known.add(next)
+        return False
         
     def add_next(self, next):
-        if next and not self.__matched and \
-                (not self._hash_state or next not in self.__known):
-            self._next_nodes.append(next.uncheck())
-            self.__matched = next.match_offset is not None
-            if self._hash_state:
-                self.__known.add(next)
+        if next and not self.__matched and not self.known(next):
+            self._append(next)
+            
+    def _append(self, next):
+        self._next_nodes.append(next.uncheck())
+        self.__matched = next.match_offset is not None
     
     def __bool__(self):
         '''
@@ -40,14 +40,14 @@ class WideEngineTest(EngineTest, TestCase):
         return WideEngine
 
     def test_lookback_with_offset(self):
-        assert self.engine(self.parse('..(?<=a)'), 'xa', ticks=7)
+        assert self.engine(self.parse('..(?<=a)'), 'xa', ticks=6)
         assert not self.engine(self.parse('..(?<=a)'), 'ax')
         
     def test_lookback_optimisations(self):
-        assert self.engine(self.parse('(.).(?<=a)'), 'xa', ticks=9)
+        assert self.engine(self.parse('(.).(?<=a)'), 'xa', ticks=8)
         # only one more tick with an extra character because we avoid starting
         # from the start in this case
-        assert self.engine(self.parse('.(.).(?<=a)'), 'xxa', ticks=10)
+        assert self.engine(self.parse('.(.).(?<=a)'), 'xxa', ticks=9)
         
         assert self.engine(self.parse('(.).(?<=\\1)'), 'aa', ticks=10)
         # again, just one tick more
@@ -61,7 +61,7 @@ class WideEngineTest(EngineTest, TestCase):
         assert self.engine(self.parse('.(.).(?<=(\\1))'), 'xaa', ticks=22)
         assert not self.engine(self.parse('.(.).(?<=(\\1))'), 'xxa')
         
-        assert self.engine(self.parse('(.).(?<=a)'), 'xa', ticks=9)
+        assert self.engine(self.parse('(.).(?<=a)'), 'xa', ticks=8)
 
         assert self.engine(self.parse('(.).(?<=(?:a|z))'), 'xa', ticks=11)
         assert self.engine(self.parse('(.).(?<=(a|z))'), 'xa', ticks=13)
@@ -94,6 +94,15 @@ class WideEngineTest(EngineTest, TestCase):
         assert self.engine(self.parse('a(b)*?c'), 'a' + 1000 * 'b' + 'c', ticks=5006, maxwidth=1)
         assert self.engine(self.parse('(b)*'), 1000 * 'b', ticks=5004, maxwidth=2, hash_state=True)
 
+    def test_width_captures(self):
+        # threads are identified by node, not captured groups, so the work
+        # is linear in the text
+        for n in (5, 10, 20):
+            result = self.engine(self.parse('((\\w+)\\s*)+$'), 'ab ' * n, 
+                                 ticks=30*n+4, maxwidth=1, hash_state=True)
+            assert result.group(1) == 'ab ', result.group(1)
+            assert result.group(2) == 'ab', result.group(2)
+
     def test_width_re_test(self):
         assert self.engine(self.parse('.*?cd'), 1000*'abc'+'de', ticks=10005, maxwidth=2)
         # this could be optimised as a character
@@ -113,16 +122,18 @@ class WideEngineTest(EngineTest, TestCase):
 
         assert self.engine(self.parse('b*'), bk + 'c', ticks=303, maxwidth=2, search=True)
         assert self.engine(self.parse('b*'), bk + 'c', ticks=303, maxwidth=2, hash_state=True, search=True)
-        assert self.engine(self.parse('b*c'), bk + 'c', ticks=15555, maxwidth=102, search=True)
-        assert self.engine(self.parse('b*c'), bk + 'c', ticks=305, maxwidth=2, hash_state=True, search=True)
-        assert self.engine(self.parse('b*?c'), bk + 'c', ticks=15555, maxwidth=102, search=True)
-        assert self.engine(self.parse('b*?c'), bk + 'c', ticks=305, maxwidth=2, hash_state=True, search=True)
-        assert self.engine(self.parse('ab*c'), 'a' + bk + 'c', ticks=407, maxwidth=2, search=True)
-        assert self.engine(self.parse('ab*c'), 'a' + bk + 'c', ticks=407, maxwidth=2, hash_state=True, search=True)
-        assert self.engine(self.parse('ab*?c'), 'a' + bk + 'c', ticks=407, maxwidth=2, search=True)
-        assert self.engine(self.parse('ab*?c'), 'a' + bk + 'c', ticks=407, maxwidth=2, hash_state=True, search=True)
+        # no new threads where the match cannot start (the end, or 'b' below)
+        # and duplicate threads are always discarded
+        assert self.engine(self.parse('b*c'), bk + 'c', ticks=304, maxwidth=1, search=True)
+        assert self.engine(self.parse('b*c'), bk + 'c', ticks=304, maxwidth=1, hash_state=True, search=True)
+        assert self.engine(self.parse('b*?c'), bk + 'c', ticks=304, maxwidth=1, search=True)
+        assert self.engine(self.parse('b*?c'), bk + 'c', ticks=304, maxwidth=1, hash_state=True, search=True)
+        assert self.engine(self.parse('ab*c'), 'a' + bk + 'c', ticks=305, maxwidth=1, search=True)
+        assert self.engine(self.parse('ab*c'), 'a' + bk + 'c', ticks=305, maxwidth=1, hash_state=True, search=True)
+        assert self.engine(self.parse('ab*?c'), 'a' + bk + 'c', ticks=305, maxwidth=1, search=True)
+        assert self.engine(self.parse('ab*?c'), 'a' + bk + 'c', ticks=305, maxwidth=1, hash_state=True, search=True)
 
-        assert self.engine(self.parse('b*c'), bk + 'c', ticks=15555, maxwidth=102, search=True)
-        assert self.engine(self.parse('b*c'), bk + 'c', ticks=305, maxwidth=2, hash_state=True, search=True)
-        assert self.engine(self.parse('.*?b*c'), bk + 'c', ticks=15757, maxwidth=102)
+        assert self.engine(self.parse('b*c'), bk + 'c', ticks=304, maxwidth=1, search=True)
+        assert self.engine(self.parse('b*c'), bk + 'c', ticks=304, maxwidth=1, hash_state=True, search=True)
+        assert self.engine(self.parse('.*?b*c'), bk + 'c', ticks=807, maxwidth=2)
         assert self.engine(self.parse('.*?b*c'), bk + 'c', ticks=807, maxwidth=2, hash_state=True)
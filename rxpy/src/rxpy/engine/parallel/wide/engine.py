@@ -42,6 +42,10 @@ class WideEngine(ParallelEngine):
     '''
     
 class HashingWideEngine(WideEngine):
+    '''
+    Redundant (retained for compatibility): duplicate threads are now always
+    discarded, so this is identical to `WideEngine`.
+    '''
     
     def __init__(self, parser_state, graph, hash_state=True):
         super(HashingWideEngine, self).__init__(parser_state, graph, 
@@ -39,8 +39,10 @@ the simple engine, when that fails on an unsupported operation.
 
 from rxpy.engine.base import BaseEngine
 from rxpy.engine.quick.complex.support import State
-from rxpy.engine.support import Match, Fail, lookahead_logic, Groups
+from rxpy.engine.support import Match, Fail, lookahead_logic, Groups, \
+    LiteralPrefix, Reversed, reversed_lookback
 from rxpy.graph.compiled import BaseCompiled, compile
+from rxpy.lib import Budget
 
 
 class ComplexEngine(BaseEngine, BaseCompiled):
@@ -51,6 +53,8 @@ class ComplexEngine(BaseEngine, BaseCompiled):
             program = compile(graph, self)
         self._program = program
         self.__stack = []
+        # map from reversed lookback graph to engine
+        self.__lookbacks = {}
         
     def push(self):
         self.__stack.append((self._offset, self._text, self._search,
@@ -73,29 +77,78 @@ class ComplexEngine(BaseEngine, BaseCompiled):
         else:
             self._previous = None
         
-    def run(self, text, pos=0, search=False):
-        return self._run_from(State(0, text), text, pos, search)
+    def run(self, text, pos=0, search=False, budget=None, ticks=0, end=None):
+        '''
+        `ticks` is the initial count (non-zero when used as a fallback, so 
+        that the budget is shared).
         
-    def _run_from(self, start_state, text, pos, search):
-        start_state.start_group(0, pos)
+        `end` is the offset at which the match is known to end (when used
+        as a fallback to find groups), so that the text beyond it is not 
+        explored.
+        '''
+        self.ticks = ticks
+        self._budget = budget
+        self._limit = Budget.limit(budget, ticks, pos)
+        first = LiteralPrefix.for_graph(self._graph) if search else None
+        return self._run_from(State(0, text), text, pos, search, first, 
+                              end=end)
+    
+    def _resume(self, text, pos, offset, search, states, next_states, 
+                budget=None, ticks=0):
+        '''
+        Continue a run that started at `pos` part way through the character
+        at `offset`, with threads from another engine: `states` (a stack) 
+        are still to be processed, while `next_states` have already 
+        advanced past the character.
+        '''
+        self.ticks = ticks
+        self._budget = budget
+        self._limit = Budget.limit(budget, ticks, offset)
+        first = LiteralPrefix.for_graph(self._graph) if search else None
+        return self._run_from(State(0, text).start_group(0, pos), text, 
+                              offset, search, first, (states, next_states))
+        
+    def _run_from(self, start_state, text, pos, search, first=None, 
+                  resume=None, end=None):
+        '''
+        If `first` is given (a `FirstCharacters`) then the search only 
+        starts new matches where a match could begin.
+        
+        `resume` is an optional pair of initial states and next states 
+        (see `_resume()`), in which case `start_state` already has group 0.
+        
+        If `end` is given then the first match there is the result.
+        '''
+        if resume is None:
+            if first is not None:
+                pos = first.find(text, pos)
+                if pos < 0:
+                    return Groups()
+            start_state.start_group(0, pos)
         self._text = text
         self._set_offset(pos)
         self._search = search
         
         self._lookaheads = (self._offset, {})
-        self._states = [start_state.clone()]
+        if resume is None:
+            self._states = [start_state.clone()]
+            next_states = []
+        else:
+            (self._states, next_states) = resume
+        known_next = set(next_states)
         
         try:
             while self._states and self._offset <= len(self._text):
                 
-                known_next = set()
-                next_states = []
-                
                 while self._states:
                     
                     self._state = self._states.pop()
                     state = self._state
                     skip = state.skip
+                    self.ticks += 1
+                    if self.ticks >= self._limit:
+                        self._limit = Budget.limit(self._budget, self.ticks, 
+                                                   self._offset)
                     
                     if not skip:
                         # advance a character (compiled actions re-call on stack
@@ -109,7 +162,9 @@ class ComplexEngine(BaseEngine, BaseCompiled):
                             pass
                         except Match:
                             state.skip = -1
-                            if not next_states:
+                            # threads with higher priority cannot match if
+                            # the end is known
+                            if not next_states or self._offset == end:
                                 raise
                             next_states.append(state)
                             known_next.add(state)
@@ -140,10 +195,19 @@ class ComplexEngine(BaseEngine, BaseCompiled):
                
                 # add current position as search if necessary
                 if search and start_state not in known_next:
-                    new_state = start_state.clone().start_group(0, self._offset)
-                    self._states.append(new_state)
+                    if first is not None and not next_states:
+                        # with no states, jump to the next possible start
+                        offset = first.find(self._text, self._offset)
+                        if offset < 0:
+                            break
+                        self._set_offset(offset)
+                    if first is None or self._current in first:
+                        new_state = start_state.clone().start_group(0, self._offset)
+                        self._states.append(new_state)
                     
                 self._states.reverse()
+                known_next = set()
+                next_states = []
             
             while self._states:
                 self._state = self._states.pop()
@@ -288,28 +352,34 @@ class ComplexEngine(BaseEngine, BaseCompiled):
             search = False
             groups = self._state.groups(self._parser_state.groups)
             (reads, mutates, size) = lookahead_logic(node, forwards, groups)
-            if forwards:
-                prefix = self._text
-                offset = self._offset
+            reverse = None if forwards else reversed_lookback(node)
+            if reverse is not None:
+                # the reversed graph neither reads nor mutates groups
+                match = self.__lookback(reverse)
             else:
-                prefix = self._text[0:self._offset]
-                if size is None:
-                    offset = 0
-                    search = True
+                if forwards:
+                    prefix = self._text
+                    offset = self._offset
                 else:
-                    offset = self._offset - size
-                    
-            new_state = self._state.clone(index, prefix=prefix)
-            
-            if offset < 0:
-                match = Groups()
-            else:
-                self.push()
-                try:
-                    match = self._run_from(new_state, prefix, offset, search)
-                    new_state = self._state
-                finally:
-                    self.pop()
+                    prefix = self._text[0:self._offset]
+                    if size is None:
+                        offset = 0
+                        search = True
+                    else:
+                        offset = self._offset - size
+                        
+                new_state = self._state.clone(index, prefix=prefix)
+                
+                if offset < 0:
+                    match = Groups()
+                else:
+                    self.push()
+                    try:
+                        match = self._run_from(new_state, prefix, offset, 
+                                               search)
+                        new_state = self._state
+                    finally:
+                        self.pop()
                 
             success = bool(match) == equal
             if not (mutates or reads):
@@ -321,6 +391,62 @@ class ComplexEngine(BaseEngine, BaseCompiled):
                 self._state.merge_groups(new_state)
             self._states.append(self._state.advance(next[0][0]))
         raise Fail
+    
+    def __lookback(self, graph):
+        '''
+        Match the reversed contents of a lookback (see `reversed_lookback()`)
+        from the current offset, over the preceding text, with a separate 
+        engine.
+        '''
+        if self._offset < 0:
+            return Groups()
+        if graph not in self.__lookbacks:
+            self.__lookbacks[graph] = ComplexEngine(self._parser_state, graph)
+        engine = self.__lookbacks[graph]
+        match = engine.run(Reversed(self._text, self._offset), 
+                           budget=self._budget, ticks=self.ticks)
+        self.ticks = engine.ticks
+        return match
+
+    def atomic(self, next):
+        
+        (index, node) = next[1]
+        
+        # discard old values (shared with lookaheads; indices are distinct)
+        if self._lookaheads[0] != self._offset:
+            self._lookaheads = (self._offset, {})
+        lookaheads = self._lookaheads[1]
+        
+        if index in lookaheads:
+            # only non-mutating non-reading values are cached 
+            mutates = False
+            end = lookaheads[index]
+        else:
+            # match the contents, taking the first match only
+            (reads, mutates, _size) = lookahead_logic(node, True, None)
+            new_state = self._state.clone(index)
+            self.push()
+            try:
+                match = self._run_from(new_state, self._text, self._offset, 
+                                       False)
+                new_state = self._state
+            finally:
+                self.pop()
+            end = match.end(0) if match else None
+            if not (mutates or reads):
+                lookaheads[index] = end
+                
+        if end is None:
+            raise Fail
+        if mutates:
+            self._state.merge_groups(new_state)
+        if end == self._offset:
+            return 0
+        else:
+            # continue after skipping the matched text
+            self._state.skip = end - self._offset
+            self._states.append(self._state.advance(next[0][0]))
+            raise Fail
 
     def repeat(self, next, begin, end, lazy):
         # index on first loop item
@@ -131,6 +131,8 @@ class State(object):
                     self.__hash ^= start << 16
                     self.__hash ^= end << 24
                     groups[number] = new
+        if other.__last_number is not None:
+            self.__last_number = other.__last_number
             
     def get_loop(self, index):
         loops = self.__loops
@@ -0,0 +1,538 @@
+
+# The contents of this file are subject to the Mozilla Public License
+# (MPL) Version 1.1 (the "License"); you may not use this file except
+# in compliance with the License. You may obtain a copy of the License
+# at http://www.mozilla.org/MPL/                                      
+#                                                                     
+# Software distributed under the License is distributed on an "AS IS" 
+# basis, WITHOUT WARRANTY OF ANY KIND, either express or implied. See 
+# the License for the specific language governing rights and          
+# limitations under the License.                                      
+#                                                                     
+# The Original Code is RXPY (http://www.acooke.org/rxpy)              
+# The Initial Developer of the Original Code is Andrew Cooke.         
+# Portions created by the Initial Developer are Copyright (C) 2010
+# Andrew Cooke (andrew@acooke.org). All Rights Reserved.               
+#                                                                      
+# Alternatively, the contents of this file may be used under the terms 
+# of the LGPL license (the GNU Lesser General Public License,          
+# http://www.gnu.org/licenses/lgpl.html), in which case the provisions 
+# of the LGPL License are applicable instead of those above.           
+#                                                                      
+# If you wish to allow use of your version of this file only under the 
+# terms of the LGPL License and not to allow others to use your version
+# of this file under the MPL, indicate your decision by deleting the   
+# provisions above and replace them with the notice and other provisions
+# required by the LGPL License.  If you do not delete the provisions    
+# above, a recipient may use your version of this file under either the 
+# MPL or the LGPL License.          
+
+'''
+A lazy DFA for patterns without groups, back-references, lookaheads or 
+counted repeats (the approach of Thompson, as described by Russ Cox in 
+dfa1.c, and used in plan9 grep).
+
+Each DFA state is an ordered tuple of threads (positions in the graph, in
+priority order) together with a summary of the previous character and a 
+flag that shows whether new matches are still being started.  Transitions 
+are calculated as needed and cached on the state, so once the automaton is 
+"warm" each character costs a single dictionary lookup.  The epsilon 
+closure of a state (the threads that can consume the next character) is 
+also cached, so it is calculated once, not for each new character.
+
+States do not include offsets, so when searching the start of a match is 
+found by a second pass from the last offset with no pending threads, 
+tracking where each thread started (see `Dfa.sources()`).
+
+The cache is shared by all engines for a given graph and is flushed when it
+grows larger than `Dfa.CACHE_SIZE` transitions (the number of flushes is
+recorded in `Dfa.flushes`).
+
+Patterns that the DFA cannot handle are passed to `SimpleEngine`.
+
+The DFA can also match a set of patterns (see `SetEngine`), in which case
+closing the group for a pattern records that it has matched.
+'''
+
+from weakref import WeakKeyDictionary, ref
+
+from rxpy.engine.quick.simple.engine import SimpleEngine
+from rxpy.engine.support import Groups, FirstCharacters, CharacterClasses
+from rxpy.graph.opcode import String, Character, Dot, Digit, Space, Word, \
+    Split, Match, NoMatch, Checkpoint, StartOfLine, EndOfLine, WordBoundary, \
+    StartGroup, EndGroup
+from rxpy.lib import Budget
+
+
+# transition keys for the end of the text, and for a newline that is the 
+# final character (which is significant to `$`)
+END = object()
+FINAL_NEWLINE = object()
+
+
+class DfaState(object):
+    '''
+    A state in the DFA.
+    
+    - `threads` is a tuple of `(index, offset)` pairs, in priority order, 
+      where `index` identifies a graph node and `offset` is the number of 
+      characters already matched (for `String` nodes; otherwise zero).
+      
+    - `previous` summarises the previous character (for assertions).
+    
+    - `searching` is true if a new match should be started at each offset.
+    
+    - `dead` is true if no further match is possible.
+    
+    - `transitions` maps from character to `(state, matched)`, where 
+      `matched` is true if a match ends before the character (for a set of
+      patterns, it is the set of pattern indices).
+      
+    - `by_class` holds the same values by character class (see 
+      `CharacterClasses`), so that each is calculated once per class.
+      
+    - `sources` maps from character to the sources of the threads in the 
+      next state (see `Dfa.sources()`).
+    '''
+    
+    def __init__(self, threads, previous, searching):
+        self.threads = threads
+        self.previous = previous
+        self.searching = searching
+        self.transitions = {}
+        self.by_class = {}
+        self.sources = {}
+        # no further match is possible
+        self.dead = not (threads or searching)
+    
+
+class Dfa(object):
+    '''
+    The states and cached transitions for a graph.
+    
+    If `patterns` (a map from group number to pattern index) is given then 
+    the graph is from `parse_groups()` and all matches are found, without 
+    discarding lower priority threads.
+    '''
+    
+    # the maximum number of cached transitions
+    CACHE_SIZE = 10000
+    
+    # map from graph to shared instance
+    __cache = WeakKeyDictionary()
+    
+    def __init__(self, parser_state, graph, cache_size=None, patterns=None):
+        self.cache_size = self.CACHE_SIZE if cache_size is None else cache_size
+        self.__patterns = patterns
+        # the number of times the cache has been flushed
+        self.flushes = 0
+        self.__alphabet = parser_state.alphabet
+        # nodes by index (weakly, so that the cache does not keep the graph
+        # alive), and map from node id to index
+        self.__nodes = []
+        self.__indices = {}
+        # is the graph supported? does it contain assertions?
+        (self.supported, self.__context) = self.__number(graph)
+        self.__classes = CharacterClasses.for_graph(parser_state, graph) \
+            if self.supported else None
+        # map from (threads, previous, searching) to state
+        self.__states = {}
+        # map from (previous, key) to the threads started when searching
+        # (for a set of patterns only)
+        self.__seeds = {}
+        # map from (threads, previous, searching, context) to closure
+        self.__closures = {}
+        # number of cached transitions
+        self.__size = 0
+        
+    @staticmethod
+    def for_graph(parser_state, graph):
+        '''
+        The (cached) instance for the given graph.
+        '''
+        cache = Dfa.__cache
+        if graph not in cache:
+            cache[graph] = Dfa(parser_state, graph)
+        return cache[graph]
+    
+    def __number(self, graph):
+        '''
+        Index the nodes and check that they are all supported.
+        '''
+        supported, context = True, False
+        stack = [graph]
+        while stack:
+            node = stack.pop()
+            if id(node) not in self.__indices:
+                self.__indices[id(node)] = len(self.__nodes)
+                self.__nodes.append(ref(node))
+                if isinstance(node, (StartOfLine, EndOfLine, WordBoundary)):
+                    context = True
+                elif isinstance(node, (StartGroup, EndGroup)):
+                    supported = supported and self.__patterns is not None
+                elif not isinstance(node, (String, Character, Dot, Digit, 
+                                           Space, Word, Split, Match, 
+                                           NoMatch, Checkpoint)):
+                    supported = False
+                stack.extend(node.next)
+        return (supported, context)
+        
+    def __summary(self, character):
+        '''
+        The information about the previous character that assertions need.
+        '''
+        if self.__context:
+            if character is None:
+                return (True, False, False)
+            else:
+                return (False, character == '\n', 
+                        bool(self.__alphabet.word(character)))
+        else:
+            return None
+            
+    def __intern(self, threads, previous, searching):
+        key = (threads, previous, searching)
+        if key not in self.__states:
+            self.__states[key] = DfaState(threads, previous, searching)
+        return self.__states[key]
+    
+    def initial(self, text, offset, search):
+        '''
+        The state for starting at `offset` in `text`.
+        '''
+        previous = self.__summary(text[offset-1] if offset else None)
+        if search:
+            return self.__intern((), previous, True)
+        else:
+            return self.__intern(((0, 0),), previous, False)
+        
+    def flush(self):
+        '''
+        Discard all cached states and transitions.  States already held by
+        the caller remain valid.
+        '''
+        for state in self.__states.values():
+            state.transitions.clear()
+            state.by_class.clear()
+            state.sources.clear()
+        self.__states = {}
+        self.__seeds = {}
+        self.__closures = {}
+        self.__size = 0
+        self.flushes += 1
+        
+    def transition(self, state, key):
+        '''
+        Calculate (and cache) the transition from `state` for `key` (a 
+        character, `END` or `FINAL_NEWLINE`).
+        '''
+        if self.__size >= self.cache_size:
+            self.flush()
+        if key is END:
+            current = None
+            class_ = key
+        elif key is FINAL_NEWLINE:
+            current = '\n'
+            class_ = key
+        else:
+            current = key
+            class_ = self.__classes.classify(key)
+        if class_ is None or class_ not in state.by_class:
+            result = self.__transition(state, key, current)
+            if class_ is not None:
+                state.by_class[class_] = result
+        else:
+            result = state.by_class[class_]
+        state.transitions[key] = result
+        self.__size += 1
+        return result
+    
+    def sources(self, state, key):
+        '''
+        For the transition from `state` for `key`, the index in 
+        `state.threads` that each thread in the next state follows from, 
+        and the index of the thread that matched (or `None`).  An index of 
+        -1 is a thread started at the current offset (when searching).
+        
+        This lets the caller track where each thread started, and so where
+        a match starts, without including offsets in the states.
+        '''
+        if key not in state.sources:
+            if self.__size >= self.cache_size:
+                self.flush()
+            if key is END:
+                current = None
+            elif key is FINAL_NEWLINE:
+                current = '\n'
+            else:
+                current = key
+            (_, _, sources, source) = self.__advance(
+                state.threads, state.previous, state.searching, key, current)
+            state.sources[key] = (sources, source)
+            self.__size += 1
+        return state.sources[key]
+    
+    def __transition(self, state, key, current):
+        '''
+        Calculate the transition from `state` for `key` (with `current` 
+        the character, if any).
+        '''
+        if self.__patterns is None or not state.searching:
+            (threads, matched, _, _) = \
+                self.__advance(state.threads, state.previous, 
+                               state.searching, key, current)
+            searching = state.searching and \
+                (self.__patterns is not None or not matched)
+        else:
+            # without priorities, the threads started when searching do not
+            # depend on the existing threads, so are cached separately
+            (threads, matched, _, _) = \
+                self.__advance(state.threads, state.previous, False, 
+                               key, current)
+            seed = (state.previous, key)
+            if seed not in self.__seeds:
+                self.__seeds[seed] = self.__advance((), state.previous, True,
+                                                    key, current)[:2]
+            (started, also) = self.__seeds[seed]
+            known = set(threads)
+            threads += tuple(thread for thread in started 
+                             if thread not in known)
+            matched |= also
+            searching = True
+        return (self.__intern(threads, self.__summary(current), searching),
+                matched)
+    
+    def __advance(self, threads, previous, searching, key, current):
+        '''
+        The threads that follow the given threads after consuming the 
+        current character, the match flag, and their sources (see 
+        `__closure()`).
+        '''
+        if self.__context:
+            # the parts of the character that assertions depend on
+            context = (key is END, key is FINAL_NEWLINE, current == '\n', 
+                       bool(self.__alphabet.word(current)))
+        else:
+            context = None
+        closure = (threads, previous, searching, context)
+        if closure not in self.__closures:
+            self.__closures[closure] = self.__closure(threads, previous, 
+                                                      searching, key, current)
+        (consumers, matched, sources, source) = self.__closures[closure]
+        advanced = []
+        advanced_sources = []
+        if current is not None:
+            known = set()
+            for ((index, offset), source_) in zip(consumers, sources):
+                node = self.__nodes[index]()
+                if self.__consumes(node, offset, current):
+                    if isinstance(node, String) and offset+1 < len(node.text):
+                        thread = (index, offset+1)
+                    else:
+                        thread = (self.__indices[id(node.next[0])], 0)
+                    if thread not in known:
+                        known.add(thread)
+                        advanced.append(thread)
+                        advanced_sources.append(source_)
+        return (tuple(advanced), matched, tuple(advanced_sources), source)
+    
+    def __closure(self, threads, previous, searching, key, current):
+        '''
+        Follow the threads, in priority order, through nodes that do not
+        consume input.  Returns the threads that can consume the current 
+        character and a flag that is true if a match was found (in which 
+        case threads of lower priority are discarded).
+        
+        For a set of patterns, the flag is replaced by the set of patterns
+        matched, and no threads are discarded.
+        
+        The sources (see `sources()`) of the consumers, and of the match, 
+        are also returned.
+        '''
+        patterns = self.__patterns
+        matched = set()
+        (start, newline, word) = previous or (None, None, None)
+        # each entry is a thread and its source
+        stack = list(reversed(list(zip(threads, range(len(threads))))))
+        if searching:
+            # lowest priority
+            stack.insert(0, ((0, 0), -1))
+        consumers = []
+        sources = []
+        known = set()
+        while stack:
+            (thread, source) = stack.pop()
+            if thread in known:
+                continue
+            known.add(thread)
+            node = self.__nodes[thread[0]]()
+            if isinstance(node, Match):
+                return (consumers, True, sources, source)
+            elif isinstance(node, EndGroup) and node.number in patterns:
+                matched.add(patterns[node.number])
+            elif isinstance(node, (StartGroup, EndGroup)):
+                stack.append(((self.__indices[id(node.next[0])], 0), source))
+            elif isinstance(node, Split):
+                stack.extend(((self.__indices[id(next)], 0), source)
+                             for next in reversed(node.next))
+            elif isinstance(node, Checkpoint):
+                # revisiting at the same offset is already excluded
+                stack.append(((self.__indices[id(node.next[0])], 0), source))
+            elif isinstance(node, NoMatch):
+                pass
+            elif isinstance(node, StartOfLine):
+                if start or (node.multiline and newline):
+                    stack.append(((self.__indices[id(node.next[0])], 0), 
+                                  source))
+            elif isinstance(node, EndOfLine):
+                if key is END or key is FINAL_NEWLINE or \
+                        (node.multiline and current == '\n'):
+                    stack.append(((self.__indices[id(node.next[0])], 0), 
+                                  source))
+            elif isinstance(node, WordBoundary):
+                boundary = bool(self.__alphabet.word(current)) != word
+                if boundary != node.inverted:
+                    stack.append(((self.__indices[id(node.next[0])], 0), 
+                                  source))
+            else:
+                consumers.append(thread)
+                sources.append(source)
+        if patterns is None:
+            return (consumers, False, sources, None)
+        else:
+            return (consumers, frozenset(matched), sources, None)
+    
+    def __consumes(self, node, offset, current):
+        alphabet = self.__alphabet
+        if isinstance(node, String):
+            return node.text[offset] == current
+        elif isinstance(node, Character):
+            return current in node
+        elif isinstance(node, Dot):
+            return node.multiline or current != '\n'
+        elif isinstance(node, Digit):
+            return bool(alphabet.digit(current)) != node.inverted
+        elif isinstance(node, Space):
+            return bool(alphabet.space(current)) != node.inverted
+        else:
+            return bool(alphabet.word(current)) != node.inverted
+        
+        
+class DfaEngine(SimpleEngine):
+    
+    def __init__(self, parser_state, graph, program=None, cache_size=None):
+        if cache_size is None:
+            self.__dfa = Dfa.for_graph(parser_state, graph)
+        else:
+            self.__dfa = Dfa(parser_state, graph, cache_size=cache_size)
+        # the compiled program is only needed if the dfa cannot be used
+        if program is None and self.__dfa.supported:
+            program = []
+        super(DfaEngine, self).__init__(parser_state, graph, program=program)
+        
+    @property
+    def flushes(self):
+        return self.__dfa.flushes
+    
+    def run(self, text, pos=0, search=False, budget=None):
+        if not self.__dfa.supported:
+            return super(DfaEngine, self).run(text, pos=pos, search=search,
+                                              budget=budget)
+        self._start_budget(budget, 0, pos)
+        
+        first = FirstCharacters.for_graph(self._graph) if search else None
+        (end, restart) = self.__scan(text, pos, search, first)
+        
+        if end is not None and search:
+            pos = self.__start(text, restart, end)
+                
+        if end is None:
+            return Groups()
+        else:
+            groups = Groups(self._parser_state.groups, text)
+            groups.start_group(0, pos)
+            groups.end_group(0, end)
+            return groups
+        
+    def __scan(self, text, offset, search, first):
+        '''
+        Run the DFA from `offset`, returning the end of the match (or 
+        `None`) and the earliest offset at which it can start.
+        
+        Ticks are counted once per character.
+        '''
+        dfa = self.__dfa
+        state = dfa.initial(text, offset, search)
+        last = len(text) - 1
+        matched = None
+        restart = offset
+        ticks, limit = self.ticks, self._limit
+        while True:
+            if search and not state.threads:
+                # no match in progress
+                if first is not None:
+                    jump = first.find(text, offset)
+                    if jump < 0:
+                        break
+                    if jump != offset:
+                        offset = jump
+                        state = dfa.initial(text, offset, True)
+                restart = offset
+            if offset < last:
+                key = text[offset]
+            elif offset == last:
+                key = FINAL_NEWLINE if text[offset] == '\n' else text[offset]
+            else:
+                key = END
+            try:
+                (state, match) = state.transitions[key]
+            except KeyError:
+                (state, match) = dfa.transition(state, key)
+            ticks += 1
+            if ticks >= limit:
+                limit = Budget.limit(self._budget, ticks, offset)
+            if match:
+                matched = offset
+            if key is END or state.dead:
+                break
+            offset += 1
+        self.ticks, self._limit = ticks, limit
+        return (matched, restart)
+    
+    def __start(self, text, offset, end):
+        '''
+        Repeat a search from `offset` (where no threads were pending) to 
+        `end` (where the match ends), tracking where each thread started, 
+        and return the start of the match.
+        
+        Ticks are counted once per character.
+        '''
+        dfa = self.__dfa
+        state = dfa.initial(text, offset, True)
+        last = len(text) - 1
+        # the start offset for each thread in the state
+        starts = ()
+        start = None
+        ticks, limit = self.ticks, self._limit
+        while offset <= end:
+            if offset < last:
+                key = text[offset]
+            elif offset == last:
+                key = FINAL_NEWLINE if text[offset] == '\n' else text[offset]
+            else:
+                key = END
+            (sources, source) = dfa.sources(state, key)
+            try:
+                (state, match) = state.transitions[key]
+            except KeyError:
+                (state, match) = dfa.transition(state, key)
+            ticks += 1
+            if ticks >= limit:
+                limit = Budget.limit(self._budget, ticks, offset)
+            if match:
+                start = offset if source < 0 else starts[source]
+            starts = tuple(offset if source < 0 else starts[source]
+                           for source in sources)
+            offset += 1
+        self.ticks, self._limit = ticks, limit
+        return start
@@ -39,3 +39,27 @@ class HybridEngineTest(EngineTest, TestCase):
     def default_engine(self):
         return HybridEngine
 
+    def test_resume_fallback(self):
+        text = 'a' * 100 + 'z' + 'b' * 90
+        # the fallback continues from the (late) repeat, so one tick more
+        # than the complex engine alone
+        assert self.engine(self.parse('.*zb{90}'), text, ticks=668)
+        assert self.engine(self.parse('.*zb{90}'), text, search=True, 
+                           ticks=668)
+        # but with groups it must restart
+        assert self.engine(self.parse('(.*)zb{90}'), text, ticks=974)
+        result = self.engine(self.parse('.*zb{90}|a+'), text, search=True)
+        assert result.end(0) == 191, result.end(0)
+        assert not self.engine(self.parse('.*zb{90}'), text[:-1])
+
+    def test_groups_to_end(self):
+        text = 'a' + 'x' * 10 + 'z' + 'x' * 1000
+        # groups are found only over the matched text (almost all ticks
+        # are from the simple engine, which must search to the end of the
+        # text to find the end of the match)
+        result = self.engine(self.parse('(a.*)z'), text, ticks=4076)
+        assert result.group(1) == 'a' + 'x' * 10, result.group(1)
+        # and not at all when there is no match
+        assert not self.engine(self.parse('(a)c|(?<!b)d'), 'ab', search=True)
+        assert not self.engine(self.parse('(a)c'), 'ab', search=True, 
+                               ticks=2)
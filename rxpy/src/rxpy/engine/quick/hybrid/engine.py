@@ -31,7 +31,9 @@
 
 from rxpy.engine.quick.simple.engine import SimpleEngine
 from rxpy.lib import UnsupportedOperation
+from rxpy.engine.support import FirstCharacters
 from rxpy.engine.quick.complex.engine import ComplexEngine
+from rxpy.engine.quick.complex.support import State
 
 
 class HybridEngine(SimpleEngine):
@@ -40,22 +42,55 @@ class HybridEngine(SimpleEngine):
         super(HybridEngine, self).__init__(parser_state, graph, program=program)
         self.__cached_fallback = None
     
-    def run(self, text, pos=0, search=False):
+    def run(self, text, pos=0, search=False, budget=None):
         self._group_defined = False
+        self._start_budget(budget, 0, pos)
 
         try:
-            results = self._run_from(0, text, pos, search)
+            first = FirstCharacters.for_graph(self._graph) if search else None
+            results = self._run_from(0, text, pos, search, first)
             
-            if self._group_defined:
+            if self._group_defined and results:
                 # reprocess using only the exact region matched
-                return self.__fallback.run(text, results.start(0))
+                return self.__run_fallback(text, results.start(0), False, 
+                                           budget, end=results.end(0))
             else:
                 return results
             
         except UnsupportedOperation:
-            # todo - restart from exact position (will need to set index in
-            # compiled function stack by catching exception)
-            return self.__fallback.run(text, pos=pos, search=search)
+            if self._parser_state.groups.count:
+                # the simple engine does not record groups, so restart
+                return self.__run_fallback(text, pos, search, budget)
+            else:
+                return self.__resume_fallback(text, pos, search, budget)
+        
+    def __run_fallback(self, text, pos, search, budget, end=None):
+        fallback = self.__fallback
+        try:
+            return fallback.run(text, pos=pos, search=search, 
+                                budget=budget, ticks=self.ticks, end=end)
+        finally:
+            self.ticks = fallback.ticks
+        
+    def __resume_fallback(self, text, pos, search, budget):
+        '''
+        Continue from the point of failure, converting the simple engine's
+        threads to the fallback's states.
+        '''
+        (offset, states, next_states) = self._suspended
+        def convert(thread):
+            (index, start, skip) = thread
+            state = State(0, text).start_group(0, start).advance(index)
+            state.skip = skip
+            return state
+        fallback = self.__fallback
+        try:
+            return fallback._resume(text, pos, offset, search, 
+                                    map(convert, states), 
+                                    map(convert, next_states),
+                                    budget=budget, ticks=self.ticks)
+        finally:
+            self.ticks = fallback.ticks
         
     @property
     def __fallback(self):
@@ -48,6 +48,9 @@ class SimpleEngineTest(EngineTest, TestCase):
     def test_groups(self):
         pass
     
+    def test_atomic_groups(self):
+        pass
+    
     def test_group_reference(self):
         pass
     
@@ -60,6 +63,9 @@ class SimpleEngineTest(EngineTest, TestCase):
     def test_lookback_bug_1(self):
         pass
     
+    def test_lookback_bug_3(self):
+        pass
+    
     def test_groups_in_lookback(self):
         pass
     
@@ -75,3 +81,11 @@ class SimpleEngineTest(EngineTest, TestCase):
     def test_prime(self):
         pass
     
+
+    def test_deferred_match_end(self):
+        # the match ends where it was found, not where lower priority 
+        # threads fail
+        result = self.engine(self.parse('a.*z'), 'axzxx')
+        assert result.end(0) == 3, result.end(0)
+        result = self.engine(self.parse('a.*z'), 'xaxzxxzxx', search=True)
+        assert (result.start(0), result.end(0)) == (1, 7), result.end(0)
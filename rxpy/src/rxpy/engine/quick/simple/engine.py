@@ -35,8 +35,9 @@ plus the earliest start index and a matched flag).
 
 
 from rxpy.engine.base import BaseEngine
-from rxpy.lib import UnsupportedOperation, _LOOP_UNROLL
-from rxpy.engine.support import Match, Fail, lookahead_logic, Groups
+from rxpy.lib import UnsupportedOperation, _LOOP_UNROLL, Budget
+from rxpy.engine.support import Match, Fail, lookahead_logic, Groups, \
+    LiteralPrefix, Reversed, reversed_lookback
 from rxpy.graph.compiled import BaseCompiled, compile
 
 
@@ -50,6 +51,10 @@ class SimpleEngine(BaseEngine, BaseCompiled):
             program = compile(graph, self)
         self._program = program
         self.__stack = []
+        # map from reversed lookback graph to engine
+        self.__lookbacks = {}
+        # (offset, states, next_states) when an operation is unsupported
+        self._suspended = None
         
     def push(self):
         # group_defined purposefully excluded
@@ -76,19 +81,32 @@ class SimpleEngine(BaseEngine, BaseCompiled):
         else:
             self._previous = None
         
-    def run(self, text, pos=0, search=False):
+    def run(self, text, pos=0, search=False, budget=None):
         self._group_defined = False
+        self._start_budget(budget, 0, pos)
         
-        # TODO - add explicit search if expression starts with constant
-        
-        result = self._run_from(0, text, pos, search)
+        first = LiteralPrefix.for_graph(self._graph) if search else None
+        result = self._run_from(0, text, pos, search, first)
         
         if self._group_defined:
             raise UnsupportedOperation('groups')
         else:
             return result
         
-    def _run_from(self, start_state, text, pos, search):
+    def _start_budget(self, budget, ticks, pos):
+        '''
+        Ticks are counted for each compiled action called directly from
+        `_run_from()` (roughly, once per state per character).
+        '''
+        self.ticks = ticks
+        self._budget = budget
+        self._limit = Budget.limit(budget, ticks, pos)
+        
+    def _run_from(self, start_state, text, pos, search, first=None):
+        '''
+        If `first` is given (a `FirstCharacters`) then the search only 
+        starts new matches where a match could begin.
+        '''
         self._text = text
         self._set_offset(pos)
         self._search = search
@@ -96,6 +114,12 @@ class SimpleEngine(BaseEngine, BaseCompiled):
         self._lookaheads = (self._offset, {})
         search = self._search # read only, deref optimisation
         
+        if first is not None:
+            offset = first.find(text, pos)
+            if offset < 0:
+                return Groups()
+            self._set_offset(offset)
+        
         self._states = [(start_state, self._offset, 0)]
         
         try:
@@ -108,6 +132,10 @@ class SimpleEngine(BaseEngine, BaseCompiled):
                     
                     # unpack state
                     (state, self._group_start, skip) = self._states.pop()
+                    self.ticks += 1
+                    if self.ticks >= self._limit:
+                        self._limit = Budget.limit(self._budget, self.ticks, 
+                                                   self._offset)
                     try:
                         
                         if not skip:
@@ -119,6 +147,7 @@ class SimpleEngine(BaseEngine, BaseCompiled):
                                 known_next.add(next)
                                 
                         elif skip == -1:
+                            # a deferred match (state is the end offset)
                             raise Match
 
                         else:
@@ -139,11 +168,21 @@ class SimpleEngine(BaseEngine, BaseCompiled):
                         pass
                     
                     except Match:
+                        end = state if skip == -1 else self._offset
                         if not next_states:
+                            self._offset = end
                             raise
-                        next_states.append((next, self._group_start, -1))
-                        known_next.add(next)
+                        # defer until threads with higher priority fail
+                        next_states.append((end, self._group_start, -1))
                         self._states = []
+                        
+                    except UnsupportedOperation:
+                        # save the threads so that another engine can 
+                        # continue from here (the outermost call is last)
+                        self._states.append((state, self._group_start, skip))
+                        self._suspended = \
+                            (self._offset, self._states, next_states)
+                        raise
                     
                 # move to next character
                 self._set_offset(self._offset + 1)
@@ -151,13 +190,25 @@ class SimpleEngine(BaseEngine, BaseCompiled):
                
                 # add current position as search if necessary
                 if search and start_state not in known_next:
-                    self._states.append((start_state, self._offset, 0))
+                    if first is None:
+                        self._states.append((start_state, self._offset, 0))
+                    else:
+                        # with no states, jump to the next possible start
+                        if not next_states:
+                            offset = first.find(self._text, self._offset)
+                            if offset < 0:
+                                break
+                            self._set_offset(offset)
+                        if self._current in first:
+                            self._states.append(
+                                (start_state, self._offset, 0))
                     
                 self._states.reverse()
             
             while self._states:
-                (state, self._group_start, matched) = self._states.pop()
-                if matched:
+                (state, self._group_start, skip) = self._states.pop()
+                if skip == -1:
+                    self._offset = state
                     raise Match
                 
             # exhausted states with no match
@@ -286,29 +337,81 @@ class SimpleEngine(BaseEngine, BaseCompiled):
             if reads:
                 raise UnsupportedOperation('lookahead')
             
+            reverse = None if forwards else reversed_lookback(node)
+            if reverse is not None:
+                lookaheads[index] = bool(self.__lookback(reverse)) == equal
+                
             # invoke simple engine and cache
+            else:
+                self.push()
+                try:
+                    if forwards:
+                        text = self._text
+                        pos = self._offset
+                        search = False
+                    else:
+                        text = self._text[0:self._offset]
+                        if size is None:
+                            pos = 0
+                            search = True
+                        else:
+                            pos = self._offset - size
+                            search = False
+                    result = \
+                        bool(self._run_from(index, text, pos, search)) == equal
+                finally:
+                    self.pop()
+                lookaheads[index] = result
+            
+        if lookaheads[index]:
+            return 0
+        else:
+            raise Fail
+        
+    def __lookback(self, graph):
+        '''
+        Match the reversed contents of a lookback (see `reversed_lookback()`)
+        from the current offset, over the preceding text, with a separate 
+        engine.
+        '''
+        if self._offset < 0:
+            return Groups()
+        if graph not in self.__lookbacks:
+            self.__lookbacks[graph] = SimpleEngine(self._parser_state, graph)
+        engine = self.__lookbacks[graph]
+        engine._start_budget(self._budget, self.ticks, self._offset)
+        result = engine._run_from(0, Reversed(self._text, self._offset), 0, 
+                                  False)
+        self.ticks = engine.ticks
+        return result
+
+    def atomic(self, next):
+        (index, node) = next[1]
+        
+        # discard old values (shared with lookaheads; indices are distinct)
+        if self._lookaheads[0] != self._offset:
+            self._lookaheads = (self._offset, {})
+        lookaheads = self._lookaheads[1]
+        
+        if index not in lookaheads:
+            # invoke simple engine to find the first match only and cache 
+            # the end offset
             self.push()
             try:
-                if forwards:
-                    text = self._text
-                    pos = self._offset
-                    search = False
-                else:
-                    text = self._text[0:self._offset]
-                    if size is None:
-                        pos = 0
-                        search = True
-                    else:
-                        pos = self._offset - size
-                        search = False
-                result = bool(self._run_from(index, text, pos, search)) == equal
+                match = self._run_from(index, self._text, self._offset, False)
             finally:
                 self.pop()
-            lookaheads[index] = result
+            lookaheads[index] = match.end(0) if match else None
             
-        if lookaheads[index]:
+        end = lookaheads[index]
+        if end is None:
+            raise Fail
+        elif end == self._offset:
             return 0
         else:
+            # continue after skipping the matched text
+            self._states.append((next[0][0], self._group_start, 
+                                 end - self._offset))
             raise Fail
 
     def repeat(self, next, begin, end, lazy):
@@ -0,0 +1,136 @@
+
+# The contents of this file are subject to the Mozilla Public License
+# (MPL) Version 1.1 (the "License"); you may not use this file except
+# in compliance with the License. You may obtain a copy of the License
+# at http://www.mozilla.org/MPL/                                      
+#                                                                     
+# Software distributed under the License is distributed on an "AS IS" 
+# basis, WITHOUT WARRANTY OF ANY KIND, either express or implied. See 
+# the License for the specific language governing rights and          
+# limitations under the License.                                      
+#                                                                     
+# The Original Code is RXPY (http://www.acooke.org/rxpy)              
+# The Initial Developer of the Original Code is Andrew Cooke.         
+# Portions created by the Initial Developer are Copyright (C) 2010
+# Andrew Cooke (andrew@acooke.org). All Rights Reserved.               
+#                                                                      
+# Alternatively, the contents of this file may be used under the terms 
+# of the LGPL license (the GNU Lesser General Public License,          
+# http://www.gnu.org/licenses/lgpl.html), in which case the provisions 
+# of the LGPL License are applicable instead of those above.           
+#                                                                      
+# If you wish to allow use of your version of this file only under the 
+# terms of the LGPL License and not to allow others to use your version
+# of this file under the MPL, indicate your decision by deleting the   
+# provisions above and replace them with the notice and other provisions
+# required by the LGPL License.  If you do not delete the provisions    
+# above, a recipient may use your version of this file under either the 
+# MPL or the LGPL License.          
+
+
+'''
+Choose an engine for each pattern, by inspecting the parsed graph.
+
+The features that matter are (in order):
+
+- Group references and conditionals are only handled efficiently by
+  backtracking.
+  
+- Without groups or lookarounds the lazy DFA (a variant of the simple 
+  engine) is fastest, provided counted repeats are small enough to unroll.
+
+- Nested loops (eg. `(a+)*`, including counted repeats inside loops) can
+  be ambiguous, so take exponential time with backtracking; a parallel 
+  engine discards duplicate threads and so remains linear.
+
+- Lookarounds are handled well by backtracking with a bit state.
+
+- Counted repeats are handled directly by the complex engine.
+
+- Otherwise, groups use the hybrid engine (the simple engine, with a 
+  fallback to the complex engine for groups).
+'''
+
+from rxpy.engine.backtrack.engine import BitStateBacktrackingEngine
+from rxpy.engine.parallel.wide.engine import WideEngine
+from rxpy.engine.quick.complex.engine import ComplexEngine
+from rxpy.engine.quick.dfa.engine import DfaEngine
+from rxpy.engine.quick.hybrid.engine import HybridEngine
+from rxpy.graph.opcode import StartGroup, Lookahead, Atomic, Repeat
+from rxpy.graph.support import node_iterator, nested_loops, ReadsGroup
+
+
+class Selector(object):
+    '''
+    Used in place of an engine class.  `compile()` calls `select()` and 
+    re-parses the pattern with the flags the chosen engine requires.  
+    Elsewhere (eg. `Scanner`) the pattern has already been parsed, so the
+    instance is called as an engine constructor and falls back to 
+    `fallback` if the chosen engine needs different flags.
+    '''
+    
+    # this parses the pattern with no engine-specific flags
+    REFUSE = 0
+    REQUIRE = 0
+    
+    # counted repeats larger than this are not unrolled for the DFA
+    UNROLL_LIMIT = 16
+    
+    def __init__(self, fallback=BitStateBacktrackingEngine):
+        self.fallback = fallback
+        
+    def select(self, parsed):
+        '''
+        Return `(engine, reason)` for the given `(parser_state, graph)`, 
+        where `reason` is a short description of the deciding feature.
+        '''
+        (_parser_state, graph) = parsed
+        references = groups = lookarounds = large = counted = False
+        for node in node_iterator(graph):
+            if isinstance(node, ReadsGroup):
+                references = True
+            elif isinstance(node, StartGroup):
+                groups = True
+            elif isinstance(node, (Lookahead, Atomic)):
+                lookarounds = True
+            elif isinstance(node, Repeat):
+                counted = True
+                size = node.begin if node.end is None else node.end
+                large = large or size > self.UNROLL_LIMIT
+        if references:
+            return (BitStateBacktrackingEngine, 'group references')
+        elif not (groups or lookarounds or large):
+            return (DfaEngine, 'no groups')
+        elif nested_loops(graph):
+            return (WideEngine, 'nested loops')
+        elif lookarounds:
+            return (BitStateBacktrackingEngine, 'lookarounds')
+        elif counted:
+            return (ComplexEngine, 'counted repeats')
+        else:
+            return (HybridEngine, 'groups')
+        
+    def accepts(self, engine, parser_state):
+        '''
+        Can the engine be used with a pattern that has already been parsed?
+        '''
+        flags = parser_state.flags
+        return flags & engine.REQUIRE == engine.REQUIRE and \
+            not flags & engine.REFUSE
+    
+    def select_parsed(self, parsed):
+        '''
+        As `select()`, but restricted to engines that accept the existing
+        parse.
+        '''
+        (engine, reason) = self.select(parsed)
+        if not self.accepts(engine, parsed[0]):
+            (engine, reason) = (self.fallback, reason + ' (fallback)')
+        return (engine, reason)
+    
+    def __call__(self, parser_state, graph):
+        (engine, _reason) = self.select_parsed((parser_state, graph))
+        return engine(parser_state, graph)
+    
+    def __str__(self):
+        return 'Selector'
@@ -32,10 +32,16 @@
 Support classes shared by various engines.
 '''                 
 
+from bisect import bisect_right
+from mmap import mmap
 from operator import xor                   
+from weakref import WeakKeyDictionary
 
-from rxpy.graph.support import contains_instance, ReadsGroup
-from rxpy.graph.opcode import StartGroup
+from rxpy.graph.support import contains_instance, ReadsGroup, \
+    reverse_lookback, node_iterator
+from rxpy.graph.opcode import StartGroup, String, Character, NoMatch, \
+    Lookahead, Atomic, Dot, Digit, Space, Word, GroupReference, \
+    StartOfLine, EndOfLine, WordBoundary, Match as MatchNode
 from rxpy.parser.support import GroupState
 
 
@@ -57,31 +63,52 @@ class Loops(object):
     '''
     The state needed to track explicit repeats.  This assumes that loops are 
     nested (as they must be).
+    
+    Cloning is O(1): the counts and order are shared between clones until
+    one of them is modified, when that instance takes a private copy (copy 
+    on write).
     '''
     
+    # the number of copies made on write (for benchmarks)
+    copies = 0
+    
     def __init__(self, counts=None, order=None):
         # counts for loops in nested order
         self.__counts = counts if counts else []
         # map from node to position in counts list
         self.__order = order if order else {}
+        # are counts and order shared with another instance?
+        self.__shared = bool(counts or order)
+        
+    def __copy_on_write(self):
+        if self.__shared:
+            Loops.copies += 1
+            self.__counts = list(self.__counts)
+            self.__order = dict(self.__order)
+            self.__shared = False
         
     def increment(self, node):
+        self.__copy_on_write()
         if node not in self.__order:
             order = len(self.__counts)
             self.__order[node] = order
             self.__counts.append(0)
         else:
             order = self.__order[node]
-            self.__counts = self.__counts[0:order+1]
+            del self.__counts[order+1:]
             self.__counts[order] += 1
         return self.__counts[order]
     
     def drop(self, node):
-        self.__counts = self.__counts[0:self.__order[node]]
+        self.__copy_on_write()
+        del self.__counts[self.__order[node]:]
         del self.__order[node]
         
     def clone(self):
-        return Loops(list(self.__counts), dict(self.__order))
+        if not self.__counts and not self.__order:
+            return Loops()
+        self.__shared = True
+        return Loops(self.__counts, self.__order)
     
     def __eq__(self, other):
         return self.__counts == other.__counts and self.__order == other.__order
@@ -91,7 +118,15 @@ class Loops(object):
                       reduce(xor, [hash(node) ^ hash(self.__order[node])
                                    for node in self.__order], 0)
 
+
 class Groups(object):
+    '''
+    The groups matched (and pending).  As for `Loops`, cloning is O(1) and
+    the underlying maps are copied only when a shared instance is modified.
+    '''
+    
+    # the number of copies made on write (for benchmarks)
+    copies = 0
     
     def __init__(self, group_state=None, text=None, 
                  groups=None, offsets=None, lastindex=None):
@@ -112,16 +147,26 @@ class Groups(object):
         self.__lastindex = lastindex
         # cache for str
         self.__str = None
+        # are groups and offsets shared with another instance?
+        self.__shared = bool(groups or offsets)
+        
+    def __copy_on_write(self):
+        self.__str = None
+        if self.__shared:
+            Groups.copies += 1
+            self.__groups = dict(self.__groups)
+            self.__offsets = dict(self.__offsets)
+            self.__shared = False
         
     def start_group(self, number, offset):
         assert isinstance(number, int)
-        self.__str = None
+        self.__copy_on_write()
         self.__offsets[number] = offset
         
     def end_group(self, number, offset):
         assert isinstance(number, int)
         assert number in self.__offsets, 'Unopened group: ' + str(number) 
-        self.__str = None
+        self.__copy_on_write()
         self.__groups[number] = (self.__text[self.__offsets[number]:offset],
                                  self.__offsets[number], offset)
         del self.__offsets[number]
@@ -167,9 +212,12 @@ class Groups(object):
         return self.__str
     
     def clone(self):
-        return Groups(group_state=self.__state, text=self.__text, 
-                      groups=dict(self.__groups),  offsets=dict(self.__offsets), 
-                      lastindex=self.__lastindex)
+        self.__shared = True
+        groups = Groups(group_state=self.__state, text=self.__text, 
+                        groups=self.__groups, offsets=self.__offsets, 
+                        lastindex=self.__lastindex)
+        groups.__str = self.__str
+        return groups
     
     def data(self, number):
         if number in self.__state.names:
@@ -211,17 +259,496 @@ class Groups(object):
         return self.__groups
 
 
+# map from lookahead contents to (reads, mutates, size), where size is
+# calculated without groups
+_LOOKAHEADS = WeakKeyDictionary()
+
+
 def lookahead_logic(branch, forwards, groups):
     '''
     Encapsulate common logic for calculating lookback logic.  This doesn't
     really fit on the opcode, but is common to several engines.
+    
+    The graph is only searched once for each branch, so this is cheap when
+    called at each offset.  The size is recalculated only when it depends
+    on groups.
     '''
-    reads = contains_instance(branch, ReadsGroup)
-    mutates = contains_instance(branch, StartGroup)
+    if branch not in _LOOKAHEADS:
+        reads = contains_instance(branch, ReadsGroup)
+        mutates = contains_instance(branch, StartGroup)
+        # only nodes that read groups need them for the length
+        size = None if reads else branch.length(None)
+        _LOOKAHEADS[branch] = (reads, mutates, size)
+    (reads, mutates, size) = _LOOKAHEADS[branch]
     # use groups to calculate size if they are unchanged in lookback
     if forwards or (reads and mutates):
         size = None
-    else:
+    elif reads:
         size = branch.length(groups)
     return (reads, mutates, size)
 
+
+# map from lookback contents to the reversed graph (or None)
+_REVERSED = WeakKeyDictionary()
+
+
+def reversed_lookback(graph):
+    '''
+    The (cached) reversed graph for the contents of a lookback, or None (see
+    `reverse_lookback()`).  This is matched, from the start, against a 
+    `Reversed` view of the text.
+    '''
+    if graph not in _REVERSED:
+        _REVERSED[graph] = reverse_lookback(graph)
+    return _REVERSED[graph]
+    
+
+class Reversed(object):
+    '''
+    The text before `offset`, reversed, without copying.  
+    '''
+    
+    def __init__(self, text, offset):
+        if offset < 0:
+            raise ValueError('Negative offset: ' + str(offset))
+        self.__text = text
+        self.__offset = offset
+        
+    def __len__(self):
+        return self.__offset
+    
+    def __getitem__(self, index):
+        offset = self.__offset
+        if isinstance(index, slice):
+            (begin, end, step) = index.indices(offset)
+            assert step == 1
+            if begin >= end:
+                return self.__text[0:0]
+            return self.__text[offset-end:offset-begin][::-1]
+        else:
+            if index < 0:
+                index += offset
+            if index < 0 or index >= offset:
+                raise IndexError(index)
+            return self.__text[offset-1-index]
+        
+
+class FirstCharacters(object):
+    '''
+    The characters that can start a match, used to skip directly to 
+    possible start positions when searching.
+    
+    Use `for_graph()`, which returns `None` when no useful set is known 
+    (for example, if the pattern can match the empty string, or starts 
+    with `.` or a class like `\\w`).
+    '''
+    
+    # character ranges larger than this are not expanded
+    LIMIT = 256
+    
+    # the number of characters after a start that `find()` may read
+    overlap = 0
+    
+    # map from graph to instance (or None)
+    __cache = WeakKeyDictionary()
+    
+    def __init__(self, characters):
+        self.characters = frozenset(characters)
+        self.__single = \
+            list(self.characters)[0] if len(self.characters) == 1 else None
+        
+    def __contains__(self, character):
+        return character in self.characters
+        
+    def find(self, text, offset, end=None):
+        '''
+        The first offset (from `offset`, before `end`) at which a match 
+        could start, or -1.
+        '''
+        if isinstance(text, (Window, Buffer)):
+            return text.find_first(self, offset, end)
+        if end is None:
+            end = len(text)
+        single = self.__single
+        if single is not None and type(single) is type(text):
+            return text.find(single, offset, end)
+        characters = self.characters
+        while offset < end:
+            if text[offset] in characters:
+                return offset
+            offset += 1
+        return -1
+    
+    @staticmethod
+    def for_graph(graph):
+        '''
+        The (cached) instance for the given graph, or `None`.
+        '''
+        cache = FirstCharacters.__cache
+        if graph not in cache:
+            characters = first_characters(graph, FirstCharacters.LIMIT)
+            cache[graph] = \
+                None if characters is None else FirstCharacters(characters)
+        return cache[graph]
+    
+
+class LiteralPrefix(FirstCharacters):
+    '''
+    Skip to possible start positions for graphs that begin with a literal
+    string, found directly with `find()`.
+    
+    Use `for_graph()`, which falls back to `FirstCharacters.for_graph()`
+    when there is no literal prefix.
+    '''
+    
+    # map from graph to instance (or None)
+    __cache = WeakKeyDictionary()
+    
+    def __init__(self, prefix):
+        super(LiteralPrefix, self).__init__(prefix[0])
+        self.prefix = prefix
+        self.overlap = len(prefix) - 1
+        # the prefix for each string type (it may only be possible to 
+        # convert to one of them)
+        self.__prefixes = {}
+        for type_ in (str, unicode):
+            try:
+                self.__prefixes[type_] = type_(prefix)
+            except UnicodeError:
+                pass
+    
+    def find(self, text, offset, end=None):
+        '''
+        The first offset (from `offset`, before `end`) at which the prefix 
+        occurs, or -1.
+        '''
+        prefix = self.__prefixes.get(type(text))
+        if prefix is None:
+            return super(LiteralPrefix, self).find(text, offset, end)
+        if end is None:
+            end = len(text)
+        return text.find(prefix, offset, end + self.overlap)
+    
+    @staticmethod
+    def for_graph(graph):
+        '''
+        The (cached) instance for the given graph, a `FirstCharacters`, 
+        or `None`.
+        '''
+        cache = LiteralPrefix.__cache
+        if graph not in cache:
+            prefix = literal_prefix(graph)
+            cache[graph] = FirstCharacters.for_graph(graph) \
+                if prefix is None else LiteralPrefix(prefix)
+        return cache[graph]
+        
+        
+class CharacterClasses(object):
+    '''
+    A partition of the alphabet into classes of characters that no node in
+    a graph can tell apart (the "bytemap" of RE2), so that engines can key 
+    work by class rather than by character.
+    
+    Characters with codes below 256 are classified by `table`, a 256-entry
+    `bytearray` of class ids.  Larger codes (Unicode) are found in a range
+    table: `starts` is the sorted list of the first code in each range and
+    `ranges` the class id for each.  Where a range is split by a test that
+    is not described by intervals (like `\\w` for Unicode) its entry is 
+    `None` and each character is classified separately (and cached).
+    
+    Use `for_graph()`, and `classify()` to find the class of a character.
+    '''
+    
+    # the number of codes in the table
+    TABLE_SIZE = 256
+    
+    # map from graph to instance
+    __cache = WeakKeyDictionary()
+    
+    def __init__(self, alphabet, graph):
+        self.__alphabet = alphabet
+        # the type of characters in the alphabet (others are not classified)
+        self.__type = type(alphabet.code_to_char(0))
+        self.__tests = self.__find_tests(alphabet, graph)
+        # map from signature to class id
+        self.__ids = {}
+        # map from character to class id (for ranges that are split)
+        self.__memo = {}
+        self.table = bytearray(self.__id(alphabet.code_to_char(code)) 
+                               for code in range(self.TABLE_SIZE))
+        (self.starts, self.ranges) = self.__range_table(alphabet, graph)
+        
+    @staticmethod
+    def for_graph(parser_state, graph):
+        '''
+        The (cached) instance for the given graph.
+        '''
+        cache = CharacterClasses.__cache
+        if graph not in cache:
+            cache[graph] = CharacterClasses(parser_state.alphabet, graph)
+        return cache[graph]
+    
+    @property
+    def count(self):
+        '''
+        The number of classes found so far.
+        '''
+        return len(self.__ids)
+    
+    def classify(self, character):
+        '''
+        The class id for the character, or `None` if it is outside the 
+        alphabet.
+        '''
+        if type(character) is not self.__type:
+            return None
+        code = self.__alphabet.char_to_code(character)
+        if code < self.TABLE_SIZE:
+            return self.table[code]
+        index = bisect_right(self.starts, code) - 1
+        if index < 0:
+            return None
+        id_ = self.ranges[index]
+        if id_ is None:
+            if character not in self.__memo:
+                self.__memo[character] = self.__id(character)
+            id_ = self.__memo[character]
+        return id_
+    
+    def __id(self, character):
+        '''
+        The id for the class of the character (new ids are numbered in 
+        order, so the first 256 fit in the table).
+        '''
+        signature = tuple(test(character) for test in self.__tests)
+        if signature not in self.__ids:
+            self.__ids[signature] = len(self.__ids)
+        return self.__ids[signature]
+    
+    @staticmethod
+    def __find_tests(alphabet, graph):
+        '''
+        The tests that distinguish characters.  Literal characters (and
+        the newline) are identified by a single test.
+        '''
+        literals = set(['\n'])
+        characters = {}
+        classes = set()
+        context = False
+        for node in node_iterator(graph):
+            if isinstance(node, String):
+                literals.update(node.text)
+            elif isinstance(node, Character):
+                characters[str(node)] = node
+            elif isinstance(node, Digit):
+                classes.add(alphabet.digit)
+            elif isinstance(node, Space):
+                classes.add(alphabet.space)
+            elif isinstance(node, Word):
+                classes.add(alphabet.word)
+            elif isinstance(node, (StartOfLine, EndOfLine, WordBoundary)):
+                context = True
+        if context:
+            classes.add(alphabet.word)
+        tests = [lambda character: 
+                    character if character in literals else None]
+        # (the clones avoid a reference to the graph)
+        tests.extend(node.clone().__contains__ 
+                     for node in characters.values())
+        tests.extend(lambda character, class_=class_: bool(class_(character))
+                     for class_ in classes)
+        return tests
+    
+    def __range_table(self, alphabet, graph):
+        '''
+        The starts and class ids of the ranges above the table.
+        '''
+        low = self.TABLE_SIZE
+        if alphabet.max < low:
+            return ([], [])
+        boundaries = set([low])
+        split = False
+        for node in node_iterator(graph):
+            if isinstance(node, String):
+                for character in node.text:
+                    code = alphabet.char_to_code(character)
+                    boundaries.update([code, code + 1])
+            elif isinstance(node, Character):
+                for (a, b) in node.intervals:
+                    boundaries.update([alphabet.char_to_code(a), 
+                                       alphabet.char_to_code(b) + 1])
+                split = split or bool(node.classes)
+            elif isinstance(node, (Digit, Space, Word, WordBoundary,
+                                   StartOfLine, EndOfLine)):
+                split = True
+        starts = sorted(code for code in boundaries 
+                        if low <= code <= alphabet.max)
+        ranges = [None if split 
+                  else self.__id(alphabet.code_to_char(start))
+                  for start in starts]
+        return (starts, ranges)
+        
+        
+class Window(object):
+    '''
+    Text read from a stream, indexed (and sliced) by absolute offset.  
+    Earlier text can be discarded with `trim()`, after which it must not be
+    accessed.
+    '''
+    
+    def __init__(self, text):
+        self.__text = text
+        self.__start = 0
+        
+    def append(self, text):
+        self.__text += text
+        
+    def trim(self, offset):
+        '''
+        Discard text before `offset`.
+        '''
+        if offset > self.__start:
+            self.__text = self.__text[offset - self.__start:]
+            self.__start = offset
+            
+    @property
+    def start(self):
+        return self.__start
+    
+    def __len__(self):
+        return self.__start + len(self.__text)
+    
+    def __getitem__(self, index):
+        start = self.__start
+        if isinstance(index, slice):
+            assert index.step is None
+            begin = start if index.start is None else index.start
+            end = len(self) if index.stop is None else index.stop
+            assert begin >= start, 'Discarded text'
+            return self.__text[begin - start:max(begin, end) - start]
+        else:
+            assert index >= start, 'Discarded text'
+            return self.__text[index - start]
+        
+    def find_first(self, first, offset, end=None):
+        '''
+        `FirstCharacters.find()` for the underlying text.
+        '''
+        start = self.__start
+        end = None if end is None else end - start
+        found = first.find(self.__text, offset - start, end)
+        return found if found < 0 else found + start
+
+
+# types that can be wrapped by Buffer
+BUFFERS = (mmap, memoryview, bytearray)
+
+
+class Buffer(object):
+    '''
+    Bytes from a `mmap`, `memoryview` or `bytearray`, presented as a string
+    of length `end` without copying.  Characters and slices are (byte) 
+    strings, so the engines work unchanged with the ASCII alphabet; only 
+    the text that is accessed is copied.
+    '''
+    
+    # the amount of text copied at a time when searching
+    CHUNK = 1 << 16
+    
+    def __init__(self, source, end=None):
+        if not isinstance(source, mmap):
+            source = memoryview(source)
+        self.__source = source
+        self.__copy = isinstance(source, memoryview)
+        self.__end = len(source) if end is None else min(end, len(source))
+        
+    def __len__(self):
+        return self.__end
+    
+    def __getitem__(self, index):
+        end = self.__end
+        if isinstance(index, slice):
+            (begin, stop, step) = index.indices(end)
+            assert step == 1
+            text = self.__source[begin:max(begin, stop)]
+            return text.tobytes() if self.__copy else text
+        else:
+            if index < 0:
+                index += end
+            if index < 0 or index >= end:
+                raise IndexError(index)
+            return self.__source[index]
+        
+    def find_first(self, first, offset, end=None):
+        '''
+        `FirstCharacters.find()`, copying a chunk of text at a time.
+        '''
+        end = self.__end if end is None else min(end, self.__end)
+        while offset < end:
+            # chunks overlap so that a prefix is not split
+            stop = min(offset + self.CHUNK, end)
+            chunk = self[offset:stop + first.overlap]
+            found = first.find(chunk, 0, stop - offset)
+            if found > -1:
+                return offset + found
+            offset = stop
+        return -1
+    
+
+def literal_prefix(graph):
+    '''
+    The text of a `String` that starts every match (after any group starts),
+    or `None`.
+    '''
+    node = graph
+    while isinstance(node, StartGroup):
+        node = node.next[0]
+    if isinstance(node, String) and isinstance(node.text, basestring) \
+            and node.text:
+        return node.text
+    else:
+        return None
+
+
+def first_characters(graph, limit):
+    '''
+    Walk the graph from the entry node to find the characters that can be
+    consumed first.  Returns a set, or `None` if unknown (or larger than 
+    `limit` for a single character range).
+    
+    Nodes that do not consume (groups, splits, lookaheads, assertions) are
+    followed.  Reaching the final `Match` means that an empty match is 
+    possible, so any position may match.  The `Match` that ends the 
+    contents of an atomic group continues after the group.
+    '''
+    characters = set()
+    # pairs of (node, exit), where exit is the pair to continue with when
+    # an atomic group ends (or None for the final match)
+    stack = [(graph, None)]
+    known = set()
+    while stack:
+        pair = stack.pop()
+        if pair in known:
+            continue
+        known.add(pair)
+        (node, exit) = pair
+        if isinstance(node, String):
+            characters.add(node.text[0])
+        elif isinstance(node, Character):
+            chars = node.characters(limit)
+            if chars is None:
+                return None
+            characters.update(chars)
+        elif isinstance(node, MatchNode):
+            if exit is None:
+                return None
+            stack.append(exit)
+        elif isinstance(node, (Dot, Digit, Space, Word, GroupReference)):
+            return None
+        elif isinstance(node, Lookahead):
+            stack.append((node.next[0], exit))
+        elif isinstance(node, Atomic):
+            stack.append((node.next[1], (node.next[0], exit)))
+        elif not isinstance(node, NoMatch):
+            stack.extend((next, exit) for next in node.next)
+    return characters
@@ -92,6 +92,9 @@ class BaseCompiled(object):
     def lookahead(self, equal, forwards):
         raise UnsupportedOperation('lookahead')
 
+    def atomic(self, next):
+        raise UnsupportedOperation('atomic')
+
     def repeat(self, begin, end, lazy):
         raise UnsupportedOperation('repeat')
     
@@ -28,7 +28,8 @@
 # MPL or the LGPL License.                                              
 
 from rxpy.graph.base import AutoClone
-from rxpy.graph.opcode import Split, Checkpoint, NoMatch, Repeat, String
+from rxpy.graph.opcode import Split, Checkpoint, NoMatch, Repeat, String, \
+    Atomic, Match
 from rxpy.lib import unimplemented, _CHARS
 from rxpy.parser.support import ParserState
 
@@ -181,6 +182,20 @@ class CountedLoop(LazyMixin, Sequence):
             return super(CountedLoop, self).consumer(lenient)
 
 
+class AtomicGroup(Sequence):
+    '''
+    The contents of an atomic group (or possessive repeat), which join to
+    an `Atomic` node.  This is a container (rather than the node being 
+    created directly by the parser) so that it can be cloned when loops
+    are unrolled.
+    '''
+    
+    def join(self, final, state):
+        atomic = Atomic()
+        atomic.next = [final, super(AtomicGroup, self).join(Match(), state)]
+        return atomic
+
+
 class Alternatives(LabelMixin, BaseCollection):
     
     def __init__(self, contents=None, label='...|...', split=Split):
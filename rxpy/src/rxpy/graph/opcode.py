@@ -324,6 +324,44 @@ class Lookahead(BaseNode, BranchCompiled):
         return visitor.lookahead(self.next, self, self.equal, self.forwards, state)
 
 
+class Atomic(BaseNode, BranchCompiled):
+    '''
+    An atomic group (or possessive repeat).  The contents are matched once,
+    with the first (highest priority) match only; alternatives within the 
+    group are not retried if the continuation fails.
+
+    - `next` contains two values.  `next[1]` is the group contents (which
+      end in a `Match`); `next[0]` is the continuation of the normal match 
+      (from the end of the group) on success.
+
+    Engines that backtrack discard any choices made inside the group; 
+    parallel engines keep only the first thread to match the contents.
+    '''
+
+    def __init__(self):
+        super(Atomic, self).__init__(consumes=None, size=None)
+
+    def __str__(self):
+        return '(?>...)'
+
+    def length(self, groups, known=None):
+        if known is None:
+            known = set()
+        if self not in known:
+            known.add(self)
+            inner = self.next[1].length(groups, known)
+            if inner is not None:
+                outer = self.next[0].length(groups, known)
+                if outer is not None:
+                    return inner + outer
+
+    def visit(self, visitor, state=None):
+        return visitor.atomic(self.next, self, state)
+
+    def _compile_args(self):
+        return []
+
+
 class Repeat(BaseNode, BranchCompiled):
     '''
     A numerical repeat.
@@ -361,7 +399,9 @@ class Repeat(BaseNode, BranchCompiled):
             known = set()
         if self.end == self.begin and self not in known:
             known.add(self)
-            return self.begin * self.next[1].length(groups, known)
+            inner = self.next[1].length(groups, known)
+            if inner is not None:
+                return self.begin * inner
 
     def visit(self, visitor, state=None):
         return visitor.repeat(self.next, self, self.begin, self.end, self.lazy,
@@ -508,6 +548,13 @@ class Character(BaseNode, DirectCompiled):
     def _compile_args(self):
         return [self]
 
+    @property
+    def intervals(self):
+        '''
+        The simple character ranges, as pairs of characters.
+        '''
+        return self.__simple.intervals
+
     def append_interval(self, interval):
         self.__simple.append(interval, self.alphabet)
 
@@ -525,6 +572,21 @@ class Character(BaseNode, DirectCompiled):
     def invert(self):
         self.inverted = not self.inverted
 
+    def characters(self, limit):
+        '''
+        A list of the characters matched, or `None` if they cannot be listed
+        (because classes are used or the set is inverted) or if there are
+        more than `limit`.
+        '''
+        if self.complete or self.classes or self.inverted:
+            return None
+        codes = [(self.alphabet.char_to_code(a), self.alphabet.char_to_code(b))
+                 for (a, b) in self.__simple.intervals]
+        if sum(b - a + 1 for (a, b) in codes) > limit:
+            return None
+        return [self.alphabet.code_to_char(code) 
+                for (a, b) in codes for code in range(a, b + 1)]
+
     def __contains__(self, character):
         result = self.complete
         if not result:
@@ -30,6 +30,7 @@
 
 from bisect import bisect_left
 from collections import deque
+from copy import copy
 
 
 class GraphException(Exception):
@@ -78,6 +79,204 @@ def contains_instance(graph, type_):
     return False
         
 
+def back_edges(graph):
+    '''
+    The edges (as ordered node pairs) that close a loop in a DFS from the
+    given node.  Each loop in the graph has (at least) one.
+    '''
+    edges = []
+    stack = [(graph, iter(graph.next))]
+    active = set([graph])
+    visited = set([graph])
+    while stack:
+        (node, nexts) = stack[-1]
+        for next in nexts:
+            if next in active:
+                edges.append((node, next))
+            elif next not in visited:
+                visited.add(next)
+                active.add(next)
+                stack.append((next, iter(next.next)))
+                break
+        else:
+            stack.pop()
+            active.discard(node)
+    return edges
+
+
+def nested_loops(graph):
+    '''
+    Does the graph contain a loop inside another loop (eg. `(a+)*`)?  These
+    can be ambiguous, with many ways of matching the same text.
+    
+    The body of the loop closed by a back edge is the head plus all nodes
+    that reach the tail without passing through the head.  A loop is nested
+    if its body lies within the body of another (alternatives that share a
+    head, like `(ab|cd)*`, are not nested).
+    '''
+    edges = back_edges(graph)
+    if len(edges) < 2:
+        return False
+    previous = {}
+    for (node, next) in edge_iterator(graph):
+        previous.setdefault(next, []).append(node)
+    bodies = []
+    for (tail, head) in edges:
+        body = set([head, tail])
+        stack = [tail]
+        while stack:
+            for node in previous.get(stack.pop(), []):
+                if node not in body:
+                    body.add(node)
+                    stack.append(node)
+        bodies.append(body)
+    for (i, inner) in enumerate(bodies):
+        for (j, outer) in enumerate(bodies):
+            if i != j and inner <= outer:
+                return True
+    return False
+
+
+def matches_newline(graph):
+    '''
+    Can the graph consume a newline?  This is conservative: it is False only
+    if every node that consumes text excludes `\\n` (so matches cannot span
+    lines).
+    '''
+    from rxpy.graph.opcode import String, Dot, Character, Digit, Word, Space
+    for node in node_iterator(graph):
+        if isinstance(node, String):
+            if '\n' in node.text:
+                return True
+        elif isinstance(node, Dot):
+            if node.multiline:
+                return True
+        elif isinstance(node, Character):
+            if '\n' in node:
+                return True
+        elif isinstance(node, (Digit, Word)):
+            if node.inverted:
+                return True
+        elif isinstance(node, Space):
+            if not node.inverted:
+                return True
+    return False
+
+
+def required_strings(graph):
+    '''
+    Literal text that every match must contain (like the "must" analysis in
+    GNU grep), longest first.  These are the `String` nodes that lie on 
+    every path from the start of the graph to the final `Match`.  The 
+    contents of lookaheads are not followed, since they are not part of the
+    match.
+    '''
+    from rxpy.graph.opcode import String, Lookahead, Atomic, \
+        Match as MatchNode
+    
+    def walk(excluded):
+        '''
+        The strings reached without passing `excluded`, and whether the 
+        final match was reached.
+        '''
+        strings = set()
+        # pairs of (node, exit), where exit is the pair to continue with 
+        # when an atomic group ends (or None for the final match)
+        stack = [(graph, None)]
+        known = set()
+        while stack:
+            pair = stack.pop()
+            (node, exit) = pair
+            if pair in known or node is excluded:
+                continue
+            known.add(pair)
+            if isinstance(node, String):
+                strings.add(node)
+            if isinstance(node, MatchNode):
+                if exit is None:
+                    return (strings, True)
+                stack.append(exit)
+            elif isinstance(node, Lookahead):
+                stack.append((node.next[0], exit))
+            elif isinstance(node, Atomic):
+                stack.append((node.next[1], (node.next[0], exit)))
+            else:
+                stack.extend((next, exit) for next in node.next)
+        return (strings, False)
+    
+    required = set()
+    for node in walk(None)[0]:
+        if isinstance(node.text, basestring) and node.text \
+                and not walk(node)[1]:
+            required.add(node.text)
+    return sorted(required, key=len, reverse=True)
+
+
+def reverse_lookback(graph):
+    '''
+    A graph that matches the reversed text for the contents of a lookback 
+    (which end with a `$` added by the parser), or None if the graph cannot
+    be reversed.
+    
+    Every edge is reversed, so each node is followed by the copies of its
+    predecessors (via a new `Split` if there is more than one).  A `Repeat`
+    is followed by its predecessors outside the loop, then those inside.
+    Only nodes that consume characters or strings, plus splits, repeats and
+    checkpoints, are supported; the priority of alternatives is lost, so 
+    the result can be used only to test whether the lookback matches.
+    '''
+    from rxpy.graph.opcode import String, Character, Dot, Digit, Space, \
+        Word, Split, Repeat, Checkpoint, EndOfLine, Match
+    previous = {}
+    for (node, next) in edge_iterator(graph):
+        previous.setdefault(next, []).append(node)
+    # the $ before the final Match is the start of the reversed graph
+    end = None
+    for node in node_iterator(graph):
+        if isinstance(node, EndOfLine) and not node.multiline and \
+                isinstance(node.next[0], Match) and end is None:
+            end = node
+        elif not isinstance(node, (String, Character, Dot, Digit, Space, 
+                                   Word, Split, Repeat, Checkpoint, Match)):
+            return None
+    if end is None:
+        return None
+    copies = {}
+    for node in node_iterator(graph):
+        if isinstance(node, String):
+            copies[node] = String(node.text[::-1])
+        elif isinstance(node, Split):
+            copies[node] = Split('|', consumes=None)
+        elif not isinstance(node, (Match, EndOfLine)):
+            copies[node] = copy(node)
+    final = Match()
+    def join(nodes, first):
+        nexts = [final] if first else []
+        nexts.extend(copies[node] for node in nodes)
+        if len(nexts) == 1:
+            return nexts[0]
+        else:
+            split = Split('|', consumes=None)
+            split.next = nexts
+            return split
+    for node in copies:
+        nodes = previous.get(node, [])
+        if isinstance(node, Repeat):
+            body = set()
+            stack = [node.next[1]]
+            while stack:
+                next = stack.pop()
+                if next is not node and next not in body:
+                    body.add(next)
+                    stack.extend(next.next)
+            copies[node].next = \
+                [join([n for n in nodes if n not in body], node is graph),
+                 join([n for n in nodes if n in body], False)]
+        else:
+            copies[node].next = [join(nodes, node is graph)]
+    return join(previous.get(end, []), end is graph)
+        
+
 class ReadsGroup(object):
     '''
     Used to identify opcodes that require groups.
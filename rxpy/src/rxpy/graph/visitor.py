@@ -72,6 +72,9 @@ class BaseVisitor(object):
     def lookahead(self, next, node, equal, forwards, state=None):
         raise UnsupportedOperation('lookahead')
 
+    def atomic(self, next, node, state=None):
+        raise UnsupportedOperation('atomic')
+
     def repeat(self, next, node, begin, end, lazy, state=None):
         raise UnsupportedOperation('repeat')
     
@@ -28,6 +28,8 @@
 # MPL or the LGPL License.                                              
 
 
+from time import time
+
 
 class UnsupportedOperation(Exception):
     '''
@@ -53,6 +55,75 @@ class RxpyException(Exception):
     '''
     
     
+class BudgetException(RxpyException):
+    '''
+    Raised when an engine exhausts the `Budget` given for a run.
+    
+    `ticks` is the work done and `offset` the position reached in the text.
+    '''
+    
+    def __init__(self, ticks, offset):
+        super(BudgetException, self).__init__(
+            'Budget exhausted after {0} ticks at offset {1}'.format(
+                ticks, offset))
+        self.ticks = ticks
+        self.offset = offset
+        
+    def __reduce__(self):
+        # by default, unpickling would pass only the message to __init__
+        return (BudgetException, (self.ticks, self.offset))
+        
+        
+class Budget(object):
+    '''
+    Limits on the work done by an engine in a single run (a single match or
+    search; `finditer`, `sub` etc make a new run for each match).
+    
+    `ticks` - the maximum number of ticks (the unit of work counted by the
+    engines, roughly one per opcode evaluated).
+    
+    `deadline` - a time (as returned by `time.time()`) after which the 
+    engine should stop.  Since this is absolute it also limits the total 
+    time for `finditer`, `sub` etc.  The clock is only read every `interval` 
+    ticks.
+    '''
+    
+    def __init__(self, ticks=None, deadline=None, interval=1000):
+        self.ticks = ticks
+        self.deadline = deadline
+        self.interval = interval
+        
+    def check(self, ticks, offset):
+        '''
+        Raise `BudgetException` if the budget is exhausted.  Otherwise, 
+        return the number of ticks at which this should be called again.
+        
+        Engines call this before starting (with zero ticks) and then 
+        whenever the ticks reach the value returned.
+        '''
+        if (self.ticks is not None and ticks > self.ticks) or \
+                (self.deadline is not None and time() > self.deadline):
+            raise BudgetException(ticks, offset)
+        limit = UNLIMITED
+        if self.ticks is not None:
+            limit = self.ticks + 1
+        if self.deadline is not None:
+            limit = min(limit, ticks + self.interval)
+        return limit
+    
+    @staticmethod
+    def limit(budget, ticks, offset):
+        '''
+        As `check()`, but also accepts `None` (no budget).
+        '''
+        return UNLIMITED if budget is None else budget.check(ticks, offset)
+    
+    
+# a tick count that is never reached
+UNLIMITED = float('inf')
+
+    
+    
 (I, M, S, U, X, A, _L, _C, _E, _U, _G) = map(lambda x: 2**x, range(11))
 (IGNORECASE, MULTILINE, DOTALL, UNICODE, VERBOSE, ASCII, _LOOP_UNROLL, _CHARS, _EMPTY, _UNSAFE, _GROUPS) = (I, M, S, U, X, A, _L, _C, _E, _U, _G)
 _FLAGS = (I, M, S, U, X, A, _L, _C, _E, _U, _G, IGNORECASE, MULTILINE, DOTALL, UNICODE, VERBOSE, ASCII, _LOOP_UNROLL, _CHARS, _EMPTY, _UNSAFE, _GROUPS)
@@ -660,6 +660,42 @@ r"""digraph {
  2 -> 6
 }""")
         
+    def test_atomic(self):
+        self.assert_graphs(parse('a(?>b+)c'),
+"""digraph {
+ 0 [label="a"]
+ 1 [label="(?>...)"]
+ 2 [label="c"]
+ 3 [label="b"]
+ 4 [label="...+"]
+ 5 [label="Match"]
+ 6 [label="Match"]
+ 0 -> 1
+ 1 -> 2
+ 1 -> 3
+ 3 -> 4
+ 4 -> 3
+ 4 -> 5
+ 2 -> 6
+}""")
+        
+    def test_possessive(self):
+        self.assert_graphs(parse('a*+b'),
+"""digraph {
+ 0 [label="(?>...)"]
+ 1 [label="b"]
+ 2 [label="...*"]
+ 3 [label="a"]
+ 4 [label="Match"]
+ 5 [label="Match"]
+ 0 -> 1
+ 0 -> 2
+ 2 -> 3
+ 2 -> 4
+ 3 -> 2
+ 1 -> 5
+}""")
+        
     def test_lookback(self):
         self.assert_graphs(parse('a(?<=b+)c'),
 """digraph {
@@ -42,7 +42,7 @@ from itertools import count
 from string import digits, ascii_letters
 
 from rxpy.graph.container import Sequence, Alternatives, Loop, Optional,\
-    CountedLoop
+    CountedLoop, AtomicGroup
 from rxpy.graph.opcode import Match, Character, String, StartOfLine,\
     EndOfLine, Dot, StartGroup, EndGroup, Conditional, WordBoundary, \
     Digit, Word, Space, Lookahead, GroupReference
@@ -140,7 +140,8 @@ class SequenceBuilder(Builder):
     
 class RepeatBuilder(Builder):
     '''
-    Parse simple repetition expressions (*, + and ?).
+    Parse simple repetition expressions (*, + and ?), including lazy (*? 
+    etc) and possessive (*+ etc) forms.
     '''
     
     def __init__(self, state, parent, latest, character):
@@ -152,8 +153,10 @@ class RepeatBuilder(Builder):
     def append_character(self, character):
         
         lazy = character == '?'
+        possessive = character == '+'
+        start = len(self._parent._sequence.contents)
         
-        if character and character in '+*':
+        if character == '*':
             raise RxpyException('Compound repeat: ' + 
                                  self._initial_character + character)
         elif self._initial_character == '?':
@@ -166,7 +169,9 @@ class RepeatBuilder(Builder):
         else:
             raise RxpyException('Bad initial character for RepeatBuilder')
             
-        if lazy:
+        if possessive:
+            self.build_atomic(self._parent, start)
+        if lazy or possessive:
             return self._parent
         else:
             return self._parent.append_character(character)
@@ -176,6 +181,17 @@ class RepeatBuilder(Builder):
         if not latest.consumer(True) and not (state.flags & ParserState._EMPTY):
             raise EmptyException
         
+    @staticmethod
+    def build_atomic(parent, start):
+        '''
+        Make the nodes added to the parent since `start` atomic (used for 
+        possessive repeats).
+        '''
+        contents = parent._sequence.contents
+        atomic = AtomicGroup(contents[start:])
+        del contents[start:]
+        parent._sequence.append(atomic)
+        
     @staticmethod
     def build_optional(parent, latest, lazy):
         optional = Optional([latest], lazy=lazy, 
@@ -231,6 +247,8 @@ class GroupEscapeBuilder(Builder):
             elif character == '!':
                 return LookaheadBuilder(
                             self._state, self._parent, False, True)
+            elif character == '>':
+                return AtomicGroupBuilder(self._state, self._parent)
             elif character == '<':
                 return LookbackBuilder(self._state, self._parent)
             elif character == '(':
@@ -368,13 +386,25 @@ class LookaheadBuilder(BaseGroupBuilder):
         
     def _build_group(self):
         lookahead = Lookahead(self._equal, self._forwards)
+        sequence = self.to_sequence()
         if not self._forwards:
-            self._sequence.append(EndOfLine(False))
-        lookahead.next = [self.to_sequence().join(Match(), self._state)]
+            # after all alternatives
+            sequence = Sequence([sequence, EndOfLine(False)])
+        lookahead.next = [sequence.join(Match(), self._state)]
         self._parent._sequence.append(lookahead)
         return self._parent
         
 
+class AtomicGroupBuilder(BaseGroupBuilder):
+    '''
+    Parse atomic groups - expressions of the form (?>...).
+    '''
+    
+    def _build_group(self):
+        self._parent._sequence.append(AtomicGroup([self.to_sequence()]))
+        return self._parent
+        
+
 class ConditionalBuilder(Builder):
     '''
     Parse (?(id/name)yes-pattern|no-pattern) expressions.  Either 
@@ -769,7 +799,8 @@ class GroupReferenceBuilder(Builder):
 
 class CountBuilder(Builder):
     '''
-    Parse explicit counted repeats - expressions of the form ...{n,m}.
+    Parse explicit counted repeats - expressions of the form ...{n,m}
+    (optionally followed by ? for lazy or + for possessive matching).
     If the `_LOOP_UNROLL` flag is set then this expands the expression 
     as an explicit series of repetitions, so 'a{2,4}' would become
     equivalent to 'aaa?a?'
@@ -784,13 +815,17 @@ class CountBuilder(Builder):
         self._range = False
         self._closed = False
         self._lazy = False
+        self._possessive = False
         
     def append_character(self, character):
         
         if self._closed:
-            if not self._lazy and character == '?':
+            if not (self._lazy or self._possessive) and character == '?':
                 self._lazy = True
                 return self
+            elif not (self._lazy or self._possessive) and character == '+':
+                self._possessive = True
+                return self
             else:
                 self.__build()
                 return self._parent.append_character(character)
@@ -839,6 +874,7 @@ class CountBuilder(Builder):
         if not self._parent._sequence:
             raise RxpyException('Nothing to repeat')
         latest = self._parent._sequence.pop()
+        start = len(self._parent._sequence.contents)
         if (self._state.flags & ParserState._LOOP_UNROLL) and (
                 (self._end is None and self._state.unwind(self._begin)) or
                 (self._end is not None and self._state.unwind(self._end))):
@@ -857,6 +893,8 @@ class CountBuilder(Builder):
             self.build_count(self._parent, latest, self._begin, 
                              self._end if self._range else self._begin, 
                              self._lazy, self._state)
+        if self._possessive:
+            RepeatBuilder.build_atomic(self._parent, start)
     
     @staticmethod
     def build_count(parent, latest, begin, end, lazy, state):
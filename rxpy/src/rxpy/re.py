@@ -28,17 +28,22 @@
 # MPL or the LGPL License.                                              
 
 '''
-A replacement for the Python re module, using the simple engine.
-Eventually much of this will do something smart to choose an appropriate
-engine.
+A replacement for the Python re module.  The engine is chosen for each 
+pattern by `Selector` (see `rxpy.engine.selector`); the choice (and the 
+reason for it) is available as `engine` and `selection` on the compiled
+pattern.
+
+`RegexSet` (not in the Python re module) matches many patterns in a single
+pass.
 
 For documentation, see the official Python re module documentation.
 '''
 
 from rxpy.compat.module import Re
-from rxpy.engine.backtrack.engine import BacktrackingEngine
+from rxpy.compat.support import RegexSet
+from rxpy.engine.selector import Selector
 
-_re = Re(BacktrackingEngine, 'Default RXPY matcher')
+_re = Re(Selector(), 'Default RXPY matcher')
 
 compile = _re.compile
 RegexObject = _re.RegexObject